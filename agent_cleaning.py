@@ -1,13 +1,26 @@
+import os
+
 import streamlit as st
 import pandas as pd
-from openai import OpenAI
+
+from utils.cleaning import CHUNKSIZE, clean_csv, clean_frame, parse_instructions
+from utils.ingest import data_files, data_path
+from utils.llm_cache import data_fingerprint, get_llm_cache, schema_fingerprint
+from utils.llm_client import stream_completion
+from utils.sandbox import get_sandbox
 
 class SimpleDataCleaningAgent:
-    def __init__(self, client, model="gpt-4.1-nano-2025-04-14"):
+    # The standard steps (missing-column drop, mean / mode imputation, dedupe,
+    # 3 x IQR outliers) run in the built-in engine (utils/cleaning.py); the LLM
+    # is only asked for code when the instructions go beyond them.
+    def __init__(self, client=None, model="gpt-4.1-nano-2025-04-14", cache=None):
         self.client = client
         self.model = model
+        self.cache = cache or get_llm_cache()
+        self.cache_key = None
         self.generated_code = None
         self.cleaned_data = None
+        self.report = None
 
     def summarize_data(self, df):
         missing_counts = df.isnull().sum().to_dict()
@@ -15,49 +28,66 @@ class SimpleDataCleaningAgent:
         cols = list(df.columns)
         return f"Columns: {cols}; Missing values per column: {missing_str}"
 
-    def generate_cleaning_code(self, df, instructions=""):
+    def generate_cleaning_code(self, df, instructions="", on_token=None):
         summary = self.summarize_data(df)
         prompt = f"""
 You are a helpful data cleaning assistant.
 Dataset summary: {summary}
+Standard cleaning (dropping mostly-missing columns, imputation, duplicate and outlier removal) is already done.
 Instructions: {instructions}
 
-Write a python function named `data_cleaner` that accepts a pandas DataFrame `df` and returns a cleaned DataFrame.
-Cleaning steps should include:
-- Drop columns with more than 40% missing values
-- Impute numeric columns missing values with mean
-- Impute categorical columns missing values with mode
-- Remove duplicate rows
-- Remove outliers beyond 3 * IQR (only if instructions don't forbid it)
+Write a python function named `data_cleaner` that accepts a pandas DataFrame `df` and returns a cleaned DataFrame,
+applying only the instructions above. It is called on one chunk of rows at a time, so it must not depend on
+other rows (no de-duplication or statistics over the whole dataset).
 
 Only provide the full python function code, nothing else.
 """
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": prompt}],
+        self.generated_code, self.cache_key, _ = stream_completion(
+            self.model,
+            [{"role": "user", "content": prompt}],
+            schema_fp=schema_fingerprint(df),
+            data_fp=data_fingerprint(df),
+            cache=self.cache,
+            on_token=on_token,
+            client=self.client,
             temperature=0.3,
             max_tokens=600,
         )
-        self.generated_code = response.choices[0].message.content
         return self.generated_code
 
-    def run_cleaning(self, df):
+    def _custom_cleaner(self):
+        # data_cleaner is compiled once per sandbox worker and called per chunk
         if self.generated_code is None:
-            raise RuntimeError("No cleaning code generated yet.")
+            return None
 
         # Clean generated code: remove markdown triple backticks if present
         code = self.generated_code.strip()
         if code.startswith("```") and code.endswith("```"):
             code = "\n".join(code.split("\n")[1:-1])  # remove first and last line
 
-        local_vars = {}
-        exec(code, {}, local_vars)
-        cleaner_func = local_vars.get("data_cleaner")
-        if cleaner_func:
-            self.cleaned_data = cleaner_func(df)
-            return self.cleaned_data
-        else:
-            raise RuntimeError("Cleaning function 'data_cleaner' not found in generated code.")
+        def apply(chunk):
+            try:
+                return get_sandbox().run(code, chunk, call="data_cleaner")["result"]
+            except Exception:
+                # Don't replay code that failed on this schema
+                self.cache.mark(self.cache_key, False)
+                raise
+
+        return apply
+
+    def run_cleaning(self, df, options=None):
+        self.cleaned_data, self.report = clean_frame(df, options, custom=self._custom_cleaner())
+        if self.generated_code is not None:
+            self.cache.mark(self.cache_key, True)
+        return self.cleaned_data
+
+    def run_cleaning_csv(self, source, out_path, options=None, chunksize=CHUNKSIZE, progress=None):
+        # Two chunked passes over the file; memory does not grow with its size
+        self.report = clean_csv(source, out_path, options, custom=self._custom_cleaner(), chunksize=chunksize,
+                                progress=progress)
+        if self.generated_code is not None:
+            self.cache.mark(self.cache_key, True)
+        return self.report
 
 # Streamlit UI
 st.title("🧹 AI Data Cleaning Agent")
@@ -68,34 +98,71 @@ Then it will apply that function to clean your data and display the results.
 """)
 
 uploaded_file = st.file_uploader("Upload CSV file", type=["csv"])
-
-if uploaded_file:
-    df = pd.read_csv(uploaded_file)
+# Multi-GB files are cleaned from disk in chunks instead of uploaded; only files
+# in the server's data directory (TSA_DATA_DIR) can be read, and the result is
+# written next to them under cleaned/
+csv_path = ""
+server_files = [name for name in data_files() if not name.startswith("cleaned" + os.sep)]
+if server_files:
+    server_file = st.selectbox("...or a large CSV on the server", [""] + server_files)
+    csv_path = data_path(server_file) if server_file else ""
+
+if uploaded_file or csv_path:
+    # For a file on disk only a sample is read up front
+    df = pd.read_csv(uploaded_file) if uploaded_file else pd.read_csv(csv_path, nrows=10_000)
     st.subheader("Original Data Sample")
     st.dataframe(df.head())
 
-    st.write("### Missing Values per Column")
+    st.write("### Missing Values per Column" + ("" if uploaded_file else " (first 10,000 rows)"))
     st.write(df.isnull().sum())
 
     instructions = st.text_area("Any special cleaning instructions? (e.g. 'Do not remove outliers.')", "")
+    if csv_path:
+        out_path = data_path(os.path.join("cleaned", os.path.splitext(server_file)[0] + "_cleaned.csv"))
+        st.caption(f"Cleaned CSV will be written to {out_path}")
 
     if st.button("Generate Cleaning Function and Clean Data"):
         try:
-            client = OpenAI(api_key=st.secrets["openai"]["api_key"])
-            agent = SimpleDataCleaningAgent(client=client)
-
-            with st.spinner("Generating cleaning function code..."):
-                code = agent.generate_cleaning_code(df, instructions=instructions)
+            agent = SimpleDataCleaningAgent()
+            # Instructions the built-in steps understand become options; only the rest goes to the LLM
+            options, custom_instructions = parse_instructions(instructions)
 
-            st.subheader("Generated Cleaning Function Code")
-            st.code(code, language="python")
+            if custom_instructions:
+                st.subheader("Generated Cleaning Function Code")
+                streamed = st.empty()
+                code = agent.generate_cleaning_code(df, instructions=custom_instructions,
+                                                    on_token=lambda text: streamed.code(text, language="python"))
+                streamed.code(code, language="python")
 
             with st.spinner("Running cleaning function on your data..."):
-                cleaned_df = agent.run_cleaning(df)
+                if uploaded_file:
+                    cleaned_df = agent.run_cleaning(df, options)
+                else:
+                    progress_bar = st.progress(0.0)
+
+                    def progress(done, total):
+                        if total is None:
+                            progress_bar.progress(0.0, f"Pass 1 of 2: {done:,} rows scanned")
+                        else:
+                            progress_bar.progress(done / total, f"Pass 2 of 2: {done - total // 2:,} rows cleaned")
+
+                    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                    agent.run_cleaning_csv(csv_path, out_path, options, progress=progress)
+                    progress_bar.empty()
+                    cleaned_df = pd.read_csv(out_path, nrows=1_000)
+
+            st.subheader("Cleaning Report")
+            st.json(agent.report)
 
             st.subheader("Cleaned Data Sample")
             st.dataframe(cleaned_df.head())
 
+            if uploaded_file:
+                st.download_button("Download Cleaned CSV", cleaned_df.to_csv(index=False).encode("utf-8"),
+                                   file_name="cleaned_data.csv", mime="text/csv")
+            else:
+                st.caption(f"Cleaned data written to {out_path}")
+
             st.success("Data cleaning complete!")
 
         except Exception as e:
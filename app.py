@@ -1,10 +1,14 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
-from openai import OpenAI
 
-# Initialize OpenAI client (make sure your API key is in secrets.toml as openai.api_key)
-client = OpenAI(api_key=st.secrets["openai"]["api_key"])
+from utils.dates import normalize_dates
+from utils.excel import load_excel
+from utils.llm_cache import data_fingerprint, get_llm_cache, schema_fingerprint
+from utils.llm_client import stream_completion
+from utils.sandbox import get_sandbox
+
+# st.* calls of the generated code that are replayed here; anything else is skipped
+REPLAYED_CALLS = {"write", "dataframe", "table", "metric", "line_chart", "bar_chart", "image"}
 
 st.title("🧠 Time Series Forecasting AI Agent")
 
@@ -17,7 +21,7 @@ if uploaded_file:
     if uploaded_file.name.endswith(".csv"):
         df = pd.read_csv(uploaded_file)
     elif uploaded_file.name.endswith(".xlsx"):
-        df = pd.read_excel(uploaded_file)
+        df = load_excel(uploaded_file)
 
     st.write("Uploaded Data Sample:")
     st.dataframe(df.head())
@@ -32,7 +36,9 @@ if uploaded_file:
     target_col = st.selectbox("Select the target column", [col for col in df.columns if col not in key_cols + [time_col]])
 
     # Prepare dataframe
-    df[time_col] = pd.to_datetime(df[time_col])
+    df[time_col], date_failures = normalize_dates(df[time_col])
+    if date_failures:
+        st.warning(f"⚠️ {date_failures} values in '{time_col}' could not be parsed as dates.")
     df_agent = df[[time_col] + key_cols + [target_col]].copy()
 
     st.success("✅ Data configured and ready!")
@@ -68,15 +74,26 @@ if uploaded_file:
     """
 
 
+        cache_key = None
+        # Identifies df_agent for the LLM cache and its shared-memory block in the sandbox
+        data_fp = data_fingerprint(df_agent)
         try:
-            response = client.chat.completions.create(
-                model="gpt-4.1-nano-2025-04-14",
-                messages=[
+            # Stream the answer into the page; the shared client reads the key from
+            # secrets.toml (openai.api_key) or OPENAI_API_KEY
+            streamed = st.empty()
+            generated_response, cache_key, cache_hit = stream_completion(
+                "gpt-4.1-nano-2025-04-14",
+                [
                     {"role": "system", "content": system_msg},
                     {"role": "user", "content": user_prompt}
                 ],
+                schema_fp=schema_fingerprint(df_agent),
+                data_fp=data_fp,
+                on_token=lambda text: streamed.markdown(text),
             )
-            generated_response = response.choices[0].message.content
+            streamed.empty()
+            if cache_hit:
+                st.caption("♻️ Served from the LLM cache")
 
             # Extract python code from response
             if "```python" in generated_response:
@@ -93,16 +110,18 @@ if uploaded_file:
             if "plt" in code and "st.pyplot" not in code:
                 code += "\nst.pyplot(plt.gcf())\nplt.clf()"
 
-            # Execute the generated code - pass local_vars as globals for exec
-            local_vars = {
-                "df_agent": df_agent,
-                "pd": pd,
-                "plt": plt,
-                "st": st
-            }
-            exec(code, local_vars)
+            # Execute the generated code in the sandbox, then replay its st.* calls here
+            output = get_sandbox().run(code, df_agent, df_name="df_agent", digest=data_fp)
+            for name, args, kwargs in output["outputs"]:
+                if name in REPLAYED_CALLS:
+                    getattr(st, name)(*args, **kwargs)
+                else:
+                    st.caption(f"Skipped st.{name}() from the generated code")
+            get_llm_cache().mark(cache_key, True)
 
         except Exception as e:
+            if cache_key is not None:
+                get_llm_cache().mark(cache_key, False)
             st.error(f"Error running generated code: {e}")
 
 
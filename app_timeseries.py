@@ -1,15 +1,45 @@
 # app.py
+import os
+
 import streamlit as st
 import pandas as pd
 
-from utils.llm_agent import ask_llm_and_run
-from utils.plots import plot_yearly_trend, plot_monthly_trend, plot_weekly_trend
-from utils.fill_missing_weeks import process_level
+from utils.llm_agent import ask_llm_and_run, ask_llm_batch
+from utils.plots import (plot_yearly_trend, plot_monthly_trend, plot_weekly_trend, plot_fiscal_trend, plot_drilldown,
+                         plot_outliers)
+from utils.forecasting import METHODS
+from utils.ingest import data_files, data_path
+from utils.instrument import Recorder, disable, enable
+from utils.pipeline import (PipelineCache, build_anomalies, build_cube, build_fiscal_calendar, build_llm_profile,
+                            build_panel, build_router, parse_dates, process_large_csv, process_uploads, processing_key, read_upload,
+                            run_backtest, run_forecast, to_csv_bytes)
+from utils.question_router import RouterStats
 
 # Set layout
 st.set_page_config(page_title="🧠 LLM Time Series Assistant", layout="wide")
 st.title("🧠 Time Series Agent (WIP)")
 
+
+@st.cache_resource
+def get_pipeline_cache():
+    # One cache per server process, shared across reruns and sessions
+    return PipelineCache()
+
+
+@st.cache_resource
+def get_router_stats():
+    return RouterStats()
+
+
+cache = get_pipeline_cache()
+router_stats = get_router_stats()
+
+# Stage timings for this session; when off, every span is a no-op
+if st.sidebar.toggle("⏱️ Instrumentation", key="instrument"):
+    recorder = enable(st.session_state.setdefault("recorder", Recorder()))
+else:
+    disable()
+
 # =========================
 # 📂 SIDEBAR: Upload + Config
 # =========================
@@ -17,11 +47,25 @@ with st.sidebar:
     st.header("📂 Upload Files")
 
     actual_file = st.file_uploader("📁 Upload Actuals File", type=["csv", "xlsx"])
+    # Multi-GB extracts are streamed from disk instead of uploaded and read whole;
+    # only files in the server's data directory (TSA_DATA_DIR) can be picked
+    actual_path = ""
+    server_files = data_files()
+    if server_files:
+        server_file = st.selectbox("📦 ...or a large actuals CSV on the server", [""] + server_files)
+        actual_path = data_path(server_file) if server_file else ""
     time_file = st.file_uploader("🕒 Upload Time Dimension File", type=["csv", "xlsx"])
+    actual_source = actual_file or actual_path
 
-    if actual_file and time_file:
-        df_actual = pd.read_csv(actual_file) if actual_file.name.endswith(".csv") else pd.read_excel(actual_file)
-        df_time = pd.read_csv(time_file) if time_file.name.endswith(".csv") else pd.read_excel(time_file)
+    if actual_source and time_file:
+        # For a streamed file only a sample is read here, to pick columns
+        df_actual = read_upload(cache, actual_file) if actual_file else pd.read_csv(actual_path, nrows=1000)
+        df_time = read_upload(cache, time_file)
+
+        with st.expander("🧮 Memory Report"):
+            for name, frame in (("Actuals", df_actual), ("Time Dimension", df_time)):
+                st.caption(name)
+                st.dataframe(pd.DataFrame(frame.attrs.get("memory_report", {})), hide_index=True)
 
         st.divider()
         st.header("🔧 Column Selection")
@@ -35,9 +79,13 @@ with st.sidebar:
         elif len(key_cols) == 0:
             st.warning("⚠️ Please select at least one key column.")
         else:            
-            # Ensure datetime format
-            df_time[date_col] = pd.to_datetime(df_time[date_col])
-            df_actual[date_col] = pd.to_datetime(df_actual[date_col])
+            # Ensure datetime format (parsed once per upload and date column)
+            df_time = parse_dates(cache, time_file, df_time, date_col)
+            if actual_file:
+                df_actual = parse_dates(cache, actual_file, df_actual, date_col)
+            for name, frame in (("Actuals", df_actual), ("Time Dimension", df_time)):
+                if frame.attrs.get("date_parse_failures"):
+                    st.warning(f"⚠️ {name}: {frame.attrs['date_parse_failures']} '{date_col}' values could not be parsed.")
 
             # Set min and max dates from time column
             min_date = df_time[date_col].min()
@@ -51,28 +99,50 @@ with st.sidebar:
                 max_value=max_date
             )
 
-            
-            # Parse datetime
-            df_actual[date_col] = pd.to_datetime(df_actual[date_col])
-            df_time[date_col] = pd.to_datetime(df_time[date_col])
             user_end_date = pd.to_datetime(user_end_date)  # ensure type match
-            
-            # Filter both actual and time file up to user-selected date
-            df_actual = df_actual[df_actual[date_col] <= user_end_date]
-            df_time = df_time[df_time[date_col] <= user_end_date]
-            
-            # Process data
-            df_processed = process_level(df_actual, df_time[[date_col]], forecast_level=key_cols, col_sales=target_col)
-            df_processed = df_processed[[date_col] + key_cols + [target_col]]
+
+            # Execution settings
+            with st.expander("⚙️ Processing Options"):
+                run_mode = st.radio("Execution Mode", ["serial", "parallel"], horizontal=True)
+                workers = st.number_input("Workers", min_value=1, max_value=os.cpu_count() or 1, value=os.cpu_count() or 1)
+                max_partition_mb = st.number_input("Memory per Partition (MB)", min_value=64, value=512, step=64)
+
+            # Process data (filtered to user_end_date, memoized on upload hashes + settings)
+            progress_bar = st.progress(0.0, "⏳ Processing...")
+
+            def progress(done, total):
+                progress_bar.progress(done / total, f"⏳ Processing... {done}/{total} partitions")
+
+            if actual_file:
+                df_processed = process_uploads(cache, actual_file, time_file, df_actual, df_time, date_col,
+                                               target_col, key_cols, user_end_date, progress=progress, mode=run_mode,
+                                               workers=int(workers), max_partition_mb=int(max_partition_mb))
+            else:
+                df_processed = process_large_csv(cache, actual_path, time_file, df_time, date_col, target_col,
+                                                 key_cols, user_end_date,
+                                                 workers=int(workers) if run_mode == "parallel" else 1,
+                                                 progress=progress)
+            progress_bar.empty()
 
             # Store in session
             st.session_state.df_processed = df_processed
             st.session_state.date_col = date_col
             st.session_state.target_col = target_col
             st.session_state.key_cols = key_cols
+            st.session_state.processing_key = processing_key(actual_source, time_file, date_col, target_col, key_cols,
+                                                             user_end_date)
+            st.session_state.panel = build_panel(cache, df_processed, st.session_state.processing_key, date_col,
+                                                 key_cols, target_col)
+            # Calendar aggregates shared by the EDA plots and the question router, with
+            # fiscal months / quarters from the time dimension's Stat R Attribute Week
+            fiscal = build_fiscal_calendar(cache, time_file, df_time, date_col)
+            st.session_state.cube = build_cube(cache, st.session_state.panel, st.session_state.processing_key, fiscal)
 
             st.success("✅ Processing Complete")
 
+            with st.expander("🗄️ Pipeline Cache"):
+                st.json(cache.report())
+
 # =========================
 # 🧠 MAIN AREA
 # =========================
@@ -87,7 +157,7 @@ if "df_processed" in st.session_state:
 
     # ⬇️ Download and Show Processed Data
     st.subheader("✅ Processed Data")
-    csv = df.to_csv(index=False)
+    csv = to_csv_bytes(cache, df, st.session_state.processing_key)
     st.download_button("⬇️ Download Processed Data", data=csv, file_name="processed_actuals.csv", mime="text/csv")
 
     if st.button("👁 Show Processed Data Preview"):
@@ -111,14 +181,31 @@ if "df_processed" in st.session_state:
         if question:
             with st.spinner("Thinking..."):
                 try:
-                    code, result, result_fig = ask_llm_and_run(question, df, date_col, key_cols, target_col)
+                    # Common questions are answered from full-data aggregates; the LLM is the fallback
+                    router = build_router(cache, st.session_state.panel, st.session_state.processing_key, router_stats,
+                                          st.session_state.cube)
+                    answer = router.route(question)
+                    if answer is None:
+                        profile = build_llm_profile(cache, df, st.session_state.processing_key, date_col, key_cols,
+                                                    target_col)
+                        # Stream the generated code into the page as it arrives
+                        streamed = st.empty()
+                        answer = ask_llm_and_run(question, df, date_col, key_cols, target_col, profile=profile,
+                                                 on_token=lambda text: streamed.code(text, language="python"),
+                                                 digest=st.session_state.processing_key)
+                        streamed.empty()
+                    code, result, result_fig = answer
 
                     st.subheader("🧾 Generated Code")
                     st.code(code, language="python")
 
                     if result_fig is not None:
                         st.subheader("📊 Visualization")
-                        st.pyplot(result_fig)
+                        # Sandboxed LLM code returns PNG bytes, the router a Figure
+                        if isinstance(result_fig, bytes):
+                            st.image(result_fig)
+                        else:
+                            st.pyplot(result_fig)
 
                     if result is not None:
                         st.subheader("📋 Output")
@@ -137,27 +224,137 @@ if "df_processed" in st.session_state:
                 except Exception as e:
                     st.error(f"⚠️ Error: {e}")
 
+        with st.expander("📝 Batch Questions"):
+            batch = st.text_area("One question per line", "Which month had the highest sales?\n"
+                                                          "What is the average sales by item?\n"
+                                                          "Show weekly trend of sales.")
+            concurrency = st.number_input("Concurrent LLM requests", min_value=1, max_value=16, value=4)
+            if st.button("▶️ Answer All"):
+                questions = [line.strip() for line in batch.splitlines() if line.strip()]
+                with st.spinner(f"Answering {len(questions)} questions..."):
+                    router = build_router(cache, st.session_state.panel, st.session_state.processing_key,
+                                          router_stats, st.session_state.cube)
+                    answers = [router.route(q) for q in questions]
+                    # Only the questions the router cannot answer go to the LLM, concurrently
+                    pending = [i for i, answer in enumerate(answers) if answer is None]
+                    if pending:
+                        profile = build_llm_profile(cache, df, st.session_state.processing_key, date_col, key_cols,
+                                                    target_col)
+                        llm_answers = ask_llm_batch([questions[i] for i in pending], df, date_col, key_cols,
+                                                    target_col, profile=profile, concurrency=int(concurrency),
+                                                    digest=st.session_state.processing_key)
+                        for i, answer in zip(pending, llm_answers):
+                            answers[i] = answer
+                for q, (code, result, result_fig) in zip(questions, answers):
+                    st.markdown(f"**{q}**")
+                    st.code(code, language="python")
+                    if result_fig is not None:
+                        if isinstance(result_fig, bytes):
+                            st.image(result_fig)
+                        else:
+                            st.pyplot(result_fig)
+                    if result is not None:
+                        st.write(result)
+
+        with st.expander("🧭 Question Router Stats"):
+            st.json(router_stats.report())
+
     # -----------------------
     # 📊 EDA Mode
     # -----------------------
     elif mode == "📊 EDA":
         st.markdown("### Exploratory Data Analysis")
 
+        cube = st.session_state.cube
+
         st.subheader("📅 Year-over-Year Weekly Trend")
-        plot_yearly_trend(df, date_col, target_col)
+        plot_yearly_trend(cube)
 
         st.subheader("📆 Monthly Aggregated Trend")
-        plot_monthly_trend(df, date_col, target_col)
+        plot_monthly_trend(cube)
 
         st.subheader("🗓️ Weekly Aggregated Trend")
-        plot_weekly_trend(df, date_col, target_col)
+        plot_weekly_trend(cube)
+
+        st.subheader("🧾 Fiscal Month Trend")
+        plot_fiscal_trend(cube, "Fiscal Month")
+
+        st.subheader("🗂️ Fiscal Quarter Trend")
+        plot_fiscal_trend(cube, "Fiscal Quarter")
+
+        st.subheader("🔎 Drill-down")
+        col1, col2 = st.columns(2)
+        drill_col = col1.selectbox("Break down by", key_cols)
+        top = int(col2.number_input("Top values", min_value=1, max_value=50, value=10))
+        plot_drilldown(cube, drill_col, top)
+
+        st.subheader("🚨 Outliers")
+        # Indexed on first view only; the router detects its own when asked about outliers
+        plot_outliers(build_anomalies(cache, st.session_state.panel, st.session_state.processing_key))
 
     # -----------------------
-    # 📈 Forecast Mode (Coming Soon)
+    # 📈 Forecast Mode
     # -----------------------
     elif mode == "📈 Forecast":
-        st.markdown("### Forecast (Coming Soon 🚧)")
-        st.info("This section is under development. You can add your forecast logic here.")
+        st.markdown("### Forecast")
+        panel = st.session_state.panel
+
+        col1, col2 = st.columns(2)
+        method = col1.selectbox("📐 Method", list(METHODS))
+        horizon = int(col2.number_input("🔭 Horizon (weeks)", min_value=1, max_value=104, value=13))
+
+        params = {}
+        if method == "Seasonal Naive":
+            params["season"] = int(st.number_input("Season Length (weeks)", min_value=1, max_value=104, value=52))
+        elif method == "Moving Average":
+            params["window"] = int(st.number_input("Window (weeks)", min_value=1, max_value=104, value=13))
+        else:
+            params["alpha"] = st.slider("Alpha (level / size)", 0.01, 1.0, 0.3 if method in ("Simple Exponential Smoothing", "Holt") else 0.1)
+            if method in ("Holt", "TSB"):
+                params["beta"] = st.slider("Beta (trend / probability)", 0.01, 1.0, 0.1)
+        workers = int(st.number_input("Workers", min_value=1, max_value=os.cpu_count() or 1, value=1))
+
+        st.caption(f"{panel.shape[0]:,} intersections × {panel.shape[1]:,} weeks")
+        run_col, backtest_col = st.columns(2)
+
+        if run_col.button("🚀 Run Forecast"):
+            with st.spinner("Forecasting all intersections..."):
+                forecast = run_forecast(cache, panel, st.session_state.processing_key, method, horizon, workers, **params)
+            st.subheader("📋 Forecast")
+            st.dataframe(forecast.head(100), use_container_width=True)
+            st.download_button(
+                label="⬇️ Download Forecast Result",
+                data=to_csv_bytes(cache, forecast, (st.session_state.processing_key, method, horizon, tuple(sorted(params.items())))),
+                file_name="forecast_result.csv",
+                mime="text/csv"
+            )
+
+        if backtest_col.button("🧪 Backtest"):
+            with st.spinner("Running rolling-origin backtest..."):
+                scores = run_backtest(cache, panel, st.session_state.processing_key, method, horizon, workers=workers, **params)
+            st.subheader("🧪 Backtest")
+            st.metric("Overall WAPE", f"{scores.attrs['overall_wape']:.1f}%")
+            st.caption(f"Origins: {', '.join(scores.attrs['origins'])}")
+            st.dataframe(scores, use_container_width=True)
+            st.download_button(
+                label="⬇️ Download Backtest Scores",
+                data=scores.to_csv(index=False),
+                file_name="backtest_scores.csv",
+                mime="text/csv"
+            )
 
 else:
     st.info("📥 Please upload both Actuals and Time files to begin.")
+
+# =========================
+# ⏱️ Instrumentation Panel
+# =========================
+if st.session_state.get("instrument"):
+    with st.sidebar.expander("⏱️ Stage Timings", expanded=True):
+        st.dataframe(recorder.summary(), hide_index=True)
+        if recorder.records:
+            st.caption("Latest spans")
+            st.dataframe(pd.DataFrame(recorder.records[-20:]), hide_index=True)
+        st.download_button("⬇️ Download Spans (JSONL)", data=recorder.to_jsonl(), file_name="spans.jsonl",
+                           mime="application/jsonl")
+        st.button("🧹 Clear Spans", on_click=recorder.clear)
@@ -0,0 +1,101 @@
+# benchmarks/bench_anomalies.py
+# Outlier index over every intersection (utils/anomalies.py): equivalence of
+# the strided rolling median / MAD and seasonal z-scores with a per-series
+# pandas reference, timings up to 100k+ intersections x 260 weeks, and the
+# cost of index queries against rescoring the panel.
+#
+#   python -m benchmarks.bench_anomalies
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import DATE_COL, KEY_COLS, TARGET_COL, make_tenant
+from utils.anomalies import MAD_SCALE, MEAN_AD_SCALE, detect_outliers, rolling_median_scale, seasonal_z
+from utils.panel import Panel
+
+
+def make_panel(n_intersections, n_weeks=260, seed=0):
+    # Weeks without a row after a series starts are 0, as process_level fills them
+    df, _ = make_tenant(n_intersections, n_weeks, seed=seed, as_strings=False)
+    weeks = pd.date_range(df[DATE_COL].min(), periods=n_weeks, freq='W-MON')
+    panel = Panel.from_long(df, DATE_COL, KEY_COLS, TARGET_COL, weeks=weeks)
+    started = np.maximum.accumulate(~np.isnan(panel.values), axis=1)
+    panel.values[started & np.isnan(panel.values)] = 0
+    rng = np.random.default_rng(seed)
+    spikes = rng.random(panel.shape) < 0.002
+    panel.values[spikes & started] *= 8
+    return panel
+
+
+def reference(values, window=13, season=52):
+    # One series at a time with pandas rolling windows
+    medians, scales, seasonals = [], [], []
+    for row in values:
+        s = pd.Series(row.astype('float32'))
+        rolling = s.rolling(window, center=True, min_periods=window // 2 + 1)
+        med = rolling.median()
+        mad = rolling.apply(lambda w: np.nanmedian(np.abs(w - np.nanmedian(w))), raw=True)
+        mean_ad = rolling.apply(lambda w: np.nanmean(np.abs(w - np.nanmedian(w))), raw=True)
+        scale = pd.Series(np.where(mad > 0, MAD_SCALE * mad, MEAN_AD_SCALE * mean_ad)).where(med.notna())
+        # Only windows that fit inside the history; the edges take the nearest one
+        inside = (s.index >= window // 2) & (s.index < len(s) - window // 2)
+        med, scale = med.where(inside), scale.where(inside)
+        med, scale = med.ffill().bfill().where(s.notna()), scale.ffill().bfill().where(s.notna())
+        medians.append(med.to_numpy())
+        scales.append(scale.to_numpy())
+
+        deviation = s - med
+        position = np.arange(len(s)) % season
+        profile = deviation.groupby(position).median().where(deviation.groupby(position).count() >= 2, 0)
+        residual = deviation - profile.reindex(position).to_numpy()
+        centre = residual.median()
+        spread = MAD_SCALE * (residual - centre).abs().median()
+        spread = spread if spread > 0 else MEAN_AD_SCALE * (residual - centre).abs().mean()
+        seasonals.append(((residual - centre) / spread).to_numpy() if spread > 0 else (residual * 0).to_numpy())
+    return np.array(medians), np.array(scales), np.array(seasonals)
+
+
+def check_equivalence(n_intersections=300):
+    panel = make_panel(n_intersections)
+    values = panel.values.astype('float32')
+    values[values == 0] = np.nan  # as detect_outliers(ignore_zeros=True) scores them
+    median, scale = rolling_median_scale(values)
+    seasonal = seasonal_z(values, median)
+    ref_median, ref_scale, ref_seasonal = reference(values)
+    np.testing.assert_allclose(median, ref_median, rtol=1e-5)
+    np.testing.assert_allclose(scale, ref_scale, rtol=1e-4)
+    np.testing.assert_allclose(seasonal, np.where(np.isnan(values), np.nan, ref_seasonal), rtol=1e-3, atol=1e-3)
+
+    index = detect_outliers(panel, block_rows=64)
+    assert len(index) and (np.diff(index.key_idx * len(panel.weeks) + index.week_idx) > 0).all()
+    assert index.contains(index.key_idx, index.week_idx).all()
+    assert not index.contains(index.key_idx, (index.week_idx + 1) % len(panel.weeks)).all()
+    one = index.for_intersection(int(index.key_idx[0]))
+    assert (one.key_idx == index.key_idx[0]).all() and len(one) == (index.key_idx == index.key_idx[0]).sum()
+    print('equivalence OK')
+
+
+def run(sizes=(10_000, 50_000, 100_000, 200_000)):
+    for n_intersections in sizes:
+        panel = make_panel(n_intersections)
+        start = time.perf_counter()
+        index = detect_outliers(panel)
+        seconds = time.perf_counter() - start
+        print(f'{n_intersections:>8,} intersections x {panel.shape[1]} weeks: {seconds:6.2f}s '
+              f'({panel.values.size / seconds / 1e6:5.1f}M cells/s), {len(index):,} points flagged, '
+              f'index {index.nbytes / 2**20:.1f} MB')
+
+    # Answering "outliers of this item" / "of this week" from the index instead of rescoring the panel
+    item, week = panel.keys[KEY_COLS[3]].iloc[0], panel.weeks[-10]
+    for label, query in (('one item', lambda: index.select(**{KEY_COLS[3]: item}).frame()),
+                         ('one week', lambda: index.select(start=week, end=week).frame()),
+                         ('top 100', lambda: index.frame(limit=100))):
+        start = time.perf_counter()
+        for _ in range(10):
+            query()
+        print(f'query {label:>8}: {(time.perf_counter() - start) / 10 * 1e3:6.1f} ms (rescoring: {seconds:.2f}s)')
+
+if __name__ == '__main__':
+    check_equivalence()
+    run()
@@ -0,0 +1,167 @@
+# benchmarks/bench_cleaning.py
+# The built-in cleaning engine: chunked two-pass cleaning of a CSV against
+# cleaning the whole frame at once (same rows when the quantile sketches are
+# exact, close bounds when they are not), peak memory of both in fresh
+# processes, and generated data_cleaner code compiled once and applied per
+# chunk in the sandbox.
+#
+#   python -m benchmarks.bench_cleaning
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_ingest import peak
+from utils.cleaning import CleaningStats, QuantileSketch, clean_csv, clean_frame, parse_instructions
+
+CUSTOM_CODE = '''
+def data_cleaner(df):
+    df = df.copy()
+    df["Department"] = df["Department"].str.lower()
+    return df[df["Age"] >= 18]
+'''
+
+
+def write_dirty(path, n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'Age': rng.normal(40, 12, n_rows).round(1),
+        'Salary': rng.lognormal(10.8, 0.4, n_rows).round(2),
+        'Score': rng.integers(0, 100, n_rows).astype('float64'),
+        'Category': rng.choice(list('ABCD'), n_rows),
+        'Department': rng.choice(['Sales', 'HR', 'Marketing', 'IT'], n_rows),
+        'Notes': rng.choice(['Note1', 'Note2', 'Note3'], n_rows),
+    })
+    for col, share in (('Age', 0.1), ('Salary', 0.05), ('Category', 0.1), ('Department', 0.05), ('Notes', 0.6)):
+        df.loc[rng.random(n_rows) < share, col] = np.nan
+    outliers = rng.random(n_rows) < 0.01
+    df.loc[outliers, 'Salary'] = df.loc[outliers, 'Salary'] * 50
+    df = pd.concat([df, df.sample(frac=0.05, random_state=seed)], ignore_index=True)
+    df.iloc[rng.permutation(len(df))].to_csv(path, index=False)
+
+
+def in_memory(path):
+    cleaned, _ = clean_frame(pd.read_csv(path))
+    cleaned.to_csv(path + '.cleaned.csv', index=False)
+    return len(cleaned)
+
+
+def chunked(path):
+    return clean_csv(path, path + '.cleaned.csv', chunksize=200_000)['rows_out']
+
+
+def check_equivalence(n_rows=20_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dirty.csv')
+        write_dirty(path, n_rows)
+        expected, _ = clean_frame(pd.read_csv(path))
+        expected = pd.read_csv(pd.io.common.StringIO(expected.to_csv(index=False)))
+        for chunksize in (997, 5_000, n_rows * 2):
+            report = clean_csv(path, os.path.join(tmp, 'out.csv'), chunksize=chunksize)
+            assert report['exact_quantiles']
+            pd.testing.assert_frame_equal(pd.read_csv(os.path.join(tmp, 'out.csv')), expected, check_exact=False,
+                                          check_dtype=False)
+
+        # Chunks made only of rows already seen (nothing new to remember)
+        repeated = os.path.join(tmp, 'repeated.csv')
+        pd.DataFrame({'a': [1, 2] * 10, 'b': ['x', 'y'] * 10}).to_csv(repeated, index=False)
+        report = clean_csv(repeated, os.path.join(tmp, 'repeated_out.csv'), chunksize=4)
+        assert report['rows_out'] == 2 and report['duplicates_removed'] == 18, report
+
+        # Sketched quartiles once a column outgrows the sketch
+        sketch = QuantileSketch(size=1_024)
+        values = np.random.default_rng(1).lognormal(10, 1, 500_000)
+        for chunk in np.array_split(values, 37):
+            sketch.add(chunk)
+        for q in (0.25, 0.75):
+            rank = (values < sketch.quantile(q)).mean()
+            assert abs(rank - q) < 0.01, (q, rank)
+
+        numeric = ['Age', 'Salary', 'Score']
+        sketched, whole = CleaningStats(numeric, sketch_size=1_024), CleaningStats(numeric)
+        for chunk in pd.read_csv(path, chunksize=3_000):
+            sketched.update(chunk)
+            whole.update(chunk)
+        approx, exact = sketched.plan(), whole.plan()
+        assert not approx.exact and exact.exact
+        for col, bounds in exact.bounds.items():
+            assert np.allclose(approx.bounds[col], bounds, rtol=0.05), (col, approx.bounds[col], bounds)
+    print('equivalence OK')
+
+
+# Instruction -> (options that differ from the defaults, text left for generated code)
+INSTRUCTIONS = [
+    ('Do not remove duplicates, but remove outliers', {'drop_duplicates': False}, ''),
+    ('Drop rows with no Category and remove outliers', {}, 'Drop rows with no Category'),
+    ('Keep only rows with Age > 18 and drop outliers', {}, 'Keep only rows with Age > 18'),
+    ("Don't remove outliers", {'remove_outliers': False}, ''),
+    ('Keep duplicates. Skip imputation', {'drop_duplicates': False, 'impute': False}, ''),
+    ('Without removing outliers, lowercase Department', {'remove_outliers': False}, 'lowercase Department'),
+    ('Drop columns with more than 60% missing values and remove duplicates', {'max_missing': 0.6}, ''),
+    ('Fill missing values with 0', {'impute': False, 'max_missing': 1.0}, 'Fill missing values with 0'),
+    # Negations the patterns cannot consume still hand the step to generated code
+    ("don't impute", {'impute': False}, ''),
+    ('Do not drop columns', {'max_missing': 1.0}, ''),
+    ('remove outliers but not in column price', {'remove_outliers': False}, 'remove outliers but not in column price'),
+    ('Never touch the outliers', {'remove_outliers': False}, 'Never touch the outliers'),
+    ('Drop rows with missing Category', {'impute': False, 'max_missing': 1.0}, 'Drop rows with missing Category'),
+]
+
+
+def check_instructions():
+    defaults = vars(parse_instructions('')[0])
+    for text, changed, remaining in INSTRUCTIONS:
+        options, rest = parse_instructions(text)
+        assert vars(options) == {**defaults, **changed}, (text, options)
+        assert rest == remaining, (text, rest)
+    print('instructions OK')
+
+
+def run_custom(n_rows=200_000, chunksize=2_000):
+    from utils.sandbox import get_sandbox
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'dirty.csv')
+        write_dirty(path, n_rows)
+        sandbox = get_sandbox()
+        # Warm the worker pool so neither variant pays for process start
+        sandbox.run('result = 1', pd.DataFrame({'a': [1]}))
+
+        def compiled_once(chunk):
+            return sandbox.run(CUSTOM_CODE, chunk, call='data_cleaner')['result']
+
+        def exec_each(chunk):
+            # What a per-chunk exec costs: a new code string defeats the cache
+            exec_each.calls += 1
+            return sandbox.run(CUSTOM_CODE + f'\n# {exec_each.calls}', chunk, call='data_cleaner')['result']
+        exec_each.calls = 0
+
+        results = {}
+        for name, custom in (('compiled once', compiled_once), ('exec per chunk', exec_each)):
+            start = time.perf_counter()
+            report = clean_csv(path, os.path.join(tmp, f'{name}.csv'), custom=custom, chunksize=chunksize)
+            results[name] = pd.read_csv(os.path.join(tmp, f'{name}.csv'))
+            print(f'custom code, {name:>14}: {time.perf_counter() - start:.2f}s ({report["rows_out"]:,} rows)')
+        pd.testing.assert_frame_equal(results['compiled once'], results['exec per chunk'])
+
+
+def run(sizes=(200_000, 2_000_000, 5_000_000)):
+    tmp = tempfile.mkdtemp(prefix='bench_cleaning_')
+    for n_rows in sizes:
+        path = os.path.join(tmp, f'dirty_{n_rows}.csv')
+        write_dirty(path, n_rows)
+        mb = os.path.getsize(path) / 2**20
+        rows, seconds, rss = peak(in_memory, path)
+        line = f'{mb:>6.0f} MB CSV | whole frame: {seconds:5.1f}s, peak {rss:6.0f} MB'
+        rows_chunked, seconds, rss = peak(chunked, path)
+        print(f'{line} | chunked: {seconds:5.1f}s, peak {rss:6.0f} MB ({rows:,} / {rows_chunked:,} rows kept)')
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    check_instructions()
+    check_equivalence()
+    run_custom()
+    run()
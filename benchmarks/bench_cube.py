@@ -0,0 +1,95 @@
+# benchmarks/bench_cube.py
+# The three EDA groupbys (copy + derive calendar columns + regroup the rows)
+# against one CalendarCube build and its rollups, plus extending the cube
+# with new weeks against rebuilding it. Rollups are checked against the
+# legacy groupbys and the extended cube against a full build first.
+#
+#   python -m benchmarks.bench_cube
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_process_level import DATE_COL, KEY_COLS, TARGET_COL, make_data
+from utils.calendar_cube import CalendarCube
+from utils.fill_missing_weeks import process_level
+from utils.panel import Panel
+
+
+def legacy_groupbys(df):
+    # What plot_yearly_trend / plot_monthly_trend / plot_weekly_trend computed
+    yearly = df.copy()
+    yearly['Year'] = yearly[DATE_COL].dt.year
+    yearly['Week'] = yearly[DATE_COL].dt.isocalendar().week
+    yearly = yearly.groupby(['Year', 'Week'])[TARGET_COL].sum()
+    monthly = df.copy()
+    monthly['Year'] = monthly[DATE_COL].dt.year
+    monthly['Month'] = monthly[DATE_COL].dt.month
+    monthly = monthly.groupby(['Year', 'Month'])[TARGET_COL].sum()
+    weekly = df.copy()
+    weekly['Week'] = pd.to_datetime(weekly[DATE_COL]).dt.isocalendar().week
+    weekly = weekly.groupby('Week')[TARGET_COL].sum()
+    return yearly, monthly, weekly
+
+
+def cube_rollups(cube):
+    return cube.rollup(['Year', 'ISO Week']), cube.rollup(['Year', 'Month']), cube.rollup('ISO Week')
+
+
+def check_equivalence(n_intersections=2_000):
+    df, df_time = make_data(n_intersections)
+    df = process_level(df, df_time, KEY_COLS, TARGET_COL)
+    cube = CalendarCube.from_long(df, DATE_COL, KEY_COLS, TARGET_COL)
+    for legacy, rolled in zip(legacy_groupbys(df), cube_rollups(cube)):
+        assert np.allclose(legacy.to_numpy(dtype='float64'), rolled.to_numpy()), 'rollup mismatch'
+
+    by_key = df.groupby(KEY_COLS[0], observed=True)[TARGET_COL].agg(['sum', 'mean'])
+    assert np.allclose(by_key['sum'], cube.key_totals(KEY_COLS[0]).reindex(by_key.index))
+    assert np.allclose(by_key['mean'], cube.key_totals(KEY_COLS[0], 'mean').reindex(by_key.index))
+
+    # Extending a cube built up to a cutoff matches a cube built on everything
+    panel = Panel.from_long(df, DATE_COL, KEY_COLS, TARGET_COL)
+    cutoff = panel.weeks[len(panel.weeks) // 2]
+    extended = CalendarCube.from_panel(panel.between(end=cutoff)).extend(panel)
+    full = CalendarCube.from_panel(panel)
+    for col in KEY_COLS:
+        assert np.allclose(extended.sums[col].reindex(full.sums[col].index).to_numpy(), full.sums[col].to_numpy())
+        assert (extended.counts[col].reindex(full.counts[col].index).to_numpy() == full.counts[col].to_numpy()).all()
+    assert np.allclose(extended.rollup('Month Start').to_numpy(), full.rollup('Month Start').to_numpy())
+    assert np.allclose(full.between(end=cutoff).rollup('Year Start').to_numpy(),
+                       CalendarCube.from_panel(panel.between(end=cutoff)).rollup('Year Start').to_numpy())
+    print('equivalence OK')
+
+
+def run(n_intersections=50_000, new_weeks=4):
+    df, df_time = make_data(n_intersections)
+    df = process_level(df, df_time, KEY_COLS, TARGET_COL)
+    print(f'{len(df):,} processed rows, {n_intersections:,} intersections')
+
+    start = time.perf_counter()
+    legacy_groupbys(df)
+    print(f'legacy EDA groupbys (every rerun): {time.perf_counter() - start:.2f}s')
+
+    panel = Panel.from_long(df, DATE_COL, KEY_COLS, TARGET_COL)
+    start = time.perf_counter()
+    cube = CalendarCube.from_panel(panel)
+    print(f'cube build (once):                 {time.perf_counter() - start:.2f}s, '
+          f'{cube.nbytes / 2**20:.1f} MB')
+
+    start = time.perf_counter()
+    cube_rollups(cube)
+    print(f'cube rollups (first rerun):        {time.perf_counter() - start:.4f}s')
+    start = time.perf_counter()
+    cube_rollups(cube)
+    print(f'cube rollups (later reruns):       {time.perf_counter() - start:.6f}s')
+
+    cutoff = panel.weeks[-new_weeks - 1]
+    base = CalendarCube.from_panel(panel.between(end=cutoff))
+    start = time.perf_counter()
+    base.extend(panel)
+    print(f'extend by {new_weeks} weeks:                 {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    check_equivalence()
+    run()
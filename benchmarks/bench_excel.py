@@ -0,0 +1,71 @@
+# benchmarks/bench_excel.py
+# Loading the same actuals as .xlsx with pd.read_excel, as .xlsx parsed once
+# by the streaming reader (cold, includes writing the Arrow cache), from the
+# memory-mapped Arrow cache (warm) and as .csv with pd.read_csv.
+#
+#   python -m benchmarks.bench_excel
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.bench_process_level import make_data
+from utils.excel import load_excel, read_excel_streaming
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sample_time_series_for_app.xlsx')
+
+
+def write_workbook(path, n_intersections):
+    from openpyxl import Workbook
+
+    df, _ = make_data(n_intersections)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(list(df.columns))
+    for row in df.itertuples(index=False):
+        sheet.append([row[0].to_pydatetime(), *row[1:]])
+    workbook.save(path)
+    return df
+
+
+def timed(load):
+    start = time.perf_counter()
+    df = load()
+    return time.perf_counter() - start, df
+
+
+def compare(path, csv_path):
+    cache_dir = tempfile.mkdtemp(prefix='bench_excel_')
+    results = {
+        'pd.read_excel': timed(lambda: pd.read_excel(path)),
+        'streaming parse': timed(lambda: read_excel_streaming(path)),
+        'cold (parse + cache)': timed(lambda: load_excel(path, cache_dir=cache_dir)),
+        'warm (mmap cache)': timed(lambda: load_excel(path, cache_dir=cache_dir)),
+        'pd.read_csv': timed(lambda: pd.read_csv(csv_path)),
+    }
+    expected = results['pd.read_excel'][1]
+    for name in ('streaming parse', 'warm (mmap cache)'):
+        assert results[name][1].astype(str).equals(expected.astype(str)), f'{name} differs from pd.read_excel'
+    shutil.rmtree(cache_dir)
+    print(f'{os.path.basename(path)}: {len(expected):,} rows x {expected.shape[1]} columns')
+    for name, (seconds, _) in results.items():
+        print(f'  {name:>22}: {seconds:8.3f}s')
+
+
+def run(n_intersections=500):
+    tmp = tempfile.mkdtemp(prefix='bench_excel_')
+    csv_path = os.path.join(tmp, 'sample.csv')
+    pd.read_excel(SAMPLE).to_csv(csv_path, index=False)
+    compare(SAMPLE, csv_path)
+
+    path = os.path.join(tmp, 'actuals.xlsx')
+    df = write_workbook(path, n_intersections)
+    df.to_csv(csv_path, index=False)
+    compare(path, csv_path)
+    shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,72 @@
+# benchmarks/bench_fiscal_calendar.py
+# Fiscal month roll-up of processed rows by splitting the 'Stat R Attribute
+# Week' string on every rerun against integer week-id lookups into the parsed
+# calendar, plus parse vs columnar-file load of the calendar itself.
+#
+#   python -m benchmarks.bench_fiscal_calendar
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_process_level import DATE_COL, KEY_COLS, TARGET_COL, make_data
+from utils.dates import normalize_dates
+from utils.fill_missing_weeks import process_level
+from utils.fiscal_calendar import ATTRIBUTE_COL, load_fiscal_calendar, parse_fiscal_calendar, week_ids
+
+TIME_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'time_dimension.csv')
+
+
+def time_dimension():
+    df_time = pd.read_csv(TIME_FILE, encoding='utf-8-sig')
+    df_time[DATE_COL] = normalize_dates(df_time[DATE_COL])[0]
+    return df_time
+
+
+def string_rollup(df, df_time):
+    # Join the packed attribute onto every row and split it there
+    joined = df.merge(df_time[[DATE_COL, ATTRIBUTE_COL]], on=DATE_COL, how='left')
+    fiscal_month = joined[ATTRIBUTE_COL].str.split('|').str[2]
+    return joined.groupby(fiscal_month, sort=False)[TARGET_COL].sum()
+
+
+def id_rollup(df, calendar):
+    ids = week_ids(calendar, df[DATE_COL])
+    month_ids = calendar['fiscal_month_id'].to_numpy()[ids]
+    sums = np.bincount(month_ids, weights=df[TARGET_COL].to_numpy(dtype='float64'))
+    labels = calendar.drop_duplicates('fiscal_month_id')['Fiscal Month'].astype(str).to_numpy()
+    return pd.Series(sums, index=labels[:len(sums)])
+
+
+def run(n_intersections=5_000):
+    df_time = time_dimension()
+    df, _ = make_data(n_intersections)
+    # Synthetic weeks moved onto the real time dimension's Monday grid
+    shift = df_time[DATE_COL].min() - df[DATE_COL].min()
+    df[DATE_COL] = df[DATE_COL] + shift
+    df = process_level(df, df_time[[DATE_COL]], KEY_COLS, TARGET_COL)
+    print(f'{len(df):,} processed rows')
+
+    start = time.perf_counter()
+    calendar = parse_fiscal_calendar(df_time)
+    print(f'parse calendar:        {time.perf_counter() - start:.4f}s')
+    path = os.path.join(tempfile.mkdtemp(), 'fiscal.parquet')
+    load_fiscal_calendar(df_time, path)
+    start = time.perf_counter()
+    load_fiscal_calendar(df_time, path)
+    print(f'load columnar file:    {time.perf_counter() - start:.4f}s')
+
+    start = time.perf_counter()
+    by_string = string_rollup(df, df_time)
+    print(f'string split rollup:   {time.perf_counter() - start:.2f}s')
+    start = time.perf_counter()
+    by_id = id_rollup(df, calendar)
+    print(f'integer id rollup:     {time.perf_counter() - start:.2f}s')
+    assert np.allclose(by_string.reindex(by_id.index).fillna(0).to_numpy(), by_id.to_numpy())
+    print('rollups match')
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,167 @@
+# benchmarks/bench_ingest.py
+# Peak memory (max RSS of a fresh process) and time of reading an actuals CSV
+# whole with pd.read_csv against streaming it through ingest_csv, for growing
+# file sizes, then of the full path to the processed frame: read_csv +
+# process_level against ingest_csv + process_ingested. The streamed +
+# partitioned processing is checked against process_level on the whole file first,
+# and moving the end date against a fresh ingest.
+#
+#   python -m benchmarks.bench_ingest
+import glob
+import json
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_process_level import DATE_COL, KEY_COLS, TARGET_COL, make_data
+from utils.fill_missing_weeks import process_level
+from utils.ingest import ingest_csv, process_ingested
+from utils.pipeline import PipelineCache, process_large_csv
+
+EXTRA_COLS = {'Version.[Version Name]': 'CurrentWorkingView', 'Comment': 'unused text column'}
+
+
+def write_csv(path, n_intersections, duplicate_share=0.05, seed=0):
+    # Tenant-style extract: dd-Mon-yy dates, an unused text column and some
+    # duplicated key/week rows
+    df, df_time = make_data(n_intersections, seed=seed)
+    rng = np.random.default_rng(seed)
+    df = pd.concat([df, df.sample(frac=duplicate_share, random_state=seed)], ignore_index=True)
+    df = df.iloc[rng.permutation(len(df))]
+    for col, value in EXTRA_COLS.items():
+        df[col] = value
+    df[DATE_COL] = df[DATE_COL].dt.strftime('%d-%b-%y')
+    df.to_csv(path, index=False)
+    return df_time
+
+
+def _peak_rss_mb():
+    # VmHWM starts fresh at exec; ru_maxrss would include the forking parent's
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM')) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(target, args, queue):
+    start = time.perf_counter()
+    rows = target(*args)
+    queue.put((rows, time.perf_counter() - start, _peak_rss_mb()))
+
+
+def in_memory(path, df_time):
+    df = pd.read_csv(path)
+    df[DATE_COL] = pd.to_datetime(df[DATE_COL], format='%d-%b-%y')
+    return len(df)
+
+
+def streamed(path, df_time, chunksize=200_000, partition_mb=32):
+    out_dir = tempfile.mkdtemp(prefix='bench_ingest_')
+    return ingest_csv(path, out_dir, DATE_COL, KEY_COLS, TARGET_COL, chunksize=chunksize,
+                      partition_mb=partition_mb)['rows_written']
+
+
+def in_memory_processed(path, df_time):
+    df = pd.read_csv(path, usecols=[DATE_COL] + KEY_COLS + [TARGET_COL])
+    df[DATE_COL] = pd.to_datetime(df[DATE_COL], format='%d-%b-%y')
+    return len(process_level(df, df_time, KEY_COLS, TARGET_COL))
+
+
+def streamed_processed(path, df_time, chunksize=200_000, partition_mb=32):
+    out_dir = tempfile.mkdtemp(prefix='bench_ingest_')
+    ingest_csv(path, out_dir, DATE_COL, KEY_COLS, TARGET_COL, chunksize=chunksize, partition_mb=partition_mb)
+    return len(process_ingested(out_dir, df_time, KEY_COLS, TARGET_COL))
+
+
+def peak(target, *args):
+    # Fresh process per measurement so max RSS is its own
+    ctx = mp.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_measure, args=(target, args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def check_equivalence(n_intersections=1_000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'actuals.csv')
+        df_time = write_csv(path, n_intersections)
+        df = pd.read_csv(path, usecols=[DATE_COL] + KEY_COLS + [TARGET_COL])
+        df[DATE_COL] = pd.to_datetime(df[DATE_COL], format='%d-%b-%y')
+        df = df.groupby(KEY_COLS + [DATE_COL], sort=True)[TARGET_COL].sum(min_count=1).reset_index()
+        expected = process_level(df, df_time, KEY_COLS, TARGET_COL)
+
+        out_dir = os.path.join(tmp, 'parts')
+        ingest_csv(path, out_dir, DATE_COL, KEY_COLS, TARGET_COL, chunksize=50_000, n_partitions=7)
+        # Intersections are ordered within each partition only
+        order = KEY_COLS + [DATE_COL]
+        result = process_ingested(out_dir, df_time, KEY_COLS, TARGET_COL)
+        result = result.astype({col: 'int64' for col in KEY_COLS}).sort_values(order).reset_index(drop=True)
+        expected = expected.sort_values(order).reset_index(drop=True)
+        for col in [DATE_COL] + KEY_COLS:
+            assert (result[col].astype(str).to_numpy() == expected[col].astype(str).to_numpy()).all(), col
+        assert np.allclose(result[TARGET_COL].to_numpy(dtype='float64'), expected[TARGET_COL].to_numpy(dtype='float64'))
+    print('equivalence OK')
+
+
+def check_end_date_reuse(n_intersections=300):
+    # Moving the end date earlier reuses the ingest (the grid cuts it), later
+    # replaces it; results match a fresh ingest and the directories count
+    # towards the disk budget
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'actuals.csv')
+        df_time = write_csv(path, n_intersections)
+        weeks = df_time[DATE_COL].sort_values().reset_index(drop=True)
+        ends = [weeks.iloc[-10], weeks.iloc[-40], weeks.iloc[-1]]
+        cache = PipelineCache(cache_dir=os.path.join(tmp, 'cache'))
+
+        def ingests():
+            return glob.glob(os.path.join(cache.cache_dir, 'ingest_*'))
+
+        for i, end_date in enumerate(ends):
+            result = process_large_csv(cache, path, b'time', df_time, DATE_COL, TARGET_COL, KEY_COLS, end_date)
+            fresh = PipelineCache(cache_dir=os.path.join(tmp, f'fresh_{i}'))
+            expected = process_large_csv(fresh, path, b'time', df_time, DATE_COL, TARGET_COL, KEY_COLS, end_date)
+            order = KEY_COLS + [DATE_COL]
+            pd.testing.assert_frame_equal(result.sort_values(order).reset_index(drop=True),
+                                          expected.sort_values(order).reset_index(drop=True))
+            assert result[DATE_COL].max() <= end_date
+            assert len(ingests()) == 1
+            with open(os.path.join(ingests()[0], '_ingest.json')) as f:
+                assert json.load(f)['end_date'] == str(max(ends[:i + 1]).date())
+        assert not glob.glob(os.path.join(ingests()[0], 'processed_*'))
+        cache.max_disk_bytes = 0
+        cache._trim_disk()
+        assert not ingests()
+    print('end date reuse OK')
+
+
+def run(sizes=(5_000, 20_000, 40_000)):
+    tmp = tempfile.mkdtemp(prefix='bench_ingest_')
+    for n_intersections in sizes:
+        path = os.path.join(tmp, f'actuals_{n_intersections}.csv')
+        df_time = write_csv(path, n_intersections)
+        mb = os.path.getsize(path) / 2**20
+        rows, seconds, rss = peak(in_memory, path, df_time)
+        line = f'{mb:>7.0f} MB CSV, {rows:>10,} rows | read_csv whole: {seconds:5.1f}s, peak {rss:6.0f} MB'
+        rows, seconds, rss = peak(streamed, path, df_time)
+        print(f'{line} | streamed: {seconds:5.1f}s, peak {rss:6.0f} MB ({rows:,} rows written)')
+        rows, seconds, rss = peak(in_memory_processed, path, df_time)
+        line = f'{"":>7}    processed, {rows:>10,} rows | read_csv + process_level: {seconds:5.1f}s, peak {rss:6.0f} MB'
+        rows, seconds, rss = peak(streamed_processed, path, df_time)
+        print(f'{line} | ingest + process_ingested: {seconds:5.1f}s, peak {rss:6.0f} MB')
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    check_equivalence()
+    check_end_date_reuse()
+    run()
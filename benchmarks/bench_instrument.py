@@ -0,0 +1,67 @@
+# benchmarks/bench_instrument.py
+# Cost of a span with instrumentation disabled (the default) and enabled,
+# per span and relative to process_level on a mid-sized panel; plus a check
+# that each span's peak RSS is its own (an earlier large allocation does not
+# leak into a later small span).
+#
+#   python -m benchmarks.bench_instrument
+import time
+
+import numpy as np
+
+from benchmarks.bench_process_level import DATE_COL, KEY_COLS, TARGET_COL, make_data
+from utils.fill_missing_weeks import process_level
+from utils.instrument import Recorder, disable, enable, span
+
+
+def per_span(n=200_000):
+    start = time.perf_counter()
+    for _ in range(n):
+        with span('stage'):
+            pass
+    return (time.perf_counter() - start) / n
+
+
+def check_peaks():
+    recorder = enable(Recorder())
+    with span('large'):
+        block = np.ones(400 * 2**20 // 8)
+        del block
+    with span('small'):
+        block = np.ones(2**20 // 8)
+        del block
+    disable()
+    large, small = recorder.records
+    assert large['peak_rss_mb'] - small['peak_rss_mb'] > 300, (large, small)
+    print(f"peaks OK: large span {large['peak_rss_mb']:.0f} MB, small span {small['peak_rss_mb']:.0f} MB")
+
+
+def run(n_intersections=5_000):
+    df, df_time = make_data(n_intersections)
+
+    def stage():
+        with span('process_level'):
+            process_level(df, df_time, KEY_COLS, TARGET_COL, DATE_COL)
+
+    disable()
+    off = per_span()
+    start = time.perf_counter()
+    stage()
+    baseline = time.perf_counter() - start
+
+    enable(Recorder())
+    on = per_span(20_000)
+    start = time.perf_counter()
+    stage()
+    traced = time.perf_counter() - start
+    disable()
+
+    print(f'span disabled: {off * 1e9:8.0f} ns/span')
+    print(f'span enabled:  {on * 1e6:8.1f} us/span')
+    print(f'process_level on {n_intersections:,} intersections: {baseline:.3f}s untraced, {traced:.3f}s traced '
+          f'(span overhead {on / baseline:.4%})')
+
+
+if __name__ == '__main__':
+    check_peaks()
+    run()
@@ -0,0 +1,71 @@
+# benchmarks/bench_llm.py
+# Time to first token of a streamed completion against the full blocking
+# call, and total latency of a batch of questions answered one at a time vs
+# concurrently, all against the local fake endpoint (no API key needed).
+#
+#   python -m benchmarks.bench_llm
+import os
+import tempfile
+import time
+
+from benchmarks.fake_llm import serve
+from utils.llm_cache import LLMCache
+
+MODEL = 'gpt-4o-mini-2024-07-18'
+QUESTIONS = [f'Question {i}: which month had the highest sales?' for i in range(16)]
+
+
+def fresh_cache():
+    # Empty cache per measurement so nothing is served without a request
+    return LLMCache(cache_dir=tempfile.mkdtemp(prefix='bench_llm_'))
+
+
+def messages(question):
+    return [{'role': 'user', 'content': question}]
+
+
+def run(ttft=0.3, token_delay=0.01, n_tokens=50):
+    server, url = serve(ttft, token_delay, n_tokens)
+    os.environ['OPENAI_BASE_URL'] = url
+    os.environ.setdefault('OPENAI_API_KEY', 'fake')
+    from utils import llm_client
+    from utils.llm_client import complete_many, get_client, stream_completion
+
+    llm_client._client = llm_client._async = None  # pick up the fake base URL
+    client = get_client()
+    print(f'Fake endpoint: TTFT {ttft}s, {n_tokens} tokens x {token_delay}s')
+
+    start = time.perf_counter()
+    client.chat.completions.create(model=MODEL, messages=messages(QUESTIONS[0]))
+    print(f'{"blocking call":>24}: first text after {time.perf_counter() - start:.2f}s')
+
+    first = []
+    start = time.perf_counter()
+    stream_completion(MODEL, messages(QUESTIONS[0]), cache=fresh_cache(),
+                      on_token=lambda text: first or first.append(time.perf_counter() - start))
+    total = time.perf_counter() - start
+    print(f'{"streamed":>24}: TTFT {first[0]:.2f}s, total {total:.2f}s')
+
+    start = time.perf_counter()
+    cache = fresh_cache()
+    for question in QUESTIONS:
+        stream_completion(MODEL, messages(question), cache=cache)
+    print(f'{"batch, sequential":>24}: {len(QUESTIONS)} questions in {time.perf_counter() - start:.2f}s')
+
+    for concurrency in (1, 4, 8, 16):
+        start = time.perf_counter()
+        answers = complete_many(MODEL, [messages(q) for q in QUESTIONS], concurrency=concurrency, cache=fresh_cache())
+        failed = sum(isinstance(answer, Exception) for answer in answers)
+        print(f'{f"batch, concurrency={concurrency}":>24}: {len(QUESTIONS)} questions in '
+              f'{time.perf_counter() - start:.2f}s ({failed} failed)')
+
+    cache = fresh_cache()
+    complete_many(MODEL, [messages(q) for q in QUESTIONS], concurrency=8, cache=cache)
+    start = time.perf_counter()
+    complete_many(MODEL, [messages(q) for q in QUESTIONS], concurrency=8, cache=cache)
+    print(f'{"batch, cached":>24}: {len(QUESTIONS)} questions in {time.perf_counter() - start:.3f}s')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,131 @@
+# benchmarks/bench_plots.py
+# EDA chart rendering (utils/plots.py) over decades of weekly history: the
+# previous global-pyplot drawing with a marker on every point against
+# per-call figures with LTTB-downsampled lines, cold and from the render
+# cache; plus LTTB sanity checks and renders from concurrent threads
+# matching serial ones.
+#
+#   python -m benchmarks.bench_plots
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import DATE_COL, KEY_COLS, TARGET_COL, make_tenant
+from utils.calendar_cube import CalendarCube
+from utils.panel import Panel
+from utils.plots import (MAX_POINTS, _draw_by_year, _draw_bars, _draw_lines, clear_render_cache, downsample, lttb,
+                         render)
+
+
+def make_cube(n_intersections=500, years=40, seed=0):
+    df, _ = make_tenant(n_intersections, 52 * years, seed=seed, as_strings=False)
+    return CalendarCube.from_panel(Panel.from_long(df, DATE_COL, KEY_COLS, TARGET_COL))
+
+
+def legacy(draw):
+    # What st.pyplot(plt) did with the old helpers: the global figure, saved to PNG
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 6))
+    draw(plt)
+    buffer = io.BytesIO()
+    plt.savefig(buffer, format='png')
+    plt.close('all')
+    return buffer.getvalue()
+
+
+def legacy_charts(cube, key_col):
+    yearly, monthly = cube.rollup(['Year', 'ISO Week']), cube.rollup(['Year', 'Month'])
+    fiscal = cube.rollup('Fiscal Month')
+    weekly = cube.sums[key_col].loc[cube.key_totals(key_col).nlargest(10).index].T
+
+    def by_year(grouped, level):
+        def draw(plt):
+            for year, year_data in grouped.groupby(level='Year'):
+                plt.plot(year_data.index.get_level_values(level), year_data.to_numpy(), marker='o', label=str(year))
+            plt.legend(title='Year')
+            plt.grid(True)
+        return draw
+
+    def bars(plt):
+        plt.bar(fiscal.index.astype(str), fiscal.to_numpy())
+        plt.xticks(rotation=90)
+
+    def lines(plt):
+        for col in weekly.columns:
+            plt.plot(weekly.index, weekly[col].to_numpy(), marker='o', label=str(col))
+        plt.legend()
+
+    return {'yearly': by_year(yearly, 'ISO Week'), 'monthly': by_year(monthly, 'Month'), 'fiscal': bars,
+            'drilldown': lines}
+
+
+def charts(cube, key_col):
+    weekly = cube.sums[key_col].loc[cube.key_totals(key_col).nlargest(10).index].T.rename_axis(columns=key_col)
+    return {
+        'yearly': lambda: render('yearly', cube.rollup(['Year', 'ISO Week']), _draw_by_year, level='ISO Week',
+                                 title='Year-over-Year Weekly Trend', xlabel='Week Number'),
+        'monthly': lambda: render('monthly', cube.rollup(['Year', 'Month']), _draw_by_year, level='Month',
+                                  title='Year-over-Year Monthly Trend', xlabel='Month Number',
+                                  xticks=tuple(range(1, 13))),
+        'fiscal': lambda: render('fiscal', cube.rollup('Fiscal Month'), _draw_bars, grain='Fiscal Month'),
+        'drilldown': lambda: render('drilldown', weekly, _draw_lines, title='Top 10', max_points=MAX_POINTS),
+    }
+
+
+def check_lttb():
+    rng = np.random.default_rng(0)
+    y = rng.normal(100, 5, 20_000)
+    y[[1_234, 7_777, 15_000]] = [400, -200, 350]
+    keep = lttb(np.arange(len(y)), y, 500)
+    assert len(keep) == 500 and keep[0] == 0 and keep[-1] == len(y) - 1 and (np.diff(keep) > 0).all()
+    assert {1_234, 7_777, 15_000} <= set(keep.tolist()), 'spikes dropped'
+    series = pd.Series(y[:300], index=pd.date_range('2000-01-03', periods=300, freq='W-MON'))
+    assert downsample(series, 500) is series
+    assert downsample(series, 100).index.is_monotonic_increasing
+    print('lttb OK')
+
+
+def check_concurrent(cube, key_col):
+    renders = charts(cube, key_col)
+    clear_render_cache()
+    serial = {name: draw() for name, draw in renders.items()}
+    for _ in range(3):
+        clear_render_cache()
+        with ThreadPoolExecutor(8) as pool:
+            futures = {name: pool.submit(draw) for name, draw in list(renders.items()) * 2}
+        assert all(futures[name].result() == png for name, png in serial.items())
+    print('concurrent renders OK')
+
+
+def timed(func, repeats=3):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(years=(10, 40), key_col=KEY_COLS[3]):
+    for n_years in years:
+        cube = make_cube(years=n_years)
+        old, new = legacy_charts(cube, key_col), charts(cube, key_col)
+        print(f'{n_years} years of weekly history ({len(cube.weeks):,} weeks)')
+        for name in new:
+            before = timed(lambda: legacy(old[name]))
+            cold = timed(lambda: (clear_render_cache(), new[name]()))
+            warm = timed(new[name], 20)
+            print(f'  {name:>10}: global pyplot {before:6.3f}s | per-call figure {cold:6.3f}s | '
+                  f'cached {warm * 1e3:6.2f} ms')
+
+
+if __name__ == '__main__':
+    check_lttb()
+    check_concurrent(make_cube(years=10), KEY_COLS[3])
+    run()
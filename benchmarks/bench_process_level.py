@@ -0,0 +1,186 @@
+# benchmarks/bench_process_level.py
+# Checks the vectorized process_level against the original per-group merge loop
+# and times how it scales with the number of intersections; the pipeline cache's
+# size accounting follows the IncrementalLevel and base cube as they grow.
+#
+#   python -m benchmarks.bench_process_level
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.fill_missing_weeks import IncrementalLevel, process_level, process_level_parallel
+from utils.panel import Panel
+from utils.pipeline import (PipelineCache, _cache_key, _size_of, build_cube, build_panel, process_uploads,
+                            processing_key)
+
+DATE_COL = 'Time.[Week]'
+KEY_COLS = ['Item.[Stat Item]', 'Location.[Stat Location]', 'Sales Domain.[Stat Customer Group]']
+TARGET_COL = 'Actual'
+
+
+def legacy_process_level(df, df_time, forecast_level, col_sales):
+    # The original implementation, kept here as the reference for equivalence
+    results = []
+    for keys, group in df.groupby(forecast_level):
+        if not isinstance(keys, tuple):
+            keys = (keys,)
+        merged_group = pd.merge(df_time, group, on=DATE_COL, how='left')
+        for col, key in zip(forecast_level, keys):
+            merged_group[col] = key
+        merged_group.fillna(0, inplace=True)
+        merged_group[col_sales] = merged_group[col_sales].clip(lower=0)
+        merged_group.sort_values(by=DATE_COL, inplace=True)
+        merged_group['Cumulative Sum'] = merged_group[col_sales].cumsum()
+        results.append(merged_group[merged_group['Cumulative Sum'] != 0].drop(columns=['Cumulative Sum']))
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+
+def make_data(n_intersections, n_weeks=260, density=0.6, seed=0):
+    rng = np.random.default_rng(seed)
+    weeks = pd.date_range('2019-01-07', periods=n_weeks, freq='W-MON')
+    df_time = pd.DataFrame({DATE_COL: weeks})
+
+    keys = pd.DataFrame({
+        KEY_COLS[0]: rng.integers(100000, 200000, n_intersections),
+        KEY_COLS[1]: rng.integers(6000, 6200, n_intersections),
+        KEY_COLS[2]: rng.integers(450000000, 450000100, n_intersections),
+    }).drop_duplicates(ignore_index=True)
+
+    key_idx = np.repeat(np.arange(len(keys)), n_weeks)
+    week_idx = np.tile(np.arange(n_weeks), len(keys))
+    start = rng.integers(0, n_weeks, len(keys))
+    mask = (week_idx >= start[key_idx]) & (rng.random(len(key_idx)) < density)
+    key_idx, week_idx = key_idx[mask], week_idx[mask]
+
+    df = keys.iloc[key_idx].reset_index(drop=True)
+    df.insert(0, DATE_COL, weeks[week_idx])
+    sales = rng.gamma(1.5, 200.0, len(df)).round()
+    sales[rng.random(len(df)) < 0.05] *= -1
+    sales[rng.random(len(df)) < 0.1] = 0
+    df[TARGET_COL] = sales
+    return df, df_time
+
+
+def check_equivalence():
+    for n in (1, 10, 200):
+        df, df_time = make_data(n, n_weeks=104, seed=n)
+        expected = legacy_process_level(df, df_time, KEY_COLS, TARGET_COL)
+        actual = process_level(df, df_time, KEY_COLS, TARGET_COL)
+        pd.testing.assert_frame_equal(actual, expected[actual.columns], check_dtype=False)
+
+    # Duplicate key/week rows, missing targets and weeks outside the time dimension
+    df, df_time = make_data(50, n_weeks=52, seed=7)
+    df = pd.concat([df, df.sample(100, random_state=1)], ignore_index=True)
+    df.loc[df.sample(30, random_state=2).index, TARGET_COL] = np.nan
+    df_time = df_time.iloc[5:]
+    expected = legacy_process_level(df, df_time, KEY_COLS, TARGET_COL)
+    actual = process_level(df, df_time, KEY_COLS, TARGET_COL)
+    pd.testing.assert_frame_equal(actual, expected[actual.columns], check_dtype=False)
+
+    # Rows with a NaN key are dropped, as the per-group loop's groupby did
+    df, df_time = make_data(50, n_weeks=52, seed=8)
+    df[KEY_COLS[0]] = df[KEY_COLS[0]].astype('float64')
+    df.loc[df.sample(40, random_state=3).index, KEY_COLS[0]] = np.nan
+    expected = legacy_process_level(df, df_time, KEY_COLS, TARGET_COL)
+    actual = process_level(df, df_time, KEY_COLS, TARGET_COL)
+    pd.testing.assert_frame_equal(actual, expected[actual.columns], check_dtype=False)
+    panel = Panel.from_long(df, DATE_COL, KEY_COLS, TARGET_COL)
+    assert len(panel.keys) == len(df.dropna(subset=KEY_COLS)[KEY_COLS].drop_duplicates())
+    print('✅ process_level matches the per-group reference')
+
+    df, df_time = make_data(2_000, n_weeks=104, seed=3)
+    serial = process_level(df, df_time, KEY_COLS, TARGET_COL)
+    for workers in (2, 3):
+        parallel = process_level_parallel(df, df_time, KEY_COLS, TARGET_COL, workers=workers, max_partition_mb=1)
+        pd.testing.assert_frame_equal(parallel, serial)
+    print('✅ process_level_parallel matches the serial path')
+
+    df, df_time = make_data(500, n_weeks=104, seed=4)
+    weeks = df_time[DATE_COL]
+    level = IncrementalLevel(df[df[DATE_COL] <= weeks[80]], df_time, KEY_COLS, TARGET_COL)
+    for end in (weeks[40], weeks[70], weeks[20], weeks[80]):
+        expected = process_level(df[df[DATE_COL] <= end], df_time[weeks <= end], KEY_COLS, TARGET_COL)
+        pd.testing.assert_frame_equal(level.result(end), expected)
+    level.append(df[(df[DATE_COL] > weeks[80]) & (df[DATE_COL] <= weeks[90])])
+    level.append(df[df[DATE_COL] > weeks[90]])
+    pd.testing.assert_frame_equal(level.result(weeks.iloc[-1]), process_level(df, df_time, KEY_COLS, TARGET_COL))
+    level.append(df.sample(50, random_state=5))  # late corrections to already processed weeks
+    pd.testing.assert_frame_equal(level.result(weeks.iloc[-1]),
+                                  process_level(level.actuals, df_time, KEY_COLS, TARGET_COL))
+    print('✅ IncrementalLevel matches a full recompute')
+
+
+def check_cache_accounting(n=2_000):
+    # The IncrementalLevel and the base cube grow in place as the end date
+    # moves; the cache's memory figure follows them
+    df, df_time = make_data(n, n_weeks=104, seed=6)
+    weeks = df_time[DATE_COL]
+    cache = PipelineCache(cache_dir=tempfile.mkdtemp(prefix='bench_cache_'))
+    for end in (weeks[20], weeks[60], weeks.iloc[-1]):
+        processed = process_uploads(cache, b'actuals', b'time', df, df_time, DATE_COL, TARGET_COL, KEY_COLS, end)
+        parts = processing_key(b'actuals', b'time', DATE_COL, TARGET_COL, KEY_COLS, end)
+        build_cube(cache, build_panel(cache, processed, parts, DATE_COL, KEY_COLS, TARGET_COL), parts)
+        for key in (_cache_key('incremental', parts[:-1] + ((),)), _cache_key('cube', parts[:-1])):
+            value, size = cache._entries[key]
+            assert size == _size_of(value) > 0
+        assert cache._memory_bytes == sum(size for _, size in cache._entries.values())
+    print('✅ PipelineCache sizes follow in-place growth')
+
+
+def run(sizes=(1_000, 10_000, 50_000, 100_000), legacy_limit=1_000):
+    print(f"{'intersections':>14} {'rows in':>12} {'rows out':>12} {'vectorized s':>13} {'legacy s':>10}")
+    for n in sizes:
+        df, df_time = make_data(n)
+
+        start = time.perf_counter()
+        out = process_level(df, df_time, KEY_COLS, TARGET_COL)
+        vectorized = time.perf_counter() - start
+
+        legacy = ''
+        if n <= legacy_limit:
+            start = time.perf_counter()
+            legacy_process_level(df, df_time, KEY_COLS, TARGET_COL)
+            legacy = f'{time.perf_counter() - start:.2f}'
+
+        print(f'{n:>14,} {len(df):>12,} {len(out):>12,} {vectorized:>13.2f} {legacy:>10}')
+
+
+def run_workers(n=100_000, workers=(1, 2, 4, 8)):
+    df, df_time = make_data(n)
+    start = time.perf_counter()
+    process_level(df, df_time, KEY_COLS, TARGET_COL)
+    print(f'\nserial, {n:,} intersections: {time.perf_counter() - start:.2f}s')
+
+    print(f"{'workers':>8} {'parallel s':>11}")
+    for w in workers:
+        start = time.perf_counter()
+        process_level_parallel(df, df_time, KEY_COLS, TARGET_COL, workers=w)
+        print(f'{w:>8} {time.perf_counter() - start:>11.2f}')
+
+
+def run_incremental(n=100_000):
+    # Weekly refresh: one new week of actuals on top of five years of history
+    df, df_time = make_data(n)
+    last_week = df_time[DATE_COL].iloc[-1]
+    history, new_week = df[df[DATE_COL] < last_week], df[df[DATE_COL] == last_week]
+    level = IncrementalLevel(history, df_time, KEY_COLS, TARGET_COL)
+    level.result(df_time[DATE_COL].iloc[-2])
+
+    start = time.perf_counter()
+    process_level(df, df_time, KEY_COLS, TARGET_COL)
+    full = time.perf_counter() - start
+
+    start = time.perf_counter()
+    level.append(new_week)
+    level.result(last_week)
+    print(f'\nnew week on {n:,} intersections: full {full:.2f}s, incremental {time.perf_counter() - start:.2f}s')
+
+
+if __name__ == '__main__':
+    check_equivalence()
+    check_cache_accounting()
+    run()
+    run_workers()
+    run_incremental()
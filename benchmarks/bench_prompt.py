@@ -0,0 +1,73 @@
+# benchmarks/bench_prompt.py
+# Prompt size and build time of the old 1000-row CSV prompt against the
+# full-data profile. Set OPENAI_API_KEY to also time a live round-trip
+# (time to first token and total) for both prompts. Totals in the profile of a
+# float32-compacted target are float64 sums.
+#
+#   python -m benchmarks.bench_prompt
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.bench_process_level import DATE_COL, KEY_COLS, TARGET_COL, make_data
+from utils.compact import compact_target
+from utils.fill_missing_weeks import process_level
+from utils.profile import build_profile, estimate_tokens
+
+QUESTION = 'Which month had the highest sales?'
+MODEL = 'gpt-4o-mini-2024-07-18'
+
+
+def csv_prompt(df):
+    sample = df.sample(1000, random_state=1).sort_index() if len(df) > 1000 else df
+    return f'Dataset CSV:\n{sample.to_csv(index=False)}\n\nQuestion: {QUESTION}'
+
+
+def profile_prompt(df, token_budget=800):
+    return f'Dataset profile:\n{build_profile(df, DATE_COL, KEY_COLS, TARGET_COL, token_budget=token_budget)}\n\nQuestion: {QUESTION}'
+
+
+def time_live(prompt):
+    from openai import OpenAI
+
+    client = OpenAI(api_key=os.environ['OPENAI_API_KEY'])
+    start = time.perf_counter()
+    first = None
+    stream = client.chat.completions.create(model=MODEL, messages=[{'role': 'user', 'content': prompt}],
+                                            temperature=0.2, stream=True)
+    for chunk in stream:
+        if first is None and chunk.choices and chunk.choices[0].delta.content:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def check_precision(n_rows=3_333_334):
+    # compact_target stores a lossless float32 target; the profile's totals are
+    # still float64 sums
+    df = compact_target(pd.DataFrame({KEY_COLS[0]: np.arange(n_rows) % 5, TARGET_COL: 123.0}), TARGET_COL)
+    assert df[TARGET_COL].dtype == 'float32'
+    assert 'sum=410,000,082' in build_profile(df, None, KEY_COLS[:1], TARGET_COL)
+    print('profile precision OK')
+
+
+def run(n_intersections=10_000):
+    df, df_time = make_data(n_intersections)
+    df = process_level(df, df_time, KEY_COLS, TARGET_COL)
+    print(f'{len(df):,} processed rows')
+
+    for name, build in (('1000-row CSV', csv_prompt), ('profile', profile_prompt)):
+        start = time.perf_counter()
+        prompt = build(df)
+        seconds = time.perf_counter() - start
+        line = f'{name:>14}: {len(prompt):>8,} chars, ~{estimate_tokens(prompt):>7,} tokens, built in {seconds:.3f}s'
+        if os.environ.get('OPENAI_API_KEY'):
+            ttft, total = time_live(prompt)
+            line += f', TTFT {ttft:.2f}s, total {total:.2f}s'
+        print(line)
+
+
+if __name__ == '__main__':
+    check_precision()
+    run()
@@ -0,0 +1,78 @@
+# benchmarks/bench_router.py
+# Deterministic question routing (utils/question_router.py): which intent each
+# question of the common family is routed to, that questions with a qualifier
+# no handler applies (a year, a key value, a count, a top-N, ...) fall back to
+# the LLM, and the cost of routing against answering from the aggregates.
+#
+#   python -m benchmarks.bench_router
+import time
+
+from benchmarks.synthetic import DATE_COL, KEY_COLS, TARGET_COL, make_tenant
+from utils.panel import Panel
+from utils.question_router import QuestionRouter
+
+ROUTED = {
+    'Which month has the highest sales?': 'highest_month',
+    'What was the lowest week?': 'lowest_week',
+    'Average sales by item': 'average_by_key',
+    'Total sales by location': 'total_by_key',
+    'Which location has the highest sales?': 'top_key',
+    'Which items have the most outliers?': 'outliers',
+    'Show the weekly trend': 'weekly_trend',
+}
+# Qualifiers the handlers would silently drop: answered by the LLM instead
+FALLBACK = [
+    'Which was the highest month in 2022?',
+    'What are the average sales for item 136459?',
+    'Show the weekly trend for location 6114',
+    'What is the total number of locations?',
+    'How many items are there?',
+    'What are the top 5 items by sales?',
+    'Which week had the highest sales last year?',
+    'What is the quarterly trend?',
+    'Which month had the lowest sales in March?',
+]
+
+
+def make_router(n_intersections=500, n_weeks=156, seed=0, **key_values):
+    df, _ = make_tenant(n_intersections, n_weeks, seed=seed, as_strings=False)
+    return QuestionRouter(Panel.from_long(df.assign(**key_values), DATE_COL, KEY_COLS, TARGET_COL))
+
+
+def check_routing(router):
+    for question, intent in ROUTED.items():
+        assert router._match(question.lower())[0] == intent, question
+        assert router.route(question) is not None, question
+    for question in FALLBACK:
+        assert router.route(question) is None, question
+    # 'Revenue Item.[Stat Revenue Item]' must not take questions about 'Item.[Stat Item]'
+    assert router._key_column('average sales by item') == 'Item.[Stat Item]'
+    assert router.route('What is the average sales by item?')[1].columns[0] == 'Item.[Stat Item]'
+    assert router.route('Average sales by revenue item')[1].columns[0] == 'Revenue Item.[Stat Revenue Item]'
+    assert router._key_column('which location has the most outliers') == 'Location.[Stat Location]'
+    assert router._key_column('sales by customer group') == 'Sales Domain.[Stat Customer Group]'
+    # Two columns named without one containing the other: left to the LLM
+    assert router.route('Total sales by location and customer group') is None
+    # A key value that is a word rather than an id
+    named = make_router(50, **{KEY_COLS[1]: 'North'})
+    assert named.route('Average sales by location') is not None
+    assert named.route('Average sales for location North') is None
+    print('routing OK')
+
+
+def run(repeats=200):
+    router = make_router(20_000)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for question in FALLBACK:
+            router.route(question)
+    fallback = (time.perf_counter() - start) / (repeats * len(FALLBACK))
+    start = time.perf_counter()
+    answers = [router.route(question) for question in ROUTED]
+    cold = time.perf_counter() - start
+    print(f'fallback decision: {fallback * 1e6:6.1f} us/question | {len(answers)} routed answers, cold: {cold:.2f}s')
+
+
+if __name__ == '__main__':
+    check_routing(make_router())
+    run()
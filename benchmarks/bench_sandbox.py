@@ -0,0 +1,101 @@
+# benchmarks/bench_sandbox.py
+# Shared-memory frames of the sandbox pool (utils/sandbox.py): concurrent runs
+# over more frames than max_shared_frames all find their block (eviction only
+# unlinks blocks no queued or running call holds), and the per-run cost of
+# looking a large frame up by the caller's digest against hashing it. Numeric
+# columns read back from a block are views of it, not copies. Recorded st.*
+# calls keep their positional and keyword arguments apart.
+#
+#   python -m benchmarks.bench_sandbox
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.sandbox import SandboxPool, _read_shared, _release, _write_shared
+
+
+def check_shared(n_frames=8):
+    pool = SandboxPool(workers=2, max_shared_frames=1)
+    try:
+        frames = [pd.DataFrame({'a': np.arange(1_000) + i}) for i in range(n_frames)]
+
+        def total(i):
+            return pool.run('result = int(df.a.sum())', frames[i], digest=('frame', i))['result']
+
+        with ThreadPoolExecutor(n_frames) as threads:
+            results = list(threads.map(total, list(range(n_frames)) * 3))
+        assert results == [int(frames[i].a.sum()) for i in range(n_frames)] * 3
+        assert len(pool._shared) == 1 and all(entry[2] == 0 for entry in pool._shared.values())
+        # The digest is the lookup key: the same digest reuses the block
+        key = next(iter(pool._shared))
+        other = frames[(key[1] + 1) % n_frames]
+        assert pool.run('result = int(df.a.sum())', other, digest=key)['result'] == int(frames[key[1]].a.sum())
+    finally:
+        pool.shutdown()
+    print('shared frames OK')
+
+
+def check_zero_copy():
+    df = pd.DataFrame({'a': np.arange(1_000), 'b': np.random.default_rng(0).random(1_000),
+                       'c': pd.Categorical(np.arange(1_000) % 7)})
+    shm, fmt = _write_shared(df)
+    reader, frame = _read_shared(shm.name, fmt)
+    block = np.frombuffer(reader.buf, dtype=np.uint8)
+    assert all(np.shares_memory(frame[col].to_numpy(), block) for col in ('a', 'b'))
+    pd.testing.assert_frame_equal(frame, df)
+    # Generated code writes to a shallow copy; the shared columns stay as they were
+    view = frame.copy(deep=False)
+    view.loc[0, 'a'] = -1
+    assert frame.loc[0, 'a'] == 0 and view.loc[0, 'a'] == -1
+    del frame, view, block
+    _release(reader)
+    _release(shm)
+    shm.unlink()
+
+    pool = SandboxPool(workers=1)
+    try:
+        assert pool.run("df.loc[0, 'a'] = -1\nresult = int(df.a.sum())", df)['result'] == int(df.a.sum()) - 1
+        assert pool.run('result = int(df.a.sum())', df)['result'] == int(df.a.sum())
+    finally:
+        pool.shutdown()
+    print('zero-copy frames OK')
+
+
+def check_outputs():
+    # st.* calls come back as (name, args, kwargs); unpicklable arguments as st.write of their repr
+    pool = SandboxPool(workers=1)
+    try:
+        df = pd.DataFrame({'a': [1, 2]})
+        code = "st.metric('Total', 3, delta=1)\nst.write('a', 'b')\nst.dataframe(df, hide_index=True)\nst.write(lambda: 0)"
+        metric, write, dataframe, unpicklable = pool.run(code, df)['outputs']
+        assert metric == ('metric', ('Total', 3), {'delta': 1}) and write == ('write', ('a', 'b'), {})
+        assert dataframe[0] == 'dataframe' and dataframe[2] == {'hide_index': True}
+        pd.testing.assert_frame_equal(dataframe[1][0], df)
+        assert unpicklable[0] == 'write' and unpicklable[1][0].startswith('<function <lambda>')
+    finally:
+        pool.shutdown()
+    print('recorded outputs OK')
+
+
+def run(n_rows=2_000_000, repeats=10):
+    pool = SandboxPool(workers=1)
+    try:
+        df = pd.DataFrame({'a': np.arange(n_rows), 'b': np.random.default_rng(0).random(n_rows),
+                           'c': pd.Categorical(np.arange(n_rows) % 100)})
+        for label, digest in (('hashed', None), ('digest', 'processing-key')):
+            pool.run('result = len(df)', df, digest=digest)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                pool.run('result = len(df)', df, digest=digest)
+            print(f'{n_rows:,} rows, lookup by {label:>6}: {(time.perf_counter() - start) / repeats * 1e3:7.1f} ms/run')
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    check_shared()
+    check_zero_copy()
+    check_outputs()
+    run()
@@ -0,0 +1,65 @@
+# benchmarks/bench_startup.py
+# Cold-start time of fresh interpreters: `run_batch.py --help` and importing
+# the processing / EDA / Q&A modules, checked against a budget. Also checks
+# that none of them pulls in streamlit, matplotlib or the OpenAI SDK at import.
+# Exits non-zero when a budget is exceeded or a heavy module is imported.
+#
+#   python -m benchmarks.bench_startup
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ('streamlit', 'matplotlib', 'openai')
+
+# Seconds, median of REPEATS cold starts (bare interpreter startup included)
+BUDGETS = {
+    'run_batch.py --help': 0.3,
+    'import run_batch stack': 1.5,
+    'import utils.llm_agent': 1.5,
+}
+REPEATS = 5
+
+STACK = ('utils.pipeline', 'utils.fill_missing_weeks', 'utils.plots', 'utils.question_router',
+         'utils.calendar_cube', 'utils.fiscal_calendar', 'utils.ingest', 'utils.excel')
+
+CHECK = 'import sys; {imports}; print(",".join(m for m in {heavy!r} if m in sys.modules))'
+
+
+def cold_start(args):
+    # Median wall time of a fresh interpreter; returns (seconds, stdout)
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        out = subprocess.run([sys.executable] + args, cwd=ROOT, capture_output=True, text=True, check=True).stdout
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2], out
+
+
+def import_check(modules):
+    code = CHECK.format(imports='; '.join(f'import {module}' for module in modules), heavy=HEAVY_MODULES)
+    return ['-c', code]
+
+
+def run():
+    commands = {
+        'run_batch.py --help': ['run_batch.py', '--help'],
+        'import run_batch stack': import_check(STACK),
+        'import utils.llm_agent': import_check(['utils.llm_agent']),
+    }
+    baseline, _ = cold_start(['-c', 'pass'])
+    print(f'{"bare interpreter":>24}: {baseline:6.3f}s')
+    failed = False
+    for name, args in commands.items():
+        seconds, out = cold_start(args)
+        heavy = out.strip() if args[0] == '-c' else ''
+        ok = seconds <= BUDGETS[name] and not heavy
+        failed |= not ok
+        note = f' imported {heavy}' if heavy else ''
+        print(f'{name:>24}: {seconds:6.3f}s (budget {BUDGETS[name]:.1f}s) {"OK" if ok else "FAIL"}{note}')
+    return not failed
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run() else 1)
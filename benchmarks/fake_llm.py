@@ -0,0 +1,91 @@
+# benchmarks/fake_llm.py
+# Local stand-in for the chat completions endpoint with a fixed time to first
+# token and per-token delay, streamed (SSE) or not. Point the app at it with
+#
+#   python -m benchmarks.fake_llm --port 8765
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake streamlit run app_timeseries.py
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = "```python\nresult = df.describe()\n```"
+
+
+def _handler(ttft, token_delay, n_tokens):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            model = body.get("model", "fake")
+            tokens = [ANSWER] + [" "] * (n_tokens - 1)
+            time.sleep(ttft)
+
+            if not body.get("stream"):
+                time.sleep(token_delay * (n_tokens - 1))
+                self._send_json({"id": "fake", "object": "chat.completion", "created": int(time.time()),
+                                 "model": model,
+                                 "choices": [{"index": 0, "finish_reason": "stop",
+                                              "message": {"role": "assistant", "content": "".join(tokens)}}],
+                                 "usage": {"prompt_tokens": 0, "completion_tokens": n_tokens, "total_tokens": n_tokens}})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(token_delay)
+                self._send_chunk({"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                                  "model": model,
+                                  "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            self._send_chunk({"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                              "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+        def _send_json(self, payload):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_chunk(self, payload):
+            self._write_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+        def _write_chunk(self, data):
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def serve(ttft=0.3, token_delay=0.01, n_tokens=50, port=0):
+    """Start the fake endpoint in a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), _handler(ttft, token_delay, n_tokens))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--tokens", type=int, default=50)
+    args = parser.parse_args()
+    server, url = serve(args.ttft, args.token_delay, args.tokens, args.port)
+    print(f"Fake LLM endpoint at {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,305 @@
+# benchmarks/suite.py
+# Regression suite over synthetic tenant data (benchmarks/synthetic.py):
+# ingestion, date parsing, process_level, calendar aggregation, outlier
+# detection, the EDA plot helpers, prompt construction and an LLM round trip
+# against the local fake endpoint (benchmarks/fake_llm.py), so everything runs
+# offline. Each case is timed best-of-N and compared with
+# benchmarks/baselines.json; a case slower than baseline * (1 + tolerance) +
+# SLACK_S fails and the exit code is 1.
+#
+#   python -m benchmarks.suite                    # default preset
+#   python -m benchmarks.suite --preset smoke --cases process_level,aggregation
+#   python -m benchmarks.suite --update           # store the current timings as baselines
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import DATE_COL, KEY_COLS, TARGET_COL, write_tenant
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+# (intersections, weeks, repeats); large / xl are for one-off runs and have no baselines
+# (xl is meant for --cases ingest_stream: the other cases hold the whole frame in memory)
+PRESETS = {
+    'smoke': (2_000, 104, 3),
+    'default': (20_000, 260, 3),
+    'large': (200_000, 260, 1),
+    'xl': (1_000_000, 260, 1),
+}
+TOLERANCE = 0.3
+SLACK_S = 0.02
+
+
+class Context:
+    """Synthetic files and the intermediate results the cases start from."""
+
+    def __init__(self, n_intersections, n_weeks, tmp):
+        self.tmp = tmp
+        self.actual_path, self.time_path, self.rows = write_tenant(os.path.join(tmp, 'data'), n_intersections,
+                                                                   n_weeks)
+        self._cache = {}
+
+    def get(self, name, build):
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+    @property
+    def raw(self):
+        return self.get('raw', lambda: pd.read_csv(self.actual_path, encoding='utf-8-sig'))
+
+    @property
+    def df_time(self):
+        from utils.dates import normalize_dates
+
+        def build():
+            df_time = pd.read_csv(self.time_path, encoding='utf-8-sig')
+            df_time[DATE_COL] = normalize_dates(df_time[DATE_COL])[0]
+            return df_time
+        return self.get('df_time', build)
+
+    @property
+    def actuals(self):
+        from utils.compact import compact_keys
+        from utils.dates import normalize_dates
+
+        def build():
+            df = compact_keys(self.raw[[DATE_COL] + KEY_COLS + [TARGET_COL]].copy(), KEY_COLS)
+            df[DATE_COL] = normalize_dates(df[DATE_COL])[0]
+            return df
+        return self.get('actuals', build)
+
+    @property
+    def processed(self):
+        from utils.fill_missing_weeks import process_level
+
+        return self.get('processed', lambda: process_level(self.actuals, self.df_time[[DATE_COL]], KEY_COLS,
+                                                           TARGET_COL))
+
+    @property
+    def panel(self):
+        from utils.panel import Panel
+
+        return self.get('panel', lambda: Panel.from_long(self.processed, DATE_COL, KEY_COLS, TARGET_COL))
+
+    @property
+    def fiscal(self):
+        from utils.fiscal_calendar import parse_fiscal_calendar
+
+        return self.get('fiscal', lambda: parse_fiscal_calendar(self.df_time))
+
+    @property
+    def cube(self):
+        from utils.calendar_cube import CalendarCube
+
+        return self.get('cube', lambda: CalendarCube.from_panel(self.panel, self.fiscal))
+
+
+# =========================
+# Cases: each takes the Context and returns the callable that is timed
+# =========================
+def case_read_csv(ctx):
+    return lambda: pd.read_csv(ctx.actual_path, encoding='utf-8-sig')
+
+
+def case_ingest_stream(ctx):
+    from utils.ingest import ingest_csv
+
+    out_dir = os.path.join(ctx.tmp, 'ingest')
+    return lambda: ingest_csv(ctx.actual_path, out_dir, DATE_COL, KEY_COLS, TARGET_COL, chunksize=500_000)
+
+
+def case_date_parse(ctx):
+    from utils.dates import normalize_dates
+
+    column = ctx.raw[DATE_COL]
+    return lambda: normalize_dates(column)
+
+
+def case_process_level(ctx):
+    from utils.fill_missing_weeks import process_level
+
+    df, grid = ctx.actuals, ctx.df_time[[DATE_COL]]
+    return lambda: process_level(df, grid, KEY_COLS, TARGET_COL)
+
+
+def case_aggregation(ctx):
+    from utils.calendar_cube import CalendarCube
+    from utils.panel import Panel
+
+    processed, fiscal = ctx.processed, ctx.fiscal
+
+    def aggregate():
+        cube = CalendarCube.from_panel(Panel.from_long(processed, DATE_COL, KEY_COLS, TARGET_COL), fiscal)
+        for grain in ('Year', 'Month Start', ['Year', 'ISO Week'], 'Fiscal Month', 'Fiscal Quarter'):
+            cube.rollup(grain)
+        return cube
+    return aggregate
+
+
+def case_anomalies(ctx):
+    from utils.anomalies import detect_outliers
+
+    panel = ctx.panel
+    return lambda: detect_outliers(panel)
+
+
+def case_plots(ctx):
+    # The EDA helpers outside a Streamlit session; the render cache is cleared
+    # so every call draws (benchmarks/bench_plots.py times the cached path)
+    import logging
+
+    from utils.plots import (clear_render_cache, plot_drilldown, plot_fiscal_trend, plot_monthly_trend,
+                             plot_weekly_trend, plot_yearly_trend)
+
+    cube = ctx.cube
+
+    def plot():
+        # Without a session every st.* call logs a bare-mode warning
+        logging.disable(logging.WARNING)
+        try:
+            clear_render_cache()
+            plot_yearly_trend(cube)
+            plot_monthly_trend(cube)
+            plot_weekly_trend(cube)
+            plot_fiscal_trend(cube, 'Fiscal Month')
+            plot_drilldown(cube, KEY_COLS[3])
+        finally:
+            logging.disable(logging.NOTSET)
+    plot()  # first call pays for the matplotlib / streamlit imports
+    return plot
+
+
+def case_prompt(ctx):
+    from utils.llm_agent import _messages
+    from utils.profile import build_profile
+
+    processed = ctx.processed
+
+    def prompt():
+        profile = build_profile(processed, DATE_COL, KEY_COLS, TARGET_COL, token_budget=800)
+        return _messages('Which month had the highest sales?', DATE_COL, KEY_COLS, TARGET_COL, profile)
+    return prompt
+
+
+def case_llm_stub(ctx):
+    # Prompt, streamed completion from the zero-latency fake endpoint and the
+    # sandboxed run of its code; a new question each call so the cache misses
+    import itertools
+
+    import utils.llm_cache
+    from benchmarks.fake_llm import serve
+    from utils.llm_agent import ask_llm_and_run
+    from utils.llm_cache import LLMCache
+
+    ctx.server, base_url = serve(ttft=0.0, token_delay=0.0, n_tokens=20, port=0)
+    os.environ['OPENAI_BASE_URL'] = base_url
+    os.environ['OPENAI_API_KEY'] = 'fake'
+    utils.llm_cache._default_cache = LLMCache(cache_dir=os.path.join(ctx.tmp, 'llm_cache'))
+    processed, counter = ctx.processed, itertools.count()
+
+    def ask():
+        code, result, _ = ask_llm_and_run(f'Question {next(counter)}', processed, DATE_COL, KEY_COLS, TARGET_COL)
+        assert not code.startswith('[Error]'), result
+    ask()  # starts the sandbox worker
+    return ask
+
+
+CASES = {
+    'read_csv': case_read_csv,
+    'ingest_stream': case_ingest_stream,
+    'date_parse': case_date_parse,
+    'process_level': case_process_level,
+    'aggregation': case_aggregation,
+    'anomalies': case_anomalies,
+    'plots': case_plots,
+    'prompt': case_prompt,
+    'llm_stub': case_llm_stub,
+}
+
+
+def best_of(func, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def machine():
+    return {'python': platform.python_version(), 'pandas': pd.__version__, 'cpus': os.cpu_count(),
+            'platform': platform.platform()}
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES):
+        return {'machine': None, 'presets': {}}
+    with open(BASELINES) as f:
+        return json.load(f)
+
+
+def run(preset='default', cases=None, update=False, tolerance=TOLERANCE):
+    """Time the cases, compare with the stored baselines; returns True when none regressed."""
+    n_intersections, n_weeks, repeats = PRESETS[preset]
+    cases = cases or list(CASES)
+    baselines = load_baselines()
+    stored = baselines['presets'].get(preset, {})
+    if baselines['machine'] and baselines['machine'] != machine():
+        print(f"⚠️ Baselines were recorded on {baselines['machine']}; this is {machine()}")
+
+    tmp = tempfile.mkdtemp(prefix='bench_suite_')
+    try:
+        start = time.perf_counter()
+        ctx = Context(n_intersections, n_weeks, tmp)
+        print(f'{preset}: {n_intersections:,} intersections x {n_weeks} weeks, {ctx.rows:,} rows '
+              f'(generated in {time.perf_counter() - start:.1f}s), best of {repeats}')
+        print(f"{'case':>14} {'seconds':>9} {'baseline':>9} {'ratio':>7}")
+        timings, ok = {}, True
+        for name in cases:
+            func = CASES[name](ctx)
+            timings[name] = seconds = best_of(func, repeats)
+            baseline = stored.get(name)
+            if baseline is None:
+                print(f'{name:>14} {seconds:>9.3f} {"-":>9} {"-":>7}')
+                continue
+            regressed = seconds > baseline * (1 + tolerance) + SLACK_S
+            ok &= not regressed
+            print(f'{name:>14} {seconds:>9.3f} {baseline:>9.3f} {seconds / baseline:>6.2f}x'
+                  f'{"  ❌ regression" if regressed else ""}')
+        if getattr(ctx, 'server', None) is not None:
+            ctx.server.shutdown()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    if update:
+        baselines['machine'] = machine()
+        baselines['presets'][preset] = {**stored, **{name: round(seconds, 4) for name, seconds in timings.items()}}
+        with open(BASELINES, 'w') as f:
+            json.dump(baselines, f, indent=2)
+            f.write('\n')
+        print(f'Baselines for {preset} written to {BASELINES}')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark suite with stored baselines.')
+    parser.add_argument('--preset', choices=list(PRESETS), default='default')
+    parser.add_argument('--cases', help=f"Comma-separated subset of: {', '.join(CASES)}")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='Allowed slowdown over the baseline')
+    parser.add_argument('--update', action='store_true', help='Store these timings as the baselines')
+    args = parser.parse_args()
+    cases = args.cases.split(',') if args.cases else None
+    if cases and set(cases) - set(CASES):
+        parser.error(f'unknown cases: {sorted(set(cases) - set(CASES))}')
+    return 0 if run(args.preset, cases, args.update, args.tolerance) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
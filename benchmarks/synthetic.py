@@ -0,0 +1,138 @@
+# benchmarks/synthetic.py
+# Synthetic tenant extracts shaped like tenant_actual.csv / time_dimension.csv:
+# the same column names, 'dd-Mon-yy' week strings, integer ids, a constant
+# Version column and the packed 'Stat R Attribute Week' fiscal calendar
+# (4-4-5 months on ISO years). Sizes go up to ~1M intersections x 260 weeks;
+# write_tenant() streams blocks of intersections to disk so memory stays flat.
+#
+#   python -m benchmarks.synthetic OUT_DIR --intersections 1000000 --weeks 260
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+DATE_COL = 'Time.[Week]'
+TARGET_COL = 'Actual'
+VERSION_COL = 'Version.[Version Name]'
+KEY_COLS = ['Revenue Item.[Stat Revenue Item]', 'Location.[Stat Location]', 'Sales Domain.[Stat Customer Group]',
+            'Item.[Stat Item]']
+# Column order of tenant_actual.csv
+ACTUAL_COLUMNS = [VERSION_COL, KEY_COLS[0], KEY_COLS[1], DATE_COL, KEY_COLS[2], KEY_COLS[3], TARGET_COL]
+ATTRIBUTE_COL = 'Stat R Attribute Week'
+MONTH_WEEKS = [4, 4, 5] * 4
+N_LOCATIONS = 200
+N_CUSTOMERS = 100
+
+
+def make_time_dimension(n_weeks=260, start='2019-01-07', lead_weeks=52):
+    """Time dimension covering the actuals plus `lead_weeks` of future weeks."""
+    weeks = pd.date_range(start, periods=n_weeks + lead_weeks, freq='W-MON')
+    iso = weeks.isocalendar()
+    year, week = iso['year'].to_numpy(), np.minimum(iso['week'].to_numpy(), 52) - 1
+    month = np.searchsorted(np.cumsum(MONTH_WEEKS), week, side='right')
+    # First Monday of each fiscal month / quarter within its ISO year
+    year_start = pd.to_datetime([f'{y}-W01-1' for y in year], format='%G-W%V-%u')
+    month_offset = np.concatenate([[0], np.cumsum(MONTH_WEEKS)])
+    month_start = year_start + pd.to_timedelta(month_offset[month] * 7, unit='D')
+    quarter_start = year_start + pd.to_timedelta(month_offset[month // 3 * 3] * 7, unit='D')
+
+    def us(dates):
+        return [f'{d.month}/{d.day}/{d.year} 12:00:00 AM' for d in dates]
+
+    label = weeks.strftime('%d-%b-%y')
+    month_label = [f'{pd.Timestamp(2000, m + 1, 1):%b}-P{y % 100:02d}' for m, y in zip(month, year)]
+    quarter_label = [f'Q{m // 3 + 1}-P{y % 100:02d}' for m, y in zip(month, year)]
+    attribute = ['|'.join(fields) for fields in zip(label, label, month_label, quarter_label, us(weeks), us(weeks),
+                                                    us(month_start), us(quarter_start))]
+    return pd.DataFrame({VERSION_COL: 'CurrentWorkingView', DATE_COL: label, ATTRIBUTE_COL: attribute})
+
+
+def make_keys(n_intersections, seed=0):
+    # Exactly n distinct intersections: N_LOCATIONS locations per item, a
+    # customer group and revenue item per item
+    rng = np.random.default_rng(seed)
+    i = np.arange(n_intersections)
+    item_idx = i // N_LOCATIONS
+    n_items = int(item_idx[-1]) + 1 if n_intersections else 0
+    item = 100000 + rng.permutation(max(n_items * 3, 1))[:n_items].astype(np.int64)
+    customer = 450000000 + rng.integers(0, N_CUSTOMERS, n_items)
+    return pd.DataFrame({KEY_COLS[0]: 6000 + item[item_idx] % 8, KEY_COLS[1]: 6000 + i % N_LOCATIONS,
+                         KEY_COLS[2]: customer[item_idx], KEY_COLS[3]: item[item_idx]})
+
+
+def make_actuals(keys, n_weeks=260, start='2019-01-07', sparsity=0.4, intermittency=0.1, negative_share=0.02,
+                 late_start_share=0.5, seed=0, as_strings=True):
+    """One tenant-style actuals frame for the given intersections.
+
+    sparsity: share of intersection-weeks after an intersection's first week
+    with no row at all (filled with zeros by process_level); intermittency:
+    share of the remaining rows whose Actual is 0. A late_start_share of the
+    intersections starts somewhere inside the history.
+    """
+    rng = np.random.default_rng(seed)
+    weeks = pd.date_range(start, periods=n_weeks, freq='W-MON')
+    n_keys = len(keys)
+    first = np.where(rng.random(n_keys) < late_start_share, rng.integers(0, n_weeks, n_keys), 0)
+    key_idx = np.repeat(np.arange(n_keys), n_weeks)
+    week_idx = np.tile(np.arange(n_weeks), n_keys)
+    live = (week_idx >= first[key_idx]) & (rng.random(len(key_idx)) >= sparsity)
+    key_idx, week_idx = key_idx[live], week_idx[live]
+
+    level = rng.gamma(1.2, 300.0, n_keys)
+    sales = rng.poisson(level[key_idx]).astype('float64')
+    sales[rng.random(len(sales)) < intermittency] = 0
+    negative = rng.random(len(sales)) < negative_share
+    sales[negative] = -sales[negative]
+
+    df = keys.iloc[key_idx].reset_index(drop=True)
+    df[DATE_COL] = weeks.strftime('%d-%b-%y')[week_idx] if as_strings else weeks[week_idx]
+    df[TARGET_COL] = sales
+    df[VERSION_COL] = 'CurrentWorkingView'
+    return df[ACTUAL_COLUMNS]
+
+
+def make_tenant(n_intersections, n_weeks=260, sparsity=0.4, intermittency=0.1, seed=0, as_strings=True):
+    """(df_actual, df_time) in memory, as read from the tenant CSVs."""
+    keys = make_keys(n_intersections, seed)
+    return (make_actuals(keys, n_weeks, sparsity=sparsity, intermittency=intermittency, seed=seed,
+                         as_strings=as_strings),
+            make_time_dimension(n_weeks))
+
+
+def write_tenant(out_dir, n_intersections, n_weeks=260, sparsity=0.4, intermittency=0.1, seed=0,
+                 block_intersections=50_000):
+    # tenant_actual.csv / time_dimension.csv in out_dir, written block by block
+    os.makedirs(out_dir, exist_ok=True)
+    actual_path = os.path.join(out_dir, 'tenant_actual.csv')
+    time_path = os.path.join(out_dir, 'time_dimension.csv')
+    make_time_dimension(n_weeks).to_csv(time_path, index=False, encoding='utf-8-sig')
+    keys = make_keys(n_intersections, seed)
+    rows = 0
+    for block, lo in enumerate(range(0, n_intersections, block_intersections)):
+        df = make_actuals(keys.iloc[lo:lo + block_intersections], n_weeks, sparsity=sparsity,
+                          intermittency=intermittency, seed=seed + block)
+        df.to_csv(actual_path, mode='w' if lo == 0 else 'a', header=lo == 0, index=False,
+                  encoding='utf-8-sig' if lo == 0 else 'utf-8')
+        rows += len(df)
+    return actual_path, time_path, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic tenant_actual.csv / time_dimension.csv pair.')
+    parser.add_argument('out_dir')
+    parser.add_argument('--intersections', type=int, default=10_000)
+    parser.add_argument('--weeks', type=int, default=260)
+    parser.add_argument('--sparsity', type=float, default=0.4)
+    parser.add_argument('--intermittency', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    actual_path, _, rows = write_tenant(args.out_dir, args.intersections, args.weeks, args.sparsity,
+                                        args.intermittency, args.seed)
+    print(f'{rows:,} rows, {os.path.getsize(actual_path) / 2**20:,.0f} MB in {time.perf_counter() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
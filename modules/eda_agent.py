@@ -1,21 +1,32 @@
 import streamlit as st
+from utils.calendar_cube import CalendarCube
 from utils.plots import plot_yearly_trend, plot_monthly_trend, plot_weekly_trend
 from utils.llm_agent import ask_llm_and_run
+from utils.llm_cache import data_fingerprint
 
-def run_eda(df, time_col, target_col, key_cols):
+@st.cache_resource(max_entries=8)
+def _calendar_cube(digest, _df, time_col, target_col, key_cols):
+    # Built once per dataset and keyed on its digest (the leading underscore
+    # keeps Streamlit from hashing the frame on every rerun); every plot below reads from it
+    return CalendarCube.from_long(_df, time_col, key_cols, target_col)
+
+def run_eda(df, time_col, target_col, key_cols, digest=None):
+    # `digest` identifies df's content (e.g. its processing key); without one the frame is hashed
     st.subheader("🧪 Exploratory Data Analysis")
+    digest = data_fingerprint(df) if digest is None else digest
+    cube = _calendar_cube(digest, df, time_col, target_col, tuple(key_cols))
 
     st.markdown("### 📅 Year-over-Year Trend")
-    plot_yearly_trend(df, time_col, target_col)
+    plot_yearly_trend(cube)
 
     st.markdown("### 📆 Monthly Trend")
-    plot_monthly_trend(df, time_col, target_col)
+    plot_monthly_trend(cube)
 
     st.markdown("### 📊 Weekly Trend")
-    plot_weekly_trend(df, time_col, target_col)
+    plot_weekly_trend(cube)
 
     st.markdown("### 🤖 Ask the AI Agent")
     question = st.text_input("Ask a question (e.g. 'Which item has the highest sales?')")
     if question:
-        response = ask_llm_and_run(question, df)[1]  # Only show result
+        response = ask_llm_and_run(question, df, digest=digest)[1]  # Only show result
         st.success(response)
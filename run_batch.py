@@ -0,0 +1,227 @@
+# run_batch.py
+# Headless pipeline for nightly jobs: ingestion -> process_level -> calendar
+# aggregates -> optional outlier index and question list, over a directory of
+# tenant files.
+# Nothing here imports streamlit or matplotlib, and the OpenAI client is only
+# created when --llm is given and a question is not answered by the router.
+#
+#   python run_batch.py data/ --key-cols "Item.[Stat Item],Location.[Stat Location]" \
+#       --questions questions.txt --out batch_output
+import argparse
+import fnmatch
+import json
+import os
+import sys
+import time
+
+START = time.perf_counter()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Process tenant actuals and answer questions without the UI.")
+    parser.add_argument("input_dir", help="Directory with the actuals and time dimension files")
+    parser.add_argument("--actuals", default="*actual*", help="Glob for the actuals file (default: *actual*)")
+    parser.add_argument("--time", default="*time*", help="Glob for the time dimension file (default: *time*)")
+    parser.add_argument("--date-col", default="Time.[Week]")
+    parser.add_argument("--target-col", default="Actual")
+    parser.add_argument("--key-cols", help="Comma-separated forecast level columns (default: every non-constant "
+                                           "column besides date and target)")
+    parser.add_argument("--end-date", help="Data is till this date (default: last week of the time dimension)")
+    parser.add_argument("--stream", action="store_true", help="Stream a large actuals CSV through Parquet partitions")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--questions", help="Text file with one question per line")
+    parser.add_argument("--llm", action="store_true", help="Send questions the router cannot answer to the LLM")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent LLM requests")
+    parser.add_argument("--outliers", action="store_true", help="Score every intersection for outliers and write "
+                                                                "outliers.csv")
+    parser.add_argument("--out", default="batch_output", help="Output directory")
+    parser.add_argument("--trace", action="store_true", help="Write per-stage spans (wall / CPU time, peak RSS) "
+                                                             "to spans.jsonl in the output directory")
+    return parser.parse_args(argv)
+
+
+def find_file(input_dir, pattern):
+    names = sorted(name for name in os.listdir(input_dir)
+                   if fnmatch.fnmatch(name.lower(), pattern.lower()) and name.lower().endswith((".csv", ".xlsx")))
+    if not names:
+        raise SystemExit(f"No file matching '{pattern}' (.csv/.xlsx) in {input_dir}")
+    return os.path.join(input_dir, names[0])
+
+
+def read_table(path, cache_dir):
+    import pandas as pd
+    from utils.compact import compact_frame
+    from utils.excel import load_excel
+    from utils.instrument import span
+
+    with span("upload_parse", file=path) as s:
+        if path.lower().endswith(".csv"):
+            df = pd.read_csv(path, encoding="utf-8-sig")
+        else:
+            df = load_excel(path, cache_dir=os.path.join(cache_dir, "excel"))
+        s["rows"] = len(df)
+        return compact_frame(df)
+
+
+class Timer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {"startup": self.start - START}
+
+    def stage(self, name):
+        now = time.perf_counter()
+        self.stages[name] = now - self.start
+        self.start = now
+        print(f"[{sum(self.stages.values()):7.2f}s] {name}: {self.stages[name]:.2f}s", flush=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    timer = Timer()
+
+    import pandas as pd
+    from utils.calendar_cube import CalendarCube
+    from utils.compact import compact_keys, compact_target, restore_constants
+    from utils.dates import normalize_dates
+    from utils.fill_missing_weeks import run_process_level
+    from utils.fiscal_calendar import ATTRIBUTE_COL, parse_fiscal_calendar
+    from utils.ingest import ingest_csv, process_ingested
+    from utils.instrument import enable, print_progress, span
+    from utils.panel import Panel
+    timer.stage("imports")
+    recorder = enable() if args.trace else None
+
+    os.makedirs(args.out, exist_ok=True)
+    cache_dir = os.path.join(args.out, ".cache")
+    actual_path = find_file(args.input_dir, args.actuals)
+    time_path = find_file(args.input_dir, args.time)
+    date_col, target_col = args.date_col, args.target_col
+
+    df_time = read_table(time_path, cache_dir)
+    with span("date_parse", file=time_path, rows=len(df_time)):
+        df_time[date_col] = normalize_dates(df_time[date_col])[0]
+    end_date = pd.Timestamp(args.end_date) if args.end_date else df_time[date_col].max()
+    grid = df_time.loc[df_time[date_col] <= end_date, [date_col]]
+
+    stream = args.stream and actual_path.lower().endswith(".csv")
+    df_actual = pd.read_csv(actual_path, nrows=1000, encoding="utf-8-sig") if stream else \
+        read_table(actual_path, cache_dir)
+    if args.key_cols:
+        key_cols = [col.strip() for col in args.key_cols.split(",")]
+    else:
+        constants = df_actual.attrs.get("constants", {})
+        key_cols = [col for col in df_actual.columns
+                    if col not in (date_col, target_col) and col not in constants and df_actual[col].nunique() > 1]
+    columns = [date_col] + key_cols + [target_col]
+    print(f"Actuals: {actual_path}\nTime dimension: {time_path}\nKeys: {key_cols}\nEnd date: {end_date.date()}")
+    timer.stage("ingest")
+
+    if stream:
+        out_dir = os.path.join(cache_dir, "ingest")
+        with span("upload_parse", file=actual_path, streamed=True) as s:
+            s["rows"] = ingest_csv(actual_path, out_dir, date_col, key_cols, target_col, end_date=end_date,
+                                   progress=print_progress("rows read"))["rows_read"]
+        with span("process_level", streamed=True):
+            processed = process_ingested(out_dir, grid, key_cols, target_col, date_col, workers=args.workers,
+                                         progress=print_progress("partitions processed"))
+    else:
+        df_actual = compact_keys(restore_constants(df_actual, columns)[columns], key_cols)
+        with span("date_parse", file=actual_path, rows=len(df_actual)):
+            df_actual[date_col] = normalize_dates(df_actual[date_col])[0]
+        df_actual = df_actual[df_actual[date_col] <= end_date]
+        with span("process_level", rows_in=len(df_actual)):
+            processed = run_process_level(df_actual, grid, key_cols, target_col, date_col,
+                                          mode="parallel" if args.workers > 1 else "serial", workers=args.workers,
+                                          progress=print_progress("partitions processed") if args.workers > 1
+                                          else None)
+    processed = compact_target(processed[columns], target_col)
+    timer.stage("process_level")
+
+    with span("aggregation", stage="cube"):
+        panel = Panel.from_long(processed, date_col, key_cols, target_col)
+        fiscal = parse_fiscal_calendar(df_time, date_col) if ATTRIBUTE_COL in df_time.columns else None
+        cube = CalendarCube.from_panel(panel, fiscal)
+    timer.stage("aggregates")
+
+    processed.to_csv(os.path.join(args.out, "processed_actuals.csv"), index=False)
+    aggregates = {"weekly": cube.totals, "monthly": cube.rollup("Month Start"), "yearly": cube.rollup("Year"),
+                  "fiscal_month": cube.rollup("Fiscal Month"), "fiscal_quarter": cube.rollup("Fiscal Quarter")}
+    for name, totals in aggregates.items():
+        totals.rename(target_col).to_csv(os.path.join(args.out, f"{name}_totals.csv"))
+    for col in key_cols:
+        safe = "".join(ch if ch.isalnum() else "_" for ch in col).strip("_")
+        pd.DataFrame({"sum": cube.key_totals(col), "mean": cube.key_totals(col, "mean")}) \
+            .to_csv(os.path.join(args.out, f"totals_by_{safe}.csv"))
+    timer.stage("write outputs")
+
+    anomalies = None
+    if args.outliers:
+        from utils.anomalies import detect_outliers
+
+        anomalies = detect_outliers(panel)
+        anomalies.frame(by_score=False).to_csv(os.path.join(args.out, "outliers.csv"), index=False)
+        print(anomalies.summary())
+        timer.stage("outliers")
+
+    if args.questions:
+        answer_questions(args, panel, cube, processed, key_cols, timer, anomalies)
+
+    with open(os.path.join(args.out, "timings.json"), "w") as f:
+        json.dump({name: round(seconds, 3) for name, seconds in timer.stages.items()}, f, indent=2)
+    if recorder is not None:
+        recorder.to_jsonl(os.path.join(args.out, "spans.jsonl"))
+        print(recorder.summary().to_string(index=False))
+    print(f"Done in {time.perf_counter() - START:.2f}s; outputs in {args.out}")
+
+
+def answer_questions(args, panel, cube, processed, key_cols, timer, anomalies=None):
+    import pandas as pd
+    from utils.question_router import QuestionRouter
+
+    with open(args.questions) as f:
+        questions = [line.strip() for line in f if line.strip()]
+    router = QuestionRouter(panel, cube=cube, anomalies=anomalies)
+    answers = [router.route(question) for question in questions]
+    sources = ["router" if answer is not None else None for answer in answers]
+
+    pending = [i for i, answer in enumerate(answers) if answer is None]
+    if pending and args.llm:
+        from utils.llm_agent import ask_llm_batch
+        from utils.llm_cache import data_fingerprint
+
+        llm_answers = ask_llm_batch([questions[i] for i in pending], processed, panel.date_col, key_cols,
+                                    panel.target_col, concurrency=args.concurrency,
+                                    digest=data_fingerprint(processed))
+        for i, answer in zip(pending, llm_answers):
+            answers[i], sources[i] = answer, "llm"
+
+    figures_dir = os.path.join(args.out, "figures")
+    with open(os.path.join(args.out, "answers.jsonl"), "w") as f:
+        for n, (question, answer, source) in enumerate(zip(questions, answers, sources), start=1):
+            record = {"question": question, "source": source}
+            if answer is not None:
+                code, result, fig = answer
+                record["code"] = code
+                if isinstance(result, (pd.DataFrame, pd.Series)):
+                    path = os.path.join(args.out, f"answer_{n}.csv")
+                    result.to_csv(path, index=not isinstance(result.index, pd.RangeIndex))
+                    record["result"] = path
+                else:
+                    record["result"] = None if result is None else str(result)
+                if fig is not None:
+                    os.makedirs(figures_dir, exist_ok=True)
+                    record["figure"] = os.path.join(figures_dir, f"answer_{n}.png")
+                    if isinstance(fig, bytes):
+                        with open(record["figure"], "wb") as png:
+                            png.write(fig)
+                    else:
+                        fig.savefig(record["figure"], bbox_inches="tight")
+            f.write(json.dumps(record) + "\n")
+    answered = sum(source is not None for source in sources)
+    print(f"{answered}/{len(questions)} questions answered "
+          f"({sources.count('router')} by the router, {sources.count('llm')} by the LLM)")
+    timer.stage("questions")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+# utils/anomalies.py
+# Outlier detection over every intersection of a Panel at once. Each week is
+# scored against a centred rolling window of its own series (median and MAD
+# from sorted strided windows) and against the series' seasonal profile (the
+# typical deviation from the rolling median in the same week of the season).
+# Weeks beyond the threshold on both scores are kept in an AnomalyIndex sorted
+# by (intersection, week), which the EDA and Q&A paths query without rescanning
+# the panel. Rows are scored in blocks, so memory stays bounded by BLOCK_ROWS.
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.instrument import span
+
+WINDOW = 13
+SEASON = 52
+THRESHOLD = 3.5
+BLOCK_ROWS = 1024
+# sigma of a normal sample from its MAD / its mean absolute deviation
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+
+
+# =========================
+# Scores: values (n x T, NaN before each series starts) -> (n x T)
+# =========================
+def _nanmedian(a, axis):
+    # Sort-based nanmedian (NaN sorts last); np.nanmedian loops in Python over rows
+    a = np.sort(a, axis=axis)
+    counts = np.expand_dims((~np.isnan(a)).sum(axis=axis), axis)
+    lo = np.take_along_axis(a, np.maximum((counts - 1) // 2, 0), axis)
+    hi = np.take_along_axis(a, counts // 2 - (counts == 0), axis)
+    return np.where(counts > 0, (lo + hi) / 2, np.nan).squeeze(axis)
+
+
+def _fill_edges(a):
+    # NaN cells take the nearest valid value on their row: forward, then backward
+    n, T = a.shape
+    rows = np.arange(n)[:, None]
+    idx = np.where(np.isnan(a), 0, np.arange(T))
+    a = a[rows, np.maximum.accumulate(idx, axis=1)]
+    idx = np.where(np.isnan(a), T - 1, np.arange(T))
+    return a[rows, np.minimum.accumulate(idx[:, ::-1], axis=1)[:, ::-1]]
+
+
+def _select(windows, k):
+    # k-th smallest (0-based, per window) of windows sorted with NaN last
+    return np.take_along_axis(windows, np.clip(k, 0, windows.shape[-1] - 1)[..., None], axis=-1)[..., 0]
+
+
+def rolling_median_scale(values, window=WINDOW, min_periods=None):
+    """Centred rolling median and robust scale (sigma estimate) per row.
+
+    NaN cells are skipped; a window needs `min_periods` values (default: a
+    majority of the window). The scale is 1.4826 x MAD, or 1.2533 x the mean
+    absolute deviation where the MAD is 0. Weeks without such a window around
+    them (series edges, sparse stretches) take the nearest one's values; rows
+    with none stay NaN.
+    """
+    if window % 2 == 0:
+        raise ValueError("window must be odd")
+    n, T = values.shape
+    min_periods = min_periods or window // 2 + 1
+    median = np.full((n, T), np.nan, dtype="float32")
+    scale = np.full((n, T), np.nan, dtype="float32")
+    if T < window:
+        return median, scale
+    half = window // 2
+
+    values = np.asarray(values, dtype="float32")
+    observed = ~np.isnan(values)
+    counts = np.cumsum(observed, axis=1)
+    counts = np.concatenate([counts[:, window - 1:window], counts[:, window:] - counts[:, :-window]], axis=1)
+    windows = np.sort(sliding_window_view(values, window, axis=1), axis=2)
+    mid = (_select(windows, (counts - 1) // 2) + _select(windows, counts // 2)) / 2
+    deviations = np.abs(windows - mid[..., None])
+    deviations.sort(axis=2)
+    mad = (_select(deviations, (counts - 1) // 2) + _select(deviations, counts // 2)) / 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_ad = np.add.reduce(deviations, axis=2, where=~np.isnan(deviations)) / counts
+    spread = np.where(mad > 0, MAD_SCALE * mad, MEAN_AD_SCALE * mean_ad)
+
+    enough = counts >= min_periods
+    median[:, half:T - half] = np.where(enough, mid, np.nan)
+    scale[:, half:T - half] = np.where(enough, spread, np.nan)
+    return (np.where(observed, _fill_edges(median), np.nan).astype("float32"),
+            np.where(observed, _fill_edges(scale), np.nan).astype("float32"))
+
+
+def seasonal_z(values, median, season=SEASON):
+    """Robust z-score of each week's deviation from its rolling median, net of
+    the series' median deviation in the same week of the season.
+
+    Needs two full seasons of history; NaN otherwise, and a season week seen
+    only once has no profile (0).
+    """
+    n, T = values.shape
+    if T < 2 * season:
+        return np.full((n, T), np.nan, dtype="float32")
+    deviation = np.asarray(values, dtype="float32") - median
+    cycles = -(-T // season)
+    padded = np.full((n, cycles * season), np.nan, dtype="float32")
+    padded[:, :T] = deviation
+    by_cycle = padded.reshape(n, cycles, season)
+    profile = _nanmedian(by_cycle, axis=1)
+    profile[(~np.isnan(by_cycle)).sum(axis=1) < 2] = 0
+    residual = deviation - np.tile(profile, cycles)[:, :T]
+
+    centre = _nanmedian(residual, axis=1)[:, None]
+    spread = MAD_SCALE * _nanmedian(np.abs(residual - centre), axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean_ad = MEAN_AD_SCALE * np.nanmean(np.abs(residual - centre), axis=1)
+    spread = np.where(spread > 0, spread, mean_ad)[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = np.where(spread > 0, (residual - centre) / spread, 0)
+    return np.where(np.isnan(residual), np.nan, z).astype("float32")
+
+
+# =========================
+# Index of flagged points
+# =========================
+class AnomalyIndex:
+    """Flagged (intersection, week) points of a Panel.
+
+    Positions refer to `panel.keys` rows and `panel.weeks`; points are sorted
+    by intersection, then week, so the points of one intersection are a
+    contiguous slice and point lookups are a binary search.
+    """
+
+    def __init__(self, panel, key_idx, week_idx, value, expected, score, seasonal_score, params=None):
+        self.panel = panel
+        self.key_idx = key_idx
+        self.week_idx = week_idx
+        self.value = value
+        self.expected = expected
+        self.score = score
+        self.seasonal_score = seasonal_score
+        self.params = params or {}
+        self._flat = key_idx.astype(np.int64) * len(panel.weeks) + week_idx
+
+    def __len__(self):
+        return len(self.key_idx)
+
+    @property
+    def nbytes(self):
+        return int(sum(a.nbytes for a in (self.key_idx, self.week_idx, self.value, self.expected, self.score,
+                                          self.seasonal_score, self._flat)))
+
+    @property
+    def n_intersections(self):
+        return int(len(np.unique(self.key_idx)))
+
+    def summary(self):
+        n_keys, n_weeks = self.panel.shape
+        return (f"{len(self):,} points flagged across {self.n_intersections:,} of {n_keys:,} intersections "
+                f"(|robust z| > {self.params.get('threshold', THRESHOLD)} against a "
+                f"{self.params.get('window', WINDOW)}-week rolling median, net of seasonality).")
+
+    # =========================
+    # Queries
+    # =========================
+    def contains(self, key_idx, week_idx):
+        # Vectorized: is each (intersection, week) position flagged?
+        flat = np.asarray(key_idx, dtype=np.int64) * len(self.panel.weeks) + np.asarray(week_idx)
+        pos = np.minimum(np.searchsorted(self._flat, flat), max(len(self._flat) - 1, 0))
+        return (self._flat[pos] == flat) if len(self._flat) else np.zeros(np.shape(flat), dtype=bool)
+
+    def _subset(self, idx):
+        return AnomalyIndex(self.panel, self.key_idx[idx], self.week_idx[idx], self.value[idx], self.expected[idx],
+                            self.score[idx], self.seasonal_score[idx], self.params)
+
+    def for_intersection(self, i):
+        lo, hi = np.searchsorted(self.key_idx, [i, i + 1])
+        return self._subset(slice(lo, hi))
+
+    def select(self, mask=None, start=None, end=None, **filters):
+        # Same arguments as Panel.select plus a week range, like Panel.between
+        keep = np.ones(len(self.panel.keys), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        for col, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            keep &= self.panel.keys[col].isin(values).to_numpy()
+        points = keep[self.key_idx]
+        if start is not None:
+            points &= self.week_idx >= self.panel.weeks.searchsorted(pd.Timestamp(start), side="left")
+        if end is not None:
+            points &= self.week_idx < self.panel.weeks.searchsorted(pd.Timestamp(end), side="right")
+        return self._subset(np.flatnonzero(points))
+
+    def frame(self, limit=None, by_score=True):
+        # Long frame of the flagged points, strongest first (or in index order)
+        if not by_score:
+            order = np.arange(len(self))[:limit]
+        elif limit is not None and limit < len(self):
+            top = np.argpartition(-np.abs(self.score), limit)[:limit]
+            order = top[np.argsort(-np.abs(self.score[top]), kind="stable")]
+        else:
+            order = np.argsort(-np.abs(self.score), kind="stable")
+        df = self.panel.keys.iloc[self.key_idx[order]].reset_index(drop=True)
+        df.insert(0, self.panel.date_col, self.panel.weeks[self.week_idx[order]])
+        df[self.panel.target_col] = self.value[order]
+        df["Expected"] = self.expected[order]
+        df["Robust Z"] = self.score[order].round(2)
+        df["Seasonal Z"] = self.seasonal_score[order].round(2)
+        return df
+
+    def weekly_counts(self):
+        counts = np.bincount(self.week_idx, minlength=len(self.panel.weeks))
+        return pd.Series(counts, index=self.panel.weeks, name="Outliers").rename_axis(self.panel.date_col)
+
+    def counts_by(self, key_col):
+        # Flagged points and flagged intersections per value of key_col
+        keys = self.panel.keys[key_col].iloc[self.key_idx].to_numpy()
+        df = pd.DataFrame({key_col: keys, "intersection": self.key_idx})
+        counts = df.groupby(key_col, sort=False, observed=True).agg(
+            outliers=("intersection", "size"), intersections=("intersection", "nunique"))
+        return counts.sort_values("outliers", ascending=False)
+
+
+def detect_outliers(panel, window=WINDOW, season=SEASON, threshold=THRESHOLD, ignore_zeros=True,
+                    block_rows=BLOCK_ROWS):
+    """Score every week of every intersection and index the outliers.
+
+    A week is flagged when its robust z-score against the rolling median is
+    beyond `threshold` and, given two seasons of history, its seasonal
+    residual z-score is too (so a peak that recurs every year is not flagged).
+    With `ignore_zeros`, weeks without demand (including the zeros
+    process_level fills in) are left out of the windows and never flagged, so
+    intermittent series are scored on their demand sizes.
+    """
+    parts = {name: [] for name in ("key_idx", "week_idx", "value", "expected", "score", "seasonal_score")}
+    n = panel.shape[0]
+    with span("anomalies", intersections=n, weeks=panel.shape[1]) as s:
+        for lo in range(0, n, block_rows):
+            values = np.asarray(panel.values[lo:lo + block_rows], dtype="float32")
+            scored = np.where(values == 0, np.float32(np.nan), values) if ignore_zeros else values
+            median, scale = rolling_median_scale(scored, window)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                z = np.where(scale > 0, (scored - median) / scale, 0)
+            seasonal = seasonal_z(scored, median, season)
+            flagged = (np.abs(z) > threshold) & ~(np.abs(seasonal) <= threshold)
+            rows, weeks = np.nonzero(flagged)
+            parts["key_idx"].append(rows + lo)
+            parts["week_idx"].append(weeks)
+            parts["value"].append(values[rows, weeks])
+            parts["expected"].append(median[rows, weeks])
+            parts["score"].append(z[rows, weeks].astype("float32"))
+            parts["seasonal_score"].append(seasonal[rows, weeks])
+        arrays = {name: np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+                  for name, chunks in parts.items()}
+        s["flagged"] = len(arrays["key_idx"])
+    return AnomalyIndex(panel, **arrays, params={"window": window, "season": season, "threshold": threshold,
+                                                 "ignore_zeros": ignore_zeros})
@@ -0,0 +1,170 @@
+# utils/calendar_cube.py
+# Weekly totals of the processed target overall and per key value, computed
+# once from the Panel. Every calendar grain (ISO week, month, fiscal month /
+# quarter, year) is rolled up from these weekly columns, so plots and the question
+# router never regroup the row-level data.
+import threading
+
+import numpy as np
+import pandas as pd
+
+from utils.fiscal_calendar import week_ids
+from utils.panel import Panel
+
+CALENDAR_COLUMNS = ["Year", "Month", "ISO Year", "ISO Week", "Fiscal Month", "Fiscal Quarter", "Fiscal Year",
+                    "Month Start", "Year Start"]
+
+
+def _aggregate(panel, by, values):
+    return Panel(values, panel.keys, panel.weeks).aggregate(by)
+
+
+class CalendarCube:
+    """Weekly sums and counts (weeks with a value) per key value and overall.
+
+    `sums[key_col]` / `counts[key_col]` are (key values x weeks) DataFrames,
+    `totals` / `total_counts` weekly Series. `fiscal` is a parsed fiscal
+    calendar (utils/fiscal_calendar.py); without one the fiscal month,
+    quarter and year are the calendar ones.
+    """
+
+    def __init__(self, sums, counts, totals, total_counts, date_col="Time.[Week]", target_col="Actual", fiscal=None):
+        self.sums = sums
+        self.counts = counts
+        self.totals = totals
+        self.total_counts = total_counts
+        self.date_col = date_col
+        self.target_col = target_col
+        self.fiscal = fiscal
+        self._calendar = None
+        self._rollups = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_panel(cls, panel, fiscal=None):
+        sums, counts, totals, total_counts = cls._reduce(panel)
+        return cls(sums, counts, totals, total_counts, panel.date_col, panel.target_col, fiscal)
+
+    @classmethod
+    def from_long(cls, df, date_col, key_cols, target_col, fiscal=None):
+        return cls.from_panel(Panel.from_long(df, date_col, key_cols, target_col), fiscal)
+
+    @staticmethod
+    def _reduce(panel):
+        present = ~np.isnan(panel.values)
+        sums = {col: panel.aggregate(col) for col in panel.key_cols}
+        counts = {col: _aggregate(panel, col, present.astype("float32")).astype("int64") for col in panel.key_cols}
+        return sums, counts, panel.total(), pd.Series(present.sum(axis=0), index=panel.weeks)
+
+    @property
+    def weeks(self):
+        return self.totals.index
+
+    @property
+    def key_cols(self):
+        return list(self.sums)
+
+    @property
+    def nbytes(self):
+        frames = list(self.sums.values()) + list(self.counts.values())
+        return int(sum(frame.memory_usage(deep=True).sum() for frame in frames) + self.totals.nbytes * 2)
+
+    # =========================
+    # Incremental updates
+    # =========================
+    def extend(self, panel):
+        """Append the weeks of `panel` after the cube's last week (in place).
+
+        Only the new week columns of the panel are reduced; earlier weeks are
+        assumed unchanged, as IncrementalLevel guarantees for a later end date.
+        """
+        with self._lock:
+            new = panel.between(start=self.weeks[-1] + pd.Timedelta(days=1)) if len(self.weeks) else panel
+            if not len(new.weeks):
+                return self
+            sums, counts, totals, total_counts = self._reduce(new)
+            for col in self.key_cols:
+                # Key values first seen in the new weeks get zeros before them
+                self.sums[col] = pd.concat([self.sums[col], sums[col]], axis=1).fillna(0.0)
+                self.counts[col] = pd.concat([self.counts[col], counts[col]], axis=1).fillna(0).astype("int64")
+            self.totals = pd.concat([self.totals, totals])
+            self.total_counts = pd.concat([self.total_counts, total_counts])
+            self._calendar = None
+            self._rollups = {}
+        return self
+
+    def between(self, start=None, end=None):
+        # New cube over a week range; key values with no data in it are dropped
+        keep = np.ones(len(self.weeks), dtype=bool)
+        if start is not None:
+            keep &= self.weeks >= pd.Timestamp(start)
+        if end is not None:
+            keep &= self.weeks <= pd.Timestamp(end)
+        sums, counts = {}, {}
+        for col in self.key_cols:
+            count = self.counts[col].loc[:, keep]
+            active = count.sum(axis=1).to_numpy() > 0
+            sums[col] = self.sums[col].loc[active, keep]
+            counts[col] = count.loc[active]
+        return CalendarCube(sums, counts, self.totals[keep], self.total_counts[keep], self.date_col, self.target_col,
+                            self.fiscal)
+
+    # =========================
+    # Calendar rollups
+    # =========================
+    def calendar(self):
+        # One row per week with every calendar attribute
+        if self._calendar is None:
+            weeks = self.weeks
+            iso = weeks.isocalendar()
+            if self.fiscal is not None:
+                # Integer week ids into the fiscal calendar; its labels are
+                # categories already ordered by period start
+                ids = week_ids(self.fiscal, weeks, self.date_col)
+                fiscal = {col: self.fiscal[col].take(np.maximum(ids, 0)).where(ids >= 0).to_numpy()
+                          for col in ("Fiscal Month", "Fiscal Quarter", "Fiscal Year")}
+                for col in ("Fiscal Month", "Fiscal Quarter"):
+                    fiscal[col] = pd.Categorical(fiscal[col], categories=self.fiscal[col].cat.categories, ordered=True)
+            else:
+                fiscal = {"Fiscal Month": pd.Categorical(weeks.strftime("%Y-%m"), ordered=True),
+                          "Fiscal Quarter": pd.Categorical(weeks.to_period("Q").astype(str), ordered=True),
+                          "Fiscal Year": weeks.year}
+            self._calendar = pd.DataFrame({
+                "Year": weeks.year,
+                "Month": weeks.month,
+                "ISO Year": iso["year"].to_numpy(),
+                "ISO Week": iso["week"].to_numpy(),
+                **fiscal,
+                "Month Start": weeks.to_period("M").to_timestamp(),
+                "Year Start": weeks.to_period("Y").to_timestamp(),
+            }, index=weeks)
+        return self._calendar
+
+    def rollup(self, grain, by=None, stat="sum"):
+        """Totals per calendar `grain` (a CALENDAR_COLUMNS name or list of them).
+
+        Returns a Series, or with `by` a (periods x key values) DataFrame.
+        stat is 'sum', 'count' (weeks with a value) or 'mean' (sum / count).
+        """
+        grain = [grain] if isinstance(grain, str) else list(grain)
+        name = (tuple(grain), by, stat)
+        if name not in self._rollups:
+            if stat == "mean":
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    result = self.rollup(grain, by, "sum") / self.rollup(grain, by, "count")
+            else:
+                calendar = self.calendar()
+                if by is None:
+                    weekly = self.totals if stat == "sum" else self.total_counts
+                else:
+                    weekly = (self.sums if stat == "sum" else self.counts)[by].T
+                result = weekly.groupby([calendar[col] for col in grain], observed=True).sum()
+            self._rollups[name] = result
+        return self._rollups[name]
+
+    def key_totals(self, key_col, stat="sum"):
+        # Whole-range totals per value of key_col
+        if stat == "mean":
+            with np.errstate(invalid="ignore", divide="ignore"):
+                return self.sums[key_col].sum(axis=1) / self.counts[key_col].sum(axis=1)
+        return (self.sums if stat == "sum" else self.counts)[key_col].sum(axis=1)
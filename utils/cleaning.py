@@ -0,0 +1,425 @@
+# utils/cleaning.py
+# Built-in cleaning engine for the standard steps of agent_cleaning.py: drop
+# columns with too many missing values, mean / mode imputation, duplicate
+# removal and 3 x IQR outlier removal. Input is read in chunks and cleaned in
+# two passes: the first collects missing counts, sums, value counts and
+# quantile sketches per column, the second applies the rules chunk by chunk
+# and writes the result out, so memory is bounded by the chunk size plus the
+# per-column statistics (and 8 bytes per distinct row for de-duplication).
+#
+# Statistics are taken over the raw input (before imputation / de-duplication)
+# and applied to every chunk, so cleaning a file in chunks gives the same rows
+# as cleaning it in one piece whenever the quantile sketches are exact.
+import importlib.util
+import re
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+SKETCH_SIZE = 32_768
+CHUNKSIZE = 500_000
+
+
+@dataclass
+class CleaningOptions:
+    max_missing: float = 0.4
+    impute: bool = True
+    drop_duplicates: bool = True
+    remove_outliers: bool = True
+    iqr_factor: float = 3.0
+
+
+# Instructions the engine understands; anything else is left for generated code.
+# A negation only counts when it governs the step itself ("do not remove
+# outliers", "keep duplicates", "skip imputation"), and only the matched words
+# are consumed, so the rest of a clause is still passed on.
+_NEGATION = r"(?:do not|don't|dont|never|no need to)\s+"
+_ARTICLE = r"(?:(?:the|any|all)\s+)?"
+# Words after a step that make it specific ("with 0", "in column price", "but not ...")
+_QUALIFIER = r"(?:with|using|by|as|to|in|on|for|from|except|excluding|only|other than|but not)"
+_NOT_CUSTOM = rf"(?!\s+{_QUALIFIER}\b)"
+_STEPS = [
+    # (option, verbs, their -ing forms, object, noun form of the step)
+    ("remove_outliers", r"(?:remove|drop|delete|exclude|filter out|clip)",
+     r"(?:removing|dropping|deleting|excluding|filtering out|clipping)", r"outliers?",
+     r"outlier (?:removal|detection|handling)"),
+    ("drop_duplicates", r"(?:remove|drop|delete|dedupe)", r"(?:removing|dropping|deleting)",
+     r"duplicat\w*(?:\s+rows)?", r"(?:duplicate removal|de-?duplication)"),
+    ("impute", r"(?:impute|fill(?: in)?)", r"(?:imputing|filling(?: in)?)",
+     r"(?:missing|null|nan|empty)\s+values?|nulls|nans|gaps", r"imputation"),
+]
+_OPTION_PATTERNS = []
+for _option, _verbs, _gerunds, _object, _noun in _STEPS:
+    _OPTION_PATTERNS += [
+        (rf"\b{_NEGATION}{_verbs}\s+{_ARTICLE}(?:{_object})\b", {_option: False}),
+        (rf"\b(?:keep|retain)\s+{_ARTICLE}(?:{_object})\b", {_option: False}),
+        (rf"\b(?:no|skip|without)\s+{_noun}\b", {_option: False}),
+        (rf"\bwithout\s+{_gerunds}\s+{_ARTICLE}(?:{_object})\b", {_option: False}),
+    ]
+_OPTION_PATTERNS += [
+    # "don't impute" names no object; imputation is the only step with these verbs
+    (r"\b" + _NEGATION + r"(?:impute|fill(?: in)?)\b(?=\s*(?:,|$|(?:and|but|then)\b))", {"impute": False}),
+    (rf"\b{_NEGATION}(?:drop|remove|delete)\s+{_ARTICLE}columns?\b{_NOT_CUSTOM}", {"max_missing": 1.0}),
+    (rf"\b(?:keep|retain)\s+{_ARTICLE}columns?\b{_NOT_CUSTOM}", {"max_missing": 1.0}),
+]
+# Plain instructions last, once their negated forms are consumed
+_OPTION_PATTERNS += [(rf"\b{verbs}\s+{_ARTICLE}(?:{obj})\b{_NOT_CUSTOM}", {option: True})
+                     for option, verbs, _, obj, _ in _STEPS]
+# A step done a specific way ("fill missing values with 0") is left to generated
+# code, with the built-in step off so it does not run first
+_CUSTOM_PATTERNS = [(rf"\b{verbs}\s+{_ARTICLE}(?:{obj})\s+{_QUALIFIER}\b", option)
+                    for option, verbs, _, obj, _ in _STEPS]
+# Text left for generated code that still talks about a standard step: the
+# built-in step is turned off so it cannot run first and pre-empt the code
+_STEP_MENTIONS = [
+    (r"\b(?:imput\w*|fill\w*)", {"impute": False}),
+    (r"\boutliers?\b", {"remove_outliers": False}),
+    (r"\b(?:duplicat\w*|dedup\w*)", {"drop_duplicates": False}),
+    (r"\b(?:missing|nulls?|nans?|empty)\b", {"impute": False, "max_missing": 1.0}),
+    (r"\b(?:drop|remove|delete|keep|retain)\w*\s+(?:\w+\s+){0,2}columns?\b", {"max_missing": 1.0}),
+]
+_MISSING_PATTERNS = [
+    r"(?:(?:drop|remove|delete)\s+)?(?:(?:the\s+)?columns?\s+)?(?:with\s+|having\s+|that have\s+)?"
+    r"(?:more than\s+|over\s+|above\s+|>\s*)?(\d+(?:\.\d+)?)\s*%\s*(?:or more\s+)?(?:of\s+)?"
+    r"(?:(?:their|the)\s+)?(?:values\s+)?(?:missing|null|empty)(?:\s+values)?",
+    r"(?:(?:drop|remove|delete)\s+)?(?:(?:the\s+)?columns?\s+)?(?:where|with|whose)?\s*(?:missing|null)\s*"
+    r"(?:values\s+)?(?:share\s+)?(?:is\s+|are\s+)?(?:exceeds?|above|over|more than|>)\s*(\d+(?:\.\d+)?)\s*%",
+]
+_FILLER = r"(?:and|but|then|also|please|,|\s)*"
+
+
+def parse_instructions(instructions):
+    """Split free-text instructions into (CleaningOptions, remaining text).
+
+    Phrases the built-in steps can express (e.g. "Do not remove outliers",
+    "drop columns with more than 60% missing") become options; whatever else
+    a clause says is kept in the remaining text, which is empty when no
+    generated code is needed. A standard step the remaining text still
+    mentions is turned off, so the generated code owns it.
+    """
+    options = CleaningOptions()
+    remaining = []
+    for clause in re.split(r"[.;\n]+", instructions or ""):
+        for pattern, option in _CUSTOM_PATTERNS:
+            if re.search(pattern, clause, flags=re.IGNORECASE):
+                setattr(options, option, False)
+        for pattern, changes in _OPTION_PATTERNS:
+            if re.search(pattern, clause, flags=re.IGNORECASE):
+                for name, value in changes.items():
+                    setattr(options, name, value)
+                clause = re.sub(pattern, " ", clause, flags=re.IGNORECASE)
+        for pattern in _MISSING_PATTERNS:
+            missing = re.search(pattern, clause, flags=re.IGNORECASE)
+            if missing:
+                options.max_missing = float(missing.group(1)) / 100
+                clause = clause[:missing.start()] + " " + clause[missing.end():]
+        # What is left once the consumed phrases and the words joining them are gone
+        clause = re.sub(rf"^{_FILLER}\b|\b{_FILLER}$", "", clause.strip(), flags=re.IGNORECASE)
+        clause = re.sub(r"\b(and|but|then)(?:[\s,]+(?:and|but|then)\b)+", r"\1", clause, flags=re.IGNORECASE)
+        clause = re.sub(r"\s{2,}", " ", clause).strip(" ,")
+        if clause:
+            for pattern, changes in _STEP_MENTIONS:
+                if re.search(pattern, clause, flags=re.IGNORECASE):
+                    for name, value in changes.items():
+                        setattr(options, name, value)
+            remaining.append(clause)
+    return options, ". ".join(remaining)
+
+
+# =========================
+# Quantile sketch
+# =========================
+class QuantileSketch:
+    """Mergeable quantile summary (KLL-style compactors).
+
+    Holds every value, and so answers exactly, until more than `size` values
+    were added; after that each level keeps at most `size` sorted values of
+    weight 2**level and rank errors stay around levels / size.
+    """
+
+    def __init__(self, size=SKETCH_SIZE, seed=0):
+        self.size = size
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, values):
+        values = np.asarray(values, dtype="float64")
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        level = 0
+        while len(self.levels[level]) > self.size:
+            # Keep every other sorted value (random offset) at twice the weight
+            kept = np.sort(self.levels[level])[self._rng.integers(0, 2)::2]
+            self.levels[level] = np.empty(0)
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1], kept])
+            level += 1
+
+    @property
+    def exact(self):
+        return len(self.levels) == 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        if self.exact:
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** i) for i, level in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        # Linear interpolation between order statistics, like np.quantile
+        position = q * (cumulative[-1] - 1)
+        return float(np.interp(position, cumulative - 1, values))
+
+
+# =========================
+# Pass 1: statistics
+# =========================
+class CleaningStats:
+    """Per-column statistics accumulated over chunks (pass 1)."""
+
+    def __init__(self, numeric_cols, sketch_size=SKETCH_SIZE):
+        self.numeric_cols = list(numeric_cols)
+        self.rows = 0
+        self.columns = None
+        self.missing = None
+        self.sums = {col: 0.0 for col in self.numeric_cols}
+        self.counts = {col: 0 for col in self.numeric_cols}
+        self.integral = {col: True for col in self.numeric_cols}
+        self.sketches = {col: QuantileSketch(sketch_size) for col in self.numeric_cols}
+        self.value_counts = {}
+
+    def update(self, chunk):
+        chunk = coerce_numeric(chunk, self.numeric_cols)
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.missing = pd.Series(0, index=self.columns, dtype="int64")
+        self.rows += len(chunk)
+        self.missing = self.missing.add(chunk.isna().sum(), fill_value=0).astype("int64")
+        for col in self.columns:
+            values = chunk[col].dropna()
+            if col in self.sums:
+                numbers = values.to_numpy(dtype="float64")
+                self.sums[col] += numbers.sum()
+                self.counts[col] += len(numbers)
+                self.integral[col] &= bool(np.all(np.mod(numbers, 1) == 0))
+                self.sketches[col].add(numbers)
+            else:
+                counts = values.value_counts(sort=False)
+                previous = self.value_counts.get(col)
+                self.value_counts[col] = counts if previous is None else previous.add(counts, fill_value=0)
+        return self
+
+    def plan(self, options=None):
+        """The CleaningPlan these statistics imply under `options`."""
+        options = options or CleaningOptions()
+        share = self.missing / max(self.rows, 1)
+        dropped = [col for col in self.columns if share[col] > options.max_missing]
+        kept = [col for col in self.columns if col not in dropped]
+
+        fill = {}
+        if options.impute:
+            for col in kept:
+                if col in self.sums:
+                    if self.counts[col]:
+                        fill[col] = self.sums[col] / self.counts[col]
+                elif col in self.value_counts and len(self.value_counts[col]):
+                    counts = self.value_counts[col]
+                    # Ties go to the smallest value, like Series.mode()
+                    fill[col] = counts[counts == counts.max()].sort_index().index[0]
+
+        bounds = {}
+        if options.remove_outliers:
+            for col in kept:
+                if col in self.sketches and self.sketches[col].count:
+                    q1, q3 = self.sketches[col].quantile(0.25), self.sketches[col].quantile(0.75)
+                    iqr = q3 - q1
+                    bounds[col] = (q1 - options.iqr_factor * iqr, q3 + options.iqr_factor * iqr)
+
+        # Integer columns stay integers when nothing was missing (or all was imputed)
+        dtypes = {col: "int64" if self.integral[col] and (self.missing[col] == 0 or col in fill) and
+                  float(fill.get(col, 0)).is_integer() else "float64"
+                  for col in kept if col in self.sums}
+        return CleaningPlan(kept, dropped, fill, bounds, dtypes, options.drop_duplicates,
+                            exact=all(sketch.exact for sketch in self.sketches.values()))
+
+
+def coerce_numeric(chunk, numeric_cols):
+    # Numeric columns are fixed up front; stray text in them counts as missing
+    converted = {col: pd.to_numeric(chunk[col], errors="coerce") for col in numeric_cols
+                 if col in chunk.columns and not pd.api.types.is_numeric_dtype(chunk[col])}
+    return chunk.assign(**converted) if converted else chunk
+
+
+# =========================
+# Pass 2: apply
+# =========================
+class _SeenRows:
+    # Row hashes seen so far as a few sorted arrays (merged when similar in size)
+    def __init__(self):
+        self.runs = []
+
+    def contains(self, hashes):
+        # Sorted needles keep the binary searches cache friendly
+        order = np.argsort(hashes)
+        needles = hashes[order]
+        found = np.zeros(len(hashes), dtype=bool)
+        for run in self.runs:
+            pos = np.minimum(np.searchsorted(run, needles), len(run) - 1)
+            found[order] |= run[pos] == needles
+        return found
+
+    def add(self, hashes):
+        # An all-duplicate chunk adds nothing (and an empty run has no last element to compare)
+        if not len(hashes):
+            return
+        self.runs.append(np.sort(hashes))
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            last = self.runs.pop()
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]), kind="mergesort")
+
+    @property
+    def nbytes(self):
+        return sum(run.nbytes for run in self.runs)
+
+
+@dataclass
+class CleaningPlan:
+    kept: list
+    dropped: list
+    fill: dict
+    bounds: dict
+    dtypes: dict
+    drop_duplicates: bool
+    exact: bool = True
+
+    def applier(self):
+        """A function cleaning one chunk at a time, plus its running report."""
+        seen = _SeenRows()
+        report = {"rows_in": 0, "rows_out": 0, "duplicates_removed": 0, "outliers_removed": 0,
+                  "values_imputed": 0, "columns_dropped": list(self.dropped)}
+        numeric = list(self.dtypes)
+
+        def apply(chunk):
+            report["rows_in"] += len(chunk)
+            chunk = coerce_numeric(chunk[self.kept], numeric)
+            if self.fill:
+                report["values_imputed"] += int(chunk[list(self.fill)].isna().sum().sum())
+                chunk = chunk.fillna(self.fill)
+            if self.drop_duplicates and len(chunk):
+                hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+                keep = ~pd.Series(hashes).duplicated().to_numpy() & ~seen.contains(hashes)
+                seen.add(hashes[keep])
+                report["duplicates_removed"] += int((~keep).sum())
+                chunk = chunk[keep]
+            if self.bounds and len(chunk):
+                inside = np.ones(len(chunk), dtype=bool)
+                for col, (low, high) in self.bounds.items():
+                    values = chunk[col].to_numpy(dtype="float64")
+                    # Rows still missing (imputation off) are not outliers
+                    inside &= np.isnan(values) | ((values >= low) & (values <= high))
+                report["outliers_removed"] += int((~inside).sum())
+                chunk = chunk[inside]
+            casts = {col: dtype for col, dtype in self.dtypes.items() if not chunk[col].isna().any()}
+            chunk = chunk.astype(casts) if casts else chunk
+            report["rows_out"] += len(chunk)
+            return chunk
+
+        return apply, report
+
+
+# =========================
+# Entry points
+# =========================
+def _numeric_columns(sample):
+    # Columns empty in the sample are read as text, not as all-NaN floats
+    return [col for col in sample.columns
+            if pd.api.types.is_numeric_dtype(sample[col]) and not pd.api.types.is_bool_dtype(sample[col])
+            and sample[col].notna().any()]
+
+
+def _read_chunks(source, numeric_cols, columns, chunksize):
+    # Text columns are read as strings so every chunk has the same schema
+    if hasattr(source, "seek"):
+        source.seek(0)
+    dtypes = {col: str for col in columns if col not in numeric_cols}
+    return pd.read_csv(source, chunksize=chunksize, dtype=dtypes)
+
+
+def _write_csv(chunk, f, header):
+    # Arrow formats floats several times faster than to_csv; frames it cannot
+    # convert (mixed object columns from custom code) go through pandas
+    if HAS_ARROW:
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+
+        try:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass
+        else:
+            pa_csv.write_csv(table, f, pa_csv.WriteOptions(include_header=header, quoting_style="needed"))
+            return
+    f.write(chunk.to_csv(header=header, index=False).encode("utf-8"))
+
+
+def clean_frame(df, options=None, custom=None, sketch_size=SKETCH_SIZE):
+    """Clean an in-memory frame; returns (cleaned frame, report).
+
+    `custom(chunk) -> chunk` runs after the built-in steps.
+    """
+    numeric_cols = _numeric_columns(df)
+    plan = CleaningStats(numeric_cols, sketch_size).update(df).plan(options)
+    apply, report = plan.applier()
+    cleaned = apply(df)
+    if custom is not None:
+        cleaned = custom(cleaned)
+    report["rows_out"] = len(cleaned)
+    return cleaned.reset_index(drop=True), report
+
+
+def clean_csv(source, out_path, options=None, custom=None, chunksize=CHUNKSIZE, sketch_size=SKETCH_SIZE,
+              sample_rows=10_000, progress=None):
+    """Clean a CSV in two chunked passes and write the result to `out_path`.
+
+    `custom(chunk) -> chunk` runs on every chunk after the built-in steps, so
+    it must not depend on other rows. progress(rows done, total) is called per
+    chunk, counting rows of both passes; the total is None during the first.
+    Returns the cleaning report.
+    """
+    if hasattr(source, "seek"):
+        source.seek(0)
+    sample = pd.read_csv(source, nrows=sample_rows)
+    numeric_cols = _numeric_columns(sample)
+
+    stats = CleaningStats(numeric_cols, sketch_size)
+    for chunk in _read_chunks(source, numeric_cols, sample.columns, chunksize):
+        stats.update(chunk)
+        if progress:
+            progress(stats.rows, None)
+    plan = stats.plan(options)
+
+    apply, report = plan.applier()
+    rows_out = 0
+    header = True
+    with open(out_path, "wb") as f:
+        for chunk in _read_chunks(source, numeric_cols, sample.columns, chunksize):
+            cleaned = apply(chunk)
+            if custom is not None:
+                cleaned = custom(cleaned)
+            rows_out += len(cleaned)
+            _write_csv(cleaned, f, header)
+            header = False
+            if progress:
+                progress(stats.rows + report["rows_in"], 2 * stats.rows)
+        if header:
+            _write_csv(pd.DataFrame(columns=plan.kept), f, True)
+    report.update({"rows_out": rows_out, "exact_quantiles": plan.exact,
+                   "fill": {col: value.item() if hasattr(value, "item") else value for col, value in plan.fill.items()},
+                   "bounds": {col: [float(low), float(high)] for col, (low, high) in plan.bounds.items()}})
+    return report
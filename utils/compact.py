@@ -0,0 +1,104 @@
+# utils/compact.py
+import numpy as np
+import pandas as pd
+
+# Text columns whose distinct values are at most this share of the rows become
+# categoricals (dictionary-encoded, int8/int16/int32 codes)
+CATEGORY_RATIO = 0.5
+
+
+def _downcast_numeric(series):
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if pd.api.types.is_float_dtype(series):
+        # float32 only when every value survives the round trip
+        values = series.to_numpy(dtype="float64")
+        narrow = values.astype("float32")
+        if np.array_equal(narrow.astype("float64"), values, equal_nan=True):
+            return series.astype("float32")
+    return series
+
+
+def _constant(value, n_rows):
+    # Single-category categorical: int8 codes, so a constant column costs a byte per row
+    if pd.isna(value):
+        return pd.Categorical.from_codes(np.full(n_rows, -1, dtype="int8"), pd.Index([], dtype="object"))
+    return pd.Categorical.from_codes(np.zeros(n_rows, dtype="int8"), [value])
+
+
+def compact_frame(df, keep=(), category_ratio=CATEGORY_RATIO):
+    """Narrow an uploaded frame before any column roles are known.
+
+    Constant columns (except those in `keep`) are listed in attrs["constants"]
+    but kept, so they stay selectable in the UI: constant text becomes a
+    single-category categorical (a byte per row), constant numerics are
+    downcast. Low-cardinality text columns become categoricals and numerics
+    are downcast.
+    """
+    keep = set(keep)
+    columns = {}
+    constants = {}
+    for col in df.columns:
+        series = df[col]
+        if len(df) > 1 and col not in keep and series.nunique(dropna=False) <= 1:
+            value = series.iloc[0]
+            constants[col] = value.item() if hasattr(value, "item") else value
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            columns[col] = _downcast_numeric(series)
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            if col in constants or series.nunique() <= category_ratio * len(df):
+                series = series.astype("category")
+            columns[col] = series
+        else:
+            columns[col] = series
+    compact = pd.DataFrame(columns, index=df.index)
+    compact.attrs["constants"] = constants
+    compact.attrs["memory_report"] = memory_report(df, compact).to_dict(orient="list")
+    return compact
+
+
+def restore_constants(df, columns):
+    # Re-adds constant columns listed in attrs["constants"] that a stage needs
+    # but a projection dropped (e.g. a constant key), as single-category categoricals
+    constants = df.attrs.get("constants", {})
+    restored = {col: _constant(constants[col], len(df)) for col in columns if col not in df.columns and col in constants}
+    return df.assign(**restored) if restored else df
+
+
+def compact_keys(df, key_cols):
+    # Forecast-level keys (often int64 ids) as categoricals; codes are int8-int32
+    converted = {col: df[col].astype("category") for col in key_cols
+                 if not isinstance(df[col].dtype, pd.CategoricalDtype)}
+    return df.assign(**converted) if converted else df
+
+
+def compact_target(df, target_col):
+    # process_level zero-fills into float64; narrow it back when lossless
+    return df.assign(**{target_col: _downcast_numeric(df[target_col])})
+
+
+def widen_numeric(df):
+    # Narrow numerics are for storage: float32 sums lose precision and narrow
+    # integers overflow in cumulative sums, so computations get int64 / float64
+    widened = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in "iuf" and dtype.itemsize < 8:
+            widened[col] = df[col].astype("float64" if dtype.kind == "f" else "int64")
+    return df.assign(**widened) if widened else df
+
+
+def memory_report(before, after):
+    # Per-column dtype and MB before/after; dropped columns show no "after"
+    before_bytes = before.memory_usage(deep=True, index=False)
+    after_bytes = after.memory_usage(deep=True, index=False)
+    report = pd.DataFrame({
+        "column": before.columns,
+        "dtype_before": [str(before[col].dtype) for col in before.columns],
+        "mb_before": (before_bytes / 2**20).round(3).to_numpy(),
+        "dtype_after": [str(after[col].dtype) if col in after.columns else "dropped" for col in before.columns],
+        "mb_after": [round(after_bytes[col] / 2**20, 3) if col in after.columns else 0.0 for col in before.columns],
+    })
+    total = pd.DataFrame([{"column": "TOTAL", "dtype_before": "", "mb_before": round(before_bytes.sum() / 2**20, 3),
+                           "dtype_after": "", "mb_after": round(after_bytes.sum() / 2**20, 3)}])
+    return pd.concat([report, total], ignore_index=True)
@@ -0,0 +1,88 @@
+# utils/dates.py
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# Formats seen in tenant extracts, tried in order; e.g. '16-Aug-21' in
+# tenant_actual.csv / time_dimension.csv and '12/31/2018 12:00:00 AM' in the
+# Stat R Attribute Week anchors.
+KNOWN_FORMATS = [
+    "%d-%b-%y",
+    "%d-%b-%Y",
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%d.%m.%Y",
+    "%Y%m%d",
+]
+
+
+# Formats that read the same strings with day and month swapped
+DAY_MONTH_SWAPPED = {"%m/%d/%Y": "%d/%m/%Y", "%d/%m/%Y": "%m/%d/%Y"}
+
+
+def _day_month_order(values, fmt, swapped):
+    # Every value, not just the sample, decides: one first field above 12
+    # anywhere in the column settles the order. When both orders parse
+    # everything the column is ambiguous: warn and keep `fmt`.
+    values = pd.Series(pd.Series(values).dropna().astype(str).unique())
+    fits = pd.to_datetime(values, format=fmt, errors="coerce").notna().all()
+    swapped_fits = pd.to_datetime(values, format=swapped, errors="coerce").notna().all()
+    if fits and swapped_fits:
+        warnings.warn(f"Dates such as '{values.iloc[0]}' parse as both {fmt} and {swapped}; "
+                      f"reading them as {fmt}", UserWarning, stacklevel=3)
+        return fmt
+    if swapped_fits:
+        return swapped
+    return fmt if fits else None
+
+
+def detect_format(values, formats=KNOWN_FORMATS, sample_size=1000):
+    # First format that parses every non-null value in the sample, else None.
+    # Day/month order is checked on all values (see _day_month_order).
+    sample = pd.Series(values).dropna().astype(str)
+    if len(sample) > sample_size:
+        sample = sample.sample(sample_size, random_state=0)
+    if sample.empty:
+        return None
+    for fmt in formats:
+        parsed = pd.to_datetime(sample, format=fmt, errors="coerce")
+        if parsed.notna().all():
+            if DAY_MONTH_SWAPPED.get(fmt) in formats:
+                return _day_month_order(values, fmt, DAY_MONTH_SWAPPED[fmt])
+            return fmt
+    return None
+
+
+def normalize_dates(values, fmt=None):
+    """Parse a date column once per distinct value.
+
+    Returns (parsed Series, number of non-null values that failed to parse).
+    """
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values, 0
+
+    codes, uniques = pd.factorize(values)
+    if fmt is None:
+        fmt = detect_format(uniques)
+
+    if fmt is not None:
+        parsed = pd.to_datetime(pd.Series(uniques).astype(str), format=fmt, errors="coerce")
+    else:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)
+            parsed = pd.to_datetime(pd.Series(uniques), format="mixed", errors="coerce")
+
+    unique_dates = parsed.to_numpy(dtype="datetime64[ns]")
+    result = np.full(len(codes), np.datetime64("NaT"), dtype="datetime64[ns]")
+    found = codes >= 0
+    result[found] = unique_dates[codes[found]]
+    result = pd.Series(result, index=values.index, name=values.name)
+
+    failed_uniques = parsed.isna().to_numpy()
+    failures = int(failed_uniques[codes[found]].sum())
+    return result, failures
@@ -0,0 +1,75 @@
+# utils/excel.py
+# Excel uploads are parsed once with openpyxl in read-only streaming mode,
+# each column coerced to a single type, and stored as an uncompressed Arrow
+# file keyed by the file hash. Later loads memory-map that file instead of
+# re-parsing the workbook.
+import hashlib
+import importlib.util
+import io
+import os
+
+import pandas as pd
+
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def _coerce(values):
+    # One dtype per column: numbers, dates and booleans keep their type,
+    # anything mixed with text becomes text
+    series = pd.Series(values, dtype=object)
+    kind = pd.api.types.infer_dtype(series, skipna=True)
+    if kind == "empty":
+        return series.astype("float64")
+    if kind in ("integer", "floating", "mixed-integer-float", "decimal"):
+        numbers = pd.to_numeric(series)
+        return numbers.astype("int64") if kind == "integer" and not series.isna().any() else numbers
+    if kind in ("datetime", "datetime64", "date"):
+        return pd.to_datetime(series)
+    if kind == "boolean":
+        return series.astype("boolean") if series.isna().any() else series.astype(bool)
+    if kind == "string":
+        return pd.Series(values)
+    return pd.Series([None if value is None else str(value) for value in values])
+
+
+def read_excel_streaming(source, sheet_name=0):
+    """Parse one sheet (index or name) with the first row as the header."""
+    from openpyxl import load_workbook
+
+    if hasattr(source, "getvalue"):
+        source = io.BytesIO(source.getvalue())
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, ())
+        columns = list(zip(*rows)) or [()] * len(header)
+    finally:
+        workbook.close()
+
+    names = [f"Unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)]
+    # Trailing columns without a header or any value are formatting leftovers
+    while names and header[len(names) - 1] is None and all(v is None for v in columns[len(names) - 1]):
+        names.pop()
+    return pd.DataFrame({name: _coerce(values) for name, values in zip(names, columns)})
+
+
+def load_excel(source, sheet_name=0, cache_dir=".excel_cache", digest=None):
+    # Parsed once per file content and sheet; later calls memory-map the cache
+    if not HAS_ARROW:
+        return read_excel_streaming(source, sheet_name)
+    from pyarrow import feather
+
+    if digest is None:
+        data = source.getvalue() if hasattr(source, "getvalue") else open(source, "rb").read()
+        digest = hashlib.sha256(data).hexdigest()
+    path = os.path.join(cache_dir, f"{digest}_{sheet_name}.arrow")
+    if os.path.exists(path):
+        return feather.read_table(path, memory_map=True).to_pandas()
+
+    df = read_excel_streaming(source, sheet_name)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = path + ".tmp"
+    feather.write_feather(df, tmp, compression="uncompressed")
+    os.replace(tmp, path)
+    return df
@@ -1,43 +1,257 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-from itertools import product
-import matplotlib.pyplot as plt
-import streamlit as st
 
 # utils/fill_missing_weeks.py (rename to process_forecast_level.py or keep as is)
 
-def process_level(df, df_time, forecast_level, col_sales):
-    results = []
-    total_combinations = df[forecast_level].drop_duplicates().shape[0]
-    intersection_count = 0
+def process_level(df, df_time, forecast_level, col_sales, date_col='Time.[Week]', carry=None):
+    # Vectorized equivalent of merging every forecast_level group with the time
+    # dimension: one row per intersection x week (duplicate actuals kept), gaps
+    # zero-filled, negatives clipped and leading zero weeks trimmed.
+    # `carry` holds running col_sales totals per intersection from earlier weeks
+    # (see IncrementalLevel); intersections with a positive total are not trimmed.
+    forecast_level = list(forecast_level)
+    weeks = df_time.dropna(subset=[date_col]).drop_duplicates(subset=[date_col])
+    weeks = weeks.sort_values(by=date_col, kind='stable').reset_index(drop=True)
+    n_weeks = len(weeks)
+
+    keys = df[forecast_level]
+    if carry is not None:
+        carry = carry[carry[col_sales] > 0]
+        keys = pd.concat([keys, carry[forecast_level]], ignore_index=True)
+    # Rows with a NaN key get code -1 and are dropped, as groupby did in the per-group loop
+    codes = keys.groupby(forecast_level, sort=True, observed=True).ngroup().to_numpy(dtype=np.int64, na_value=-1)
+    key_code = codes[:len(df)]
+    week_pos = pd.Index(weeks[date_col]).get_indexer(df[date_col])
+    valid = (key_code >= 0) & (week_pos >= 0)
+    if n_weeks == 0 or not (valid.any() or len(keys) > len(df)):
+        return pd.DataFrame()
+
+    n_keys = int(codes.max()) + 1
+    offset = np.zeros(n_keys)
+    if carry is not None:
+        carried = codes[len(df):] >= 0
+        offset[codes[len(df):][carried]] = carry[col_sales].to_numpy(dtype='float64')[carried]
+
+    rows = np.flatnonzero(valid)
+    cell = key_code[rows] * n_weeks + week_pos[rows]
+    order = np.argsort(cell, kind='stable')
+    rows, cell = rows[order], cell[order]
+    key_code, week_pos = key_code[rows], week_pos[rows]
+
+    # Grouped cumulative sum over the clipped target drops leading zero weeks
+    sales = df[col_sales].to_numpy(dtype='float64', na_value=np.nan)[rows]
+    sales = np.clip(np.nan_to_num(sales, nan=0.0), 0, None)
+    keep = (pd.Series(sales).groupby(key_code).cumsum().to_numpy() + offset[key_code]) != 0
+    rows, cell, key_code, week_pos = rows[keep], cell[keep], key_code[keep], week_pos[keep]
+
+    first = np.full(n_keys, n_weeks, dtype=np.int64)
+    first[key_code[::-1]] = week_pos[::-1]
+    first[offset > 0] = 0
+    if (first == n_weeks).all():
+        return pd.DataFrame()
+
+    # Grid cells after each intersection's first week that have no actuals
+    span = n_weeks - first
+    grid_key = np.repeat(np.arange(n_keys), span)
+    grid_week = np.arange(len(grid_key)) - np.repeat(np.cumsum(span) - span, span) + np.repeat(first, span)
+    grid_cell = grid_key * n_weeks + grid_week
+    if len(cell):
+        pos = np.minimum(np.searchsorted(cell, grid_cell), len(cell) - 1)
+        empty = cell[pos] != grid_cell
+        grid_key, grid_week, grid_cell = grid_key[empty], grid_week[empty], grid_cell[empty]
+
+    # First row (actuals or carry) holding each intersection's key values
+    coded = np.flatnonzero(codes >= 0)
+    key_rows = np.zeros(n_keys, dtype=np.int64)
+    key_rows[codes[coded][::-1]] = coded[::-1]
+
+    actual_part = df.iloc[rows].drop(columns=[date_col]).reset_index(drop=True)
+    # Filler keeps the input dtypes (categorical keys stay categorical)
+    filler = actual_part.iloc[:0].reindex(pd.RangeIndex(len(grid_key)))
+    key_values = keys.iloc[key_rows].reset_index(drop=True)
+    for col in forecast_level:
+        filler[col] = key_values[col].iloc[grid_key].reset_index(drop=True)
+    result = pd.concat([actual_part, filler], ignore_index=True)
+
+    order = np.argsort(np.concatenate([cell, grid_cell]), kind='stable')
+    time_part = weeks.iloc[np.concatenate([week_pos, grid_week])[order]].reset_index(drop=True)
+    result = result.iloc[order].reset_index(drop=True)
+    result = pd.concat([time_part, result.drop(columns=[c for c in time_part.columns if c in result.columns])], axis=1)
+
+    for col in result.columns[result.isna().any()]:
+        if isinstance(result[col].dtype, pd.CategoricalDtype) and 0 not in result[col].cat.categories:
+            result[col] = result[col].cat.add_categories([0])
+    result = result.fillna(0)
+    result[col_sales] = result[col_sales].clip(lower=0)
+    return result
+
+
+def _partition_count(df, n_weeks, forecast_level, workers, max_partition_mb):
+    # Upper bound of the filled grid held by one partition: every intersection
+    # expanded to every week, at the input's bytes per row.
+    n_keys = max(len(df[forecast_level].drop_duplicates()), 1)
+    row_bytes = df.memory_usage(deep=True).sum() / max(len(df), 1)
+    grid_mb = n_keys * n_weeks * row_bytes / 2**20
+    return max(workers, int(np.ceil(grid_mb / max_partition_mb)))
+
 
-    grouped = df.groupby(forecast_level)
+def process_level_parallel(df, df_time, forecast_level, col_sales, date_col='Time.[Week]',
+                           workers=None, max_partition_mb=512, progress=None):
+    # Hash-partitions the actuals by forecast_level, runs process_level on each
+    # partition in a process pool and merges back in the serial row order.
+    # progress(done, total) is called as partitions finish.
+    forecast_level = list(forecast_level)
+    workers = workers or os.cpu_count() or 1
+    n_partitions = _partition_count(df, df_time[date_col].nunique(), forecast_level, workers, max_partition_mb)
+    if n_partitions == 1:
+        result = process_level(df, df_time, forecast_level, col_sales, date_col)
+        if progress:
+            progress(1, 1)
+        return result
 
-    for keys, group in grouped:
-        if not isinstance(keys, tuple):
-            keys = (keys,)
+    partition = pd.util.hash_pandas_object(df[forecast_level], index=False).to_numpy() % n_partitions
+    parts = [df[partition == p] for p in range(n_partitions)]
+    parts = [part for part in parts if len(part)]
 
-        merged_group = pd.merge(df_time, group, on='Time.[Week]', how='left')
+    with ProcessPoolExecutor(max_workers=min(workers, len(parts))) as pool:
+        futures = [pool.submit(process_level, part, df_time, forecast_level, col_sales, date_col) for part in parts]
+        results = []
+        for future in futures:
+            results.append(future.result())
+            if progress:
+                progress(len(results), len(futures))
 
-        for col, key in zip(forecast_level, keys):
-            merged_group[col] = key
+    results = [result for result in results if len(result)]
+    if not results:
+        return pd.DataFrame()
+    combined = pd.concat(results, ignore_index=True)
+    return combined.sort_values(by=forecast_level + [date_col], kind='stable', ignore_index=True)
 
-        merged_group.fillna(0, inplace=True)
-        merged_group[col_sales] = merged_group[col_sales].clip(lower=0)
 
-        merged_group.sort_values(by='Time.[Week]', inplace=True)
-        merged_group['Cumulative Sum'] = merged_group[col_sales].cumsum()
-        filtered_group = merged_group[merged_group['Cumulative Sum'] != 0].drop(columns=['Cumulative Sum'])
+def run_process_level(df, df_time, forecast_level, col_sales, date_col='Time.[Week]',
+                      mode='serial', workers=None, max_partition_mb=512, progress=None):
+    if mode == 'parallel':
+        return process_level_parallel(df, df_time, forecast_level, col_sales, date_col,
+                                      workers=workers, max_partition_mb=max_partition_mb, progress=progress)
+    result = process_level(df, df_time, forecast_level, col_sales, date_col)
+    if progress:
+        progress(1, 1)
+    return result
 
-        results.append(filtered_group)
-        intersection_count += 1
-        print(f'Processed {intersection_count}/{total_combinations}')
 
-    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+class IncrementalLevel:
+    # Keeps the processed output and each intersection's running col_sales total
+    # (a positive total means its first non-zero week is already behind us), so
+    # moving the end date or appending new weeks only processes the delta weeks.
 
+    def __init__(self, df, df_time, forecast_level, col_sales, date_col='Time.[Week]', **run_kwargs):
+        self.forecast_level = list(forecast_level)
+        self.col_sales = col_sales
+        self.date_col = date_col
+        self.run_kwargs = run_kwargs
+        self.actuals = df
+        self.df_time = df_time.sort_values(by=date_col, kind='stable', ignore_index=True)
+        self.end = None
+        self.totals = None
+        self._pieces = []
+        self._processed = None
+        self._lock = threading.Lock()
 
+    @property
+    def nbytes(self):
+        frames = [self.actuals, self.df_time, self.totals] + self._pieces
+        frames = [frame for frame in frames if frame is not None]
+        return int(sum(frame.memory_usage(index=False).sum() for frame in frames))
 
+    def result(self, end_date, progress=None):
+        end_date = pd.Timestamp(end_date)
+        with self._lock:
+            if self.end is None or end_date > self.end:
+                self._extend(end_date, progress)
+            processed = self._combined()
+        if processed.empty or end_date >= self.end:
+            return processed
+        return processed[processed[self.date_col] <= end_date].reset_index(drop=True)
 
+    def append(self, new_actuals):
+        # Weeks at or before the processed end are recomputed from that week on
+        earliest = new_actuals[self.date_col].min()
+        with self._lock:
+            self.actuals = pd.concat([self.actuals, new_actuals], ignore_index=True)
+            if self.end is not None and earliest <= self.end:
+                self._rewind(earliest)
+
+    def _extend(self, end_date, progress=None):
+        time_col = self.df_time[self.date_col]
+        actual_col = self.actuals[self.date_col]
+        time_mask = time_col <= end_date
+        actual_mask = actual_col <= end_date
+        if self.end is not None:
+            time_mask &= time_col > self.end
+            actual_mask &= actual_col > self.end
+
+        delta_actuals = self.actuals[actual_mask]
+        delta_time = self.df_time[time_mask]
+        if self.end is None:
+            piece = run_process_level(delta_actuals, delta_time, self.forecast_level, self.col_sales, self.date_col,
+                                      progress=progress, **self.run_kwargs)
+        else:
+            piece = process_level(delta_actuals, delta_time, self.forecast_level, self.col_sales, self.date_col,
+                                  carry=self.totals)
+            if progress:
+                progress(1, 1)
+
+        if len(piece):
+            self._pieces.append(piece)
+            self._processed = None
+            self.totals = self._totals([self.totals, piece])
+        self.end = end_date
+
+    def _rewind(self, week):
+        processed = self._combined()
+        kept = processed[processed[self.date_col] < week] if len(processed) else processed
+        self._pieces = [kept] if len(kept) else []
+        self._processed = None
+        self.totals = self._totals([kept]) if len(kept) else None
+        earlier = self.df_time[self.date_col][self.df_time[self.date_col] < week]
+        self.end = earlier.max() if len(earlier) else None
+
+    def _totals(self, frames):
+        columns = self.forecast_level + [self.col_sales]
+        frames = [frame[columns] for frame in frames if frame is not None and len(frame)]
+        totals = pd.concat(frames, ignore_index=True).groupby(self.forecast_level, sort=False, observed=True,
+                                                              as_index=False).sum()
+        return totals[totals[self.col_sales] > 0]
+
+    def _combined(self):
+        if self._processed is None:
+            if not self._pieces:
+                self._processed = pd.DataFrame()
+            elif len(self._pieces) == 1:
+                self._processed = self._pieces[0]
+            else:
+                # Each piece is sorted by key then week and later pieces hold later
+                # weeks, so a stable sort on the key code alone restores the order
+                # (timsort merges the pre-sorted runs in near-linear time).
+                combined = pd.concat(self._pieces, ignore_index=True)
+                codes = combined.groupby(self.forecast_level, sort=True, observed=True).ngroup().to_numpy()
+                self._processed = combined.take(np.argsort(codes, kind='stable')).reset_index(drop=True)
+                self._pieces = [self._processed]
+        return self._processed
+
+
+
+
+# Plot helpers import matplotlib / streamlit on first use so processing code
+# stays importable (and fast to import) outside the Streamlit app
 def plot_yearly_trend(df, time_col, y_col):
+    import matplotlib.pyplot as plt
+    import streamlit as st
+
     df['Year'] = pd.to_datetime(df[time_col]).dt.year
     df['Week'] = pd.to_datetime(df[time_col]).dt.isocalendar().week
 
@@ -50,27 +264,30 @@ def plot_yearly_trend(df, time_col, y_col):
     st.pyplot(plt)
 
 def plot_monthly_trend(df, time_col, y_col):
+    import streamlit as st
+
     df['Year'] = pd.to_datetime(df[time_col]).dt.year
     df['Month'] = pd.to_datetime(df[time_col]).dt.month
     monthly = df.groupby(['Year', 'Month'])[y_col].sum().unstack(0)
     st.bar_chart(monthly)
 
 def plot_weekly_trend(df, time_col, y_col):
+    import streamlit as st
+
     df['Week'] = pd.to_datetime(df[time_col]).dt.isocalendar().week
     weekly = df.groupby('Week')[y_col].sum()
     st.line_chart(weekly)
 
-from openai import OpenAI
-import streamlit as st
 
-client = OpenAI(api_key=st.secrets["openai"]["api_key"])
+def ask_llm(question, df, date_col=None, key_cols=None, target_col=None, token_budget=800):
+    from utils.llm_client import get_client
+    from utils.profile import build_profile
 
-def ask_llm(question, df):
-    preview = df.head(30).to_csv(index=False)
-    system_prompt = "You are a time series data analyst. Answer user questions based on the CSV data provided."
-    user_prompt = f"Data preview:\n{preview}\n\nQuestion: {question}"
+    profile = build_profile(df, date_col, key_cols, target_col, token_budget=token_budget)
+    system_prompt = "You are a time series data analyst. Answer user questions based on the data profile provided."
+    user_prompt = f"Data profile:\n{profile}\n\nQuestion: {question}"
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model="gpt-4.1-nano-2025-04-14",
         messages=[
             {"role": "system", "content": system_prompt},
@@ -0,0 +1,78 @@
+# utils/fiscal_calendar.py
+# The time dimension packs the fiscal calendar into one pipe-delimited
+# 'Stat R Attribute Week' string per week, e.g.
+#   07-Jan-19|07-Jan-19|Jan-P19|Q1-P19|1/7/2019 12:00:00 AM|1/7/2019 12:00:00 AM|12/31/2018 12:00:00 AM|12/31/2018 12:00:00 AM
+# It is split once into typed columns with integer week / fiscal month /
+# fiscal quarter ids and stored as a columnar file, so roll-ups are integer
+# lookups instead of string parsing.
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.dates import normalize_dates
+
+ATTRIBUTE_COL = "Stat R Attribute Week"
+FIELDS = ["Week Label", "Week Name", "Fiscal Month", "Fiscal Quarter", "Week Start", "Week Anchor",
+          "Fiscal Month Start", "Fiscal Quarter Start"]
+
+
+def parse_fiscal_calendar(df_time, date_col="Time.[Week]", attribute_col=ATTRIBUTE_COL):
+    """One row per week, sorted, with row position == week_id.
+
+    Columns: date_col, week_id, Fiscal Month / Fiscal Quarter (ordered
+    categories), fiscal_month_id, fiscal_quarter_id, Fiscal Year and the
+    fiscal month / quarter start dates.
+    """
+    weeks = df_time[[date_col, attribute_col]].dropna().drop_duplicates(date_col)
+    weeks = weeks[weeks[attribute_col].astype(str).str.count(r"\|") == len(FIELDS) - 1]
+    fields = weeks[attribute_col].astype(str).str.split("|", expand=True, regex=False)
+    fields.columns = FIELDS
+
+    dates = weeks[date_col]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates, _ = normalize_dates(dates)
+    calendar = pd.DataFrame({date_col: dates.to_numpy()})
+    for col in ("Fiscal Month Start", "Fiscal Quarter Start"):
+        calendar[col] = normalize_dates(fields[col].reset_index(drop=True))[0].to_numpy()
+    calendar["Fiscal Month"] = fields["Fiscal Month"].to_numpy()
+    calendar["Fiscal Quarter"] = fields["Fiscal Quarter"].to_numpy()
+    calendar = calendar.dropna(subset=[date_col]).sort_values(date_col, kind="stable").reset_index(drop=True)
+
+    calendar.insert(1, "week_id", np.arange(len(calendar), dtype="int32"))
+    for label, start, id_col in (("Fiscal Month", "Fiscal Month Start", "fiscal_month_id"),
+                                 ("Fiscal Quarter", "Fiscal Quarter Start", "fiscal_quarter_id")):
+        # Periods are numbered in time order of their start dates
+        calendar[id_col] = pd.factorize(calendar[start], sort=True)[0].astype("int16")
+        order = calendar.drop_duplicates(id_col).sort_values(id_col)[label]
+        calendar[label] = pd.Categorical(calendar[label], categories=pd.unique(order), ordered=True)
+    # 'Jan-P19' / 'Q1-P19' -> fiscal year 2019
+    year = pd.to_numeric(calendar["Fiscal Quarter"].astype(str).str.extract(r"P(\d+)$")[0], errors="coerce")
+    calendar["Fiscal Year"] = (2000 + year).astype("Int16")
+    return calendar
+
+
+def load_fiscal_calendar(df_time, path, date_col="Time.[Week]", attribute_col=ATTRIBUTE_COL):
+    # Parsed once per time dimension; later loads read the columnar file
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    calendar = parse_fiscal_calendar(df_time, date_col, attribute_col)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    try:
+        calendar.to_parquet(path, index=False)
+    except ImportError:
+        # No parquet engine; parse again next time
+        pass
+    return calendar
+
+
+def week_ids(calendar, dates, date_col="Time.[Week]"):
+    # Positions of `dates` in the calendar (-1 where missing)
+    return pd.DatetimeIndex(calendar[date_col]).get_indexer(pd.DatetimeIndex(dates))
+
+
+def lookup(calendar, dates, column, date_col="Time.[Week]"):
+    """`column` of the calendar for each of `dates` (NaN / NaT where missing)."""
+    ids = week_ids(calendar, dates, date_col)
+    values = calendar[column].take(np.maximum(ids, 0)).reset_index(drop=True)
+    return values.where(pd.Series(ids >= 0))
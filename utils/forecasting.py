@@ -0,0 +1,173 @@
+# utils/forecasting.py
+# Batch statistical forecasts over a Panel: every method works on the whole
+# (intersections x weeks) array at once, looping over weeks only.
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# Methods: values (n x T, NaN before each series starts) -> (n x horizon)
+# =========================
+def seasonal_naive(values, horizon, season=52):
+    n, T = values.shape
+    last = _last_value(values)
+    if T < season:
+        return np.repeat(last[:, None], horizon, axis=1)
+    idx = T - season + (np.arange(horizon) % season)
+    forecast = values[:, idx]
+    # Series younger than a season repeat their last value instead
+    return np.where(np.isnan(forecast), last[:, None], forecast)
+
+
+def moving_average(values, horizon, window=13):
+    recent = values[:, -window:]
+    with np.errstate(invalid="ignore"):
+        level = np.nansum(recent, axis=1) / (~np.isnan(recent)).sum(axis=1)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def simple_exponential_smoothing(values, horizon, alpha=0.3):
+    level = np.full(values.shape[0], np.nan)
+    for t in range(values.shape[1]):
+        x = values[:, t]
+        level = np.where(np.isnan(level), x, np.where(np.isnan(x), level, alpha * x + (1 - alpha) * level))
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def holt(values, horizon, alpha=0.3, beta=0.1):
+    level = np.full(values.shape[0], np.nan)
+    trend = np.zeros(values.shape[0])
+    for t in range(values.shape[1]):
+        x = values[:, t]
+        started = ~np.isnan(level)
+        update = started & ~np.isnan(x)
+        new_level = np.where(update, alpha * x + (1 - alpha) * (level + trend), level)
+        trend = np.where(update, beta * (new_level - level) + (1 - beta) * trend, trend)
+        level = np.where(started, new_level, x)
+    steps = np.arange(1, horizon + 1)
+    return np.clip(level[:, None] + trend[:, None] * steps, 0, None)
+
+
+def croston(values, horizon, alpha=0.1):
+    # Smoothed demand size over smoothed inter-demand interval
+    size = np.full(values.shape[0], np.nan)
+    interval = np.full(values.shape[0], np.nan)
+    since = np.zeros(values.shape[0])
+    for t in range(values.shape[1]):
+        x = values[:, t]
+        observed = ~np.isnan(x)
+        since = np.where(observed, since + 1, since)
+        demand = observed & (x > 0)
+        first = demand & np.isnan(size)
+        later = demand & ~first
+        size = np.where(first, x, np.where(later, size + alpha * (x - size), size))
+        interval = np.where(first, since, np.where(later, interval + alpha * (since - interval), interval))
+        since = np.where(demand, 0, since)
+    level = np.where(np.isnan(size), 0.0, size / interval)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def tsb(values, horizon, alpha=0.1, beta=0.1):
+    # Teunter-Syntetos-Babai: demand probability updated every week, size on demand
+    size = np.full(values.shape[0], np.nan)
+    prob = np.full(values.shape[0], np.nan)
+    for t in range(values.shape[1]):
+        x = values[:, t]
+        observed = ~np.isnan(x)
+        demand = observed & (x > 0)
+        first = demand & np.isnan(size)
+        started = ~np.isnan(prob)
+        prob = np.where(first, 1.0, np.where(started & observed, prob + beta * (demand - prob), prob))
+        size = np.where(first, x, np.where(demand & ~first, size + alpha * (x - size), size))
+    level = np.where(np.isnan(size), 0.0, prob * size)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+METHODS = {
+    "Seasonal Naive": seasonal_naive,
+    "Moving Average": moving_average,
+    "Simple Exponential Smoothing": simple_exponential_smoothing,
+    "Holt": holt,
+    "Croston": croston,
+    "TSB": tsb,
+}
+
+
+def _last_value(values):
+    observed = ~np.isnan(values)
+    last = values.shape[1] - 1 - np.argmax(observed[:, ::-1], axis=1)
+    return np.where(observed.any(axis=1), values[np.arange(values.shape[0]), last], np.nan)
+
+
+# =========================
+# Batched / parallel execution
+# =========================
+def _forecast_chunk(values, method, horizon, params):
+    forecast = METHODS[method](values, horizon, **params)
+    # Series that have not started yet forecast zero
+    return np.nan_to_num(forecast, nan=0.0)
+
+
+def forecast_values(values, method, horizon, workers=1, chunk_size=50_000, **params):
+    chunks = [values[i:i + chunk_size] for i in range(0, len(values), chunk_size)] or [values]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = list(pool.map(_forecast_chunk, chunks, repeat(method), repeat(horizon), repeat(params)))
+    else:
+        results = [_forecast_chunk(chunk, method, horizon, params) for chunk in chunks]
+    return np.concatenate(results, axis=0)
+
+
+def future_weeks(weeks, horizon):
+    step = pd.Series(weeks).diff().median() if len(weeks) > 1 else pd.Timedelta(weeks=1)
+    return pd.DatetimeIndex([weeks[-1] + step * (k + 1) for k in range(horizon)])
+
+
+def forecast_panel(panel, method, horizon, workers=1, chunk_size=50_000, **params):
+    # Long-format forecasts: date, key columns, 'Forecast'
+    forecast = forecast_values(np.asarray(panel.values, dtype="float64"), method, horizon, workers, chunk_size,
+                               **params)
+    weeks = future_weeks(panel.weeks, horizon)
+    result = panel.keys.iloc[np.repeat(np.arange(len(panel.keys)), horizon)].reset_index(drop=True)
+    result.insert(0, panel.date_col, np.tile(weeks, len(panel.keys)))
+    result["Forecast"] = forecast.ravel()
+    result["Method"] = method
+    return result
+
+
+def backtest(panel, method, horizon, n_origins=4, step=None, workers=1, chunk_size=50_000, **params):
+    # Rolling-origin evaluation: refit on values[:, :origin] for the last
+    # n_origins origins and score the next `horizon` weeks per intersection.
+    values = np.asarray(panel.values, dtype="float64")
+    step = step or horizon
+    T = values.shape[1]
+    origins = [T - horizon - step * i for i in range(n_origins)]
+    origins = [origin for origin in origins if origin > 0]
+
+    abs_error = np.zeros(len(values))
+    abs_actual = np.zeros(len(values))
+    ape_sum = np.zeros(len(values))
+    ape_count = np.zeros(len(values))
+    for origin in origins:
+        forecast = forecast_values(values[:, :origin], method, horizon, workers, chunk_size, **params)
+        actual = values[:, origin:origin + horizon]
+        scored = ~np.isnan(actual)
+        error = np.where(scored, np.abs(forecast - np.nan_to_num(actual)), 0.0)
+        abs_error += error.sum(axis=1)
+        abs_actual += np.where(scored, np.abs(actual), 0.0).sum(axis=1)
+        nonzero = scored & (np.nan_to_num(actual) != 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ape_sum += np.where(nonzero, error / np.abs(actual), 0.0).sum(axis=1)
+        ape_count += nonzero.sum(axis=1)
+
+    result = panel.keys.copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result["MAPE"] = np.where(ape_count > 0, 100 * ape_sum / ape_count, np.nan)
+        result["WAPE"] = np.where(abs_actual > 0, 100 * abs_error / abs_actual, np.nan)
+    result["Method"] = method
+    result.attrs["overall_wape"] = float(100 * abs_error.sum() / abs_actual.sum()) if abs_actual.sum() else np.nan
+    result.attrs["origins"] = [str(panel.weeks[origin].date()) for origin in origins]
+    return result
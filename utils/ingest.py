@@ -0,0 +1,241 @@
+# utils/ingest.py
+# Out-of-core ingestion of large actuals CSVs. The file is read in chunks with
+# only [date_col] + key_cols + [target_col] parsed, rows after the end date
+# dropped and duplicate key/week rows summed as it is read. Chunks are
+# hash-partitioned on the keys into Parquet files, so every intersection lives
+# in exactly one partition and process_level can run partition by partition.
+# Peak memory is bounded by the chunk size plus the largest partition while
+# ingesting and processing; process_ingested then holds the processed result
+# (compact dtypes) in memory, write_processed leaves it on disk.
+import glob
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.compact import compact_keys, compact_target
+from utils.dates import detect_format, normalize_dates
+from utils.fill_missing_weeks import process_level
+
+PARTITION_MB = 256
+# Large files are only read from / written to this directory on the server;
+# the UIs list its files instead of taking free-text paths (unset: disabled)
+DATA_DIR = os.environ.get("TSA_DATA_DIR")
+
+
+def file_fingerprint(path):
+    # Cheap identity of a file on disk: path, size and modification time
+    stat = os.stat(path)
+    return hashlib.sha256(f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")).hexdigest()
+
+
+def data_files(extensions=(".csv",)):
+    """Paths relative to DATA_DIR of the files with one of `extensions`."""
+    if not DATA_DIR or not os.path.isdir(DATA_DIR):
+        return []
+    names = []
+    for root, _, files in os.walk(DATA_DIR):
+        names += [os.path.relpath(os.path.join(root, name), DATA_DIR) for name in files
+                  if name.lower().endswith(tuple(extensions))]
+    return sorted(names)
+
+
+def data_path(name):
+    """Absolute path of `name` inside DATA_DIR; ValueError for anything outside it."""
+    if not DATA_DIR:
+        raise ValueError("No data directory configured (set TSA_DATA_DIR)")
+    root = os.path.realpath(DATA_DIR)
+    path = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, path]) != root:
+        raise ValueError(f"{name} is outside the data directory")
+    return path
+
+
+def _read_dtypes(source, columns, key_cols, date_col, sample_rows=10_000):
+    # Key dtypes are fixed up front from a sample so every chunk (and so every
+    # Parquet file) has the same schema; integer keys stay integers
+    sample = pd.read_csv(source, usecols=columns, nrows=sample_rows)
+    dtypes = {col: "Int64" if pd.api.types.is_integer_dtype(sample[col]) else "string" for col in key_cols}
+    return dtypes, detect_format(sample[date_col])
+
+
+def ingest_csv(source, out_dir, date_col, key_cols, target_col, end_date=None, chunksize=1_000_000,
+               n_partitions=None, partition_mb=PARTITION_MB, progress=None):
+    """Stream a CSV into `out_dir`/part-XXXXX.parquet; returns the ingest summary.
+
+    Duplicate key/week rows are summed (NaN only when every duplicate is NaN).
+    progress(rows read, None) is called after every chunk.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    key_cols = list(key_cols)
+    columns = [date_col] + key_cols + [target_col]
+    group_cols = key_cols + [date_col]
+    if n_partitions is None:
+        size = os.path.getsize(source) if isinstance(source, (str, os.PathLike)) else 0
+        n_partitions = max(1, int(np.ceil(size / (partition_mb * 2**20))))
+    dtypes, fmt = _read_dtypes(source, columns, key_cols, date_col)
+    end_date = None if end_date is None else pd.Timestamp(end_date)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir)
+    paths = [os.path.join(out_dir, f"part-{i:05d}.parquet") for i in range(n_partitions)]
+    writers = [None] * n_partitions
+    schema = None
+    summary = {"rows_read": 0, "rows_after_filter": 0, "rows_written": 0, "chunks": 0, "date_parse_failures": 0}
+    try:
+        # Integer keys are left to the C parser and cast afterwards; parsing
+        # straight into nullable Int64 goes through a slow string path
+        reader = pd.read_csv(source, usecols=columns, chunksize=chunksize,
+                             dtype={**{col: dtype for col, dtype in dtypes.items() if dtype == "string"},
+                                    target_col: "float64", date_col: "string"})
+        for chunk in reader:
+            summary["rows_read"] += len(chunk)
+            summary["chunks"] += 1
+            for col, dtype in dtypes.items():
+                if dtype != "string":
+                    chunk[col] = chunk[col].astype(dtype)
+            chunk[date_col], failures = normalize_dates(chunk[date_col], fmt)
+            summary["date_parse_failures"] += failures
+            keep = chunk[date_col].notna()
+            if end_date is not None:
+                keep &= chunk[date_col] <= end_date
+            chunk = chunk[keep]
+            summary["rows_after_filter"] += len(chunk)
+
+            chunk = chunk.groupby(group_cols, sort=False, observed=True, dropna=False)[target_col] \
+                .sum(min_count=1).reset_index()[columns]
+            part = pd.util.hash_pandas_object(chunk[key_cols], index=False).to_numpy() % n_partitions
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if schema is None:
+                schema = table.schema
+            for i in np.unique(part):
+                if writers[i] is None:
+                    writers[i] = pq.ParquetWriter(paths[i], schema)
+                writers[i].write_table(table.filter(pa.array(part == i)))
+            if progress:
+                progress(summary["rows_read"], None)
+    finally:
+        for writer in writers:
+            if writer is not None:
+                writer.close()
+
+    # Duplicates can span chunks: compact each partition on its own
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        df = pd.read_parquet(path)
+        df = df.groupby(group_cols, sort=True, observed=True, dropna=False)[target_col] \
+            .sum(min_count=1).reset_index()[columns]
+        df.to_parquet(path, index=False)
+        summary["rows_written"] += len(df)
+
+    summary.update({"partitions": sum(os.path.exists(path) for path in paths), "columns": columns,
+                    "end_date": None if end_date is None else str(end_date.date())})
+    with open(os.path.join(out_dir, "_ingest.json"), "w") as f:
+        json.dump(summary, f)
+    return summary
+
+
+def partition_paths(out_dir):
+    return sorted(glob.glob(os.path.join(out_dir, "part-*.parquet")))
+
+
+def read_partitions(out_dir):
+    # One DataFrame per partition, never the whole dataset at once
+    for path in partition_paths(out_dir):
+        yield pd.read_parquet(path)
+
+
+def _process_partition(path, df_time, key_cols, target_col, date_col):
+    return process_level(pd.read_parquet(path), df_time, key_cols, target_col, date_col)
+
+
+def process_partitions(out_dir, df_time, key_cols, target_col, date_col="Time.[Week]", workers=1, progress=None):
+    """Yield process_level output per partition (optionally in worker processes).
+
+    Intersections never span partitions, so the concatenated output equals
+    process_level on the whole dataset up to row order. progress(done, total)
+    is called as partitions finish.
+    """
+    paths = partition_paths(out_dir)
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+            futures = [pool.submit(_process_partition, path, df_time, key_cols, target_col, date_col)
+                       for path in paths]
+            for done, future in enumerate(futures, start=1):
+                result = future.result()
+                if progress:
+                    progress(done, len(paths))
+                yield result
+    else:
+        for done, path in enumerate(paths, start=1):
+            result = _process_partition(path, df_time, key_cols, target_col, date_col)
+            if progress:
+                progress(done, len(paths))
+            yield result
+
+
+def write_processed(out_dir, df_time, key_cols, target_col, date_col="Time.[Week]", workers=1, progress=None,
+                    dest=None):
+    """Write process_level output per partition to `dest`/processed-XXXXX.parquet; returns the paths.
+
+    `dest` defaults to `out_dir`. Only one partition's output is held in memory
+    at a time; it is written with categorical keys and the narrowest lossless
+    target dtype.
+    """
+    dest = out_dir if dest is None else dest
+    for path in glob.glob(os.path.join(dest, "processed-*.parquet")):
+        os.remove(path)
+    paths = []
+    for piece in process_partitions(out_dir, df_time, key_cols, target_col, date_col, workers, progress):
+        if len(piece):
+            path = os.path.join(dest, f"processed-{len(paths):05d}.parquet")
+            compact_target(compact_keys(piece, key_cols), target_col).to_parquet(path, index=False)
+            paths.append(path)
+    return paths
+
+
+def read_processed(paths, key_cols):
+    # Processed partitions as one frame with categorical keys (Parquet only
+    # keeps string dictionaries); Arrow buffers are released as they are converted
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if not paths:
+        return pd.DataFrame()
+    tables = []
+    for path in paths:
+        table = pq.read_table(path)
+        for col in key_cols:
+            i = table.schema.get_field_index(col)
+            if not pa.types.is_dictionary(table.schema.field(i).type):
+                table = table.set_column(i, col, table.column(i).dictionary_encode())
+        tables.append(table)
+    table = pa.concat_tables(tables, promote_options="permissive").unify_dictionaries()
+    del tables
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+
+def process_ingested(out_dir, df_time, key_cols, target_col, date_col="Time.[Week]", workers=1, progress=None):
+    """Whole processed result; ordered by key then week within each partition.
+
+    Partitions are processed and written to disk one at a time, so the only
+    full-size object is the returned frame itself (keys as categoricals): that
+    frame, not the CSV, is what has to fit in memory. Callers that only need
+    to stream the result to disk can use write_processed instead. The
+    partitions are only read, so several calls (other grids) can share one
+    ingest directory.
+    """
+    dest = tempfile.mkdtemp(prefix="processed_", dir=out_dir)
+    try:
+        return read_processed(write_processed(out_dir, df_time, key_cols, target_col, date_col, workers, progress,
+                                              dest=dest), key_cols)
+    finally:
+        shutil.rmtree(dest, ignore_errors=True)
@@ -0,0 +1,178 @@
+# utils/instrument.py
+# Stage-level instrumentation: spans record wall time, CPU time and peak RSS
+# of the process while they are open. Recording is off unless a Recorder is
+# enabled for the current context (a Streamlit script run, the CLI's main
+# thread), so instrumented code only pays for a context variable lookup.
+import contextvars
+import functools
+import json
+import os
+import resource
+import threading
+import time
+
+_recorder = contextvars.ContextVar("recorder", default=None)
+
+
+def _read_status():
+    # (current RSS, peak RSS) in MB; the peak is resettable on Linux only
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if line.startswith(("VmRSS", "VmHWM")))
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return peak, peak
+
+
+def _reset_peak():
+    # Writing 5 to clear_refs restarts VmHWM from the current RSS
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class Recorder:
+    """Collects finished spans as dicts, in the order they end."""
+
+    def __init__(self, reset_peak=True):
+        self.records = []
+        self.reset_peak = reset_peak
+        self._open = []
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def _fold_peak(self):
+        # The process peak since the last reset belongs to every open span
+        _, peak = _read_status()
+        for open_span in self._open:
+            open_span.peak = max(open_span.peak, peak)
+
+    def _start(self, new_span):
+        with self._lock:
+            self._fold_peak()
+            if self.reset_peak:
+                _reset_peak()
+            new_span.depth = len(self._open)
+            self._open.append(new_span)
+
+    def _finish(self, done_span, record):
+        with self._lock:
+            self._fold_peak()
+            self._open.remove(done_span)
+            record["peak_rss_mb"] = round(done_span.peak, 1)
+            self.records.append(record)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def summary(self):
+        """Per-stage totals: count, wall / CPU seconds and the highest peak RSS."""
+        import pandas as pd
+
+        if not self.records:
+            return pd.DataFrame(columns=["name", "count", "wall_s", "cpu_s", "peak_rss_mb"])
+        frame = pd.DataFrame(self.records)
+        return frame.groupby("name", sort=False).agg(count=("wall_s", "size"), wall_s=("wall_s", "sum"),
+                                                     cpu_s=("cpu_s", "sum"),
+                                                     peak_rss_mb=("peak_rss_mb", "max")).reset_index()
+
+    def to_jsonl(self, path=None):
+        # JSON lines text, also written to `path` when given
+        text = "".join(json.dumps(record, default=str) + "\n" for record in self.records)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "attrs", "depth", "peak", "_wall", "_cpu", "_rss")
+
+    def __init__(self, recorder, name, attrs):
+        self.recorder = recorder
+        self.name = name
+        self.attrs = attrs
+        self.peak = 0.0
+
+    def __setitem__(self, key, value):
+        self.attrs[key] = value
+
+    def __enter__(self):
+        self.recorder._start(self)
+        self._rss, self.peak = _read_status()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        rss, _ = _read_status()
+        record = {"name": self.name, "start_s": round(self._wall - self.recorder._origin, 4),
+                  "wall_s": round(wall, 4), "cpu_s": round(cpu, 4), "rss_mb": round(rss, 1),
+                  "rss_delta_mb": round(rss - self._rss, 1), "depth": self.depth, "pid": os.getpid(),
+                  "error": None if exc_type is None else exc_type.__name__, **self.attrs}
+        self.recorder._finish(self, record)
+        return False
+
+
+class _NullSpan:
+    # Returned when recording is off; attributes set on it are dropped
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setitem__(self, key, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **attrs):
+    """Context manager timing one stage; `with span(...) as s: s["rows"] = n` adds fields."""
+    recorder = _recorder.get()
+    if recorder is None:
+        return _NULL_SPAN
+    return _Span(recorder, name, attrs)
+
+
+def traced(name, **attrs):
+    # Decorator form of span() for whole functions
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, **attrs):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enable(recorder=None):
+    # Turns recording on for the current context and returns the recorder
+    recorder = recorder or Recorder()
+    _recorder.set(recorder)
+    return recorder
+
+
+def disable():
+    _recorder.set(None)
+
+
+def get_recorder():
+    return _recorder.get()
+
+
+def print_progress(label):
+    # Progress callback for the CLI: progress(done, total) -> one line per update
+    def progress(done, total):
+        print(f"{label}: {done}/{total if total is not None else '?'}", flush=True)
+    return progress
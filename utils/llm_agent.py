@@ -1,17 +1,17 @@
+import hashlib
 import re
-import streamlit as st
 import traceback
-from openai import OpenAI
-import matplotlib.pyplot as plt
 
-client = OpenAI(api_key=st.secrets["openai"]["api_key"])
+from utils.compact import widen_numeric
+from utils.llm_cache import get_llm_cache, schema_fingerprint
+from utils.llm_client import complete_many, stream_completion
+from utils.profile import build_profile
+from utils.sandbox import get_sandbox
 
-def ask_llm_and_run(question, df, date_col="date", key_cols=None, target_col=None):
-    # Sample if large dataset
-    if len(df) > 1000:
-        df = df.sample(1000, random_state=1).sort_index()
+MODEL = "gpt-4o-mini-2024-07-18"
 
-    csv_data = df.to_csv(index=False)
+
+def _messages(question, date_col, key_cols, target_col, profile):
     key_cols_str = ", ".join(key_cols) if key_cols else "None"
     target_col_str = target_col if target_col else "None"
 
@@ -29,35 +29,91 @@ def ask_llm_and_run(question, df, date_col="date", key_cols=None, target_col=Non
         f"- Do NOT include explanations. Just return executable Python code."
     )
 
-    user_prompt = f"Dataset CSV:\n{csv_data}\n\nQuestion: {question}"
+    user_prompt = f"Dataset profile:\n{profile}\n\nQuestion: {question}"
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            temperature=0.2,
-        )
 
-        raw_code = response.choices[0].message.content.strip()
+def _extract_code(raw_code):
+    # Clean up markdown formatting if any
+    raw_code = raw_code.strip()
+    if raw_code.startswith("```"):
+        return re.sub(r"^```(?:python)?\n?|```$", "", raw_code, flags=re.MULTILINE).strip()
+    return raw_code
 
-        # Clean up markdown formatting if any
-        if raw_code.startswith("```"):
-            code = re.sub(r"^```(?:python)?\n?|```$", "", raw_code, flags=re.MULTILINE).strip()
-        else:
-            code = raw_code.strip()
 
-        local_env = {"df": df.copy(), "plt": plt}
-        exec(code, {}, local_env)
+def _run(raw_code, cache_key, df, digest=None):
+    try:
+        code = _extract_code(raw_code)
+
+        # Runs in a warm worker process with time/memory limits; df is shared,
+        # not copied, and result_fig comes back as PNG bytes
+        output = get_sandbox().run(code, df, digest=digest)
 
         # Show result
-        result = local_env.get("result", None)
-        result_fig = local_env.get("result_fig", None)
+        result = output["result"]
+        result_fig = output["figure"]
+        get_llm_cache().mark(cache_key, True)
 
         return code, result, result_fig
 
     except Exception as e:
+        get_llm_cache().mark(cache_key, False)
+        error_msg = f"Error running generated code:\n{traceback.format_exc()}"
+        return "[Error] Code was not generated or failed.", error_msg, None
+
+
+def ask_llm_and_run(question, df, date_col="date", key_cols=None, target_col=None, profile=None, token_budget=800,
+                    on_token=None, digest=None):
+    # The model sees a full-data profile (schema, date range, cardinalities,
+    # quantiles, top-N totals) instead of sampled rows; the code runs on all of df.
+    # on_token(text so far) is called while the answer streams in. `digest`
+    # (e.g. the processing key of df) lets the sandbox reuse df without rehashing it.
+    df = widen_numeric(df)
+    if profile is None:
+        profile = build_profile(df, date_col, key_cols, target_col, token_budget=token_budget)
+
+    try:
+        # Repeated questions on the same schema/data are served from the LLM cache
+        raw_code, cache_key, _ = stream_completion(
+            MODEL,
+            _messages(question, date_col, key_cols, target_col, profile),
+            schema_fp=schema_fingerprint(df),
+            data_fp=hashlib.sha256(profile.encode("utf-8")).hexdigest()[:16],
+            on_token=on_token,
+            temperature=0.2,
+        )
+    except Exception:
         error_msg = f"Error running generated code:\n{traceback.format_exc()}"
         return "[Error] Code was not generated or failed.", error_msg, None
+    return _run(raw_code, cache_key, df, digest)
+
+
+def ask_llm_batch(questions, df, date_col="date", key_cols=None, target_col=None, profile=None, token_budget=800,
+                  concurrency=4, digest=None):
+    # Code for all questions is generated concurrently (at most `concurrency`
+    # requests in flight), then each snippet runs in the sandbox.
+    # Returns [(code, result, result_fig), ...] in question order.
+    df = widen_numeric(df)
+    if profile is None:
+        profile = build_profile(df, date_col, key_cols, target_col, token_budget=token_budget)
+
+    responses = complete_many(
+        MODEL,
+        [_messages(question, date_col, key_cols, target_col, profile) for question in questions],
+        concurrency=concurrency,
+        schema_fp=schema_fingerprint(df),
+        data_fp=hashlib.sha256(profile.encode("utf-8")).hexdigest()[:16],
+        temperature=0.2,
+    )
+    answers = []
+    for response in responses:
+        if isinstance(response, Exception):
+            answers.append(("[Error] Code was not generated or failed.",
+                            f"Error generating code:\n{''.join(traceback.format_exception(response))}", None))
+        else:
+            raw_code, cache_key, _ = response
+            answers.append(_run(raw_code, cache_key, df, digest))
+    return answers
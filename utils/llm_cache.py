@@ -0,0 +1,166 @@
+# utils/llm_cache.py
+# Cache of LLM responses / generated code keyed on model, normalized prompt,
+# schema fingerprint and data fingerprint. Memory LRU in front of a JSON-file
+# disk tier with TTL and size-based eviction. Entries whose code failed to run
+# are never served again.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def normalize_prompt(text):
+    return " ".join(str(text).split()).lower()
+
+
+def schema_fingerprint(df):
+    schema = [(str(col), str(dtype)) for col, dtype in df.dtypes.items()]
+    return hashlib.sha256(json.dumps(schema).encode("utf-8")).hexdigest()[:16]
+
+
+def data_fingerprint(df):
+    hashed = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha256(hashed.tobytes()).hexdigest()[:16]
+
+
+def cache_key(model, messages, schema_fp="", data_fp=""):
+    normalized = [(m["role"], normalize_prompt(m["content"])) for m in messages]
+    payload = json.dumps([model, normalized, schema_fp, data_fp])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, max_entries=512, cache_dir=".llm_cache", ttl_seconds=7 * 24 * 3600, max_disk_mb=256):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_bytes = max_disk_mb * 2**20
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "failed_skips": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None:
+            entry = self._read(key)
+            source = "disk_hits"
+        else:
+            source = "hits"
+
+        if entry is not None and time.time() - entry["created"] > self.ttl_seconds:
+            self._forget(key)
+            entry = None
+        if entry is not None and entry.get("status") == "failed":
+            self.stats["failed_skips"] += 1
+            entry = None
+
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats[source] += 1
+        self._remember(key, entry)
+        return entry["response"]
+
+    def put(self, key, response, model=None):
+        entry = {"created": time.time(), "response": response, "model": model, "status": None}
+        self._remember(key, entry)
+        self._write(key, entry)
+
+    def mark(self, key, succeeded):
+        # Record whether the cached code executed successfully
+        if key is None:
+            return
+        entry = self._entries.get(key) or self._read(key)
+        if entry is None:
+            return
+        entry["status"] = "ok" if succeeded else "failed"
+        self._remember(key, entry)
+        self._write(key, entry)
+
+    def report(self):
+        lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hit_rate = (self.stats["hits"] + self.stats["disk_hits"]) / lookups if lookups else 0.0
+        return {**self.stats, "hit_rate": round(hit_rate, 3), "entries": len(self._entries)}
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _forget(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _read(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, key, entry):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp, self._path(key))
+        self._evict_disk()
+
+    def _evict_disk(self):
+        now = time.time()
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            stat = os.stat(path)
+            if now - stat.st_mtime > self.ttl_seconds:
+                os.remove(path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        while files and total > self.max_disk_bytes:
+            _, size, path = files.pop(0)
+            total -= size
+            os.remove(path)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_llm_cache():
+    # One cache per process shared by every LLM call site
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache()
+        return _default_cache
+
+
+def cached_completion(client, model, messages, schema_fp="", data_fp="", cache=None, **kwargs):
+    """Return (response text, cache key, hit) for a chat completion."""
+    cache = cache or get_llm_cache()
+    key = cache_key(model, messages, schema_fp, data_fp)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, key, True
+    response = client.chat.completions.create(model=model, messages=messages, **kwargs)
+    text = response.choices[0].message.content
+    cache.put(key, text, model=model)
+    return text, key, False
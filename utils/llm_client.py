@@ -0,0 +1,124 @@
+# utils/llm_client.py
+# Shared LLM client layer: one pooled OpenAI client per process (created on
+# first use, not at import), streamed completions for the UI and a concurrent
+# batch path with a concurrency limit, served by one pooled AsyncOpenAI client
+# on a background event loop. Every call goes through the LLM cache.
+# OPENAI_BASE_URL points the clients at another endpoint (e.g. a local fake).
+import asyncio
+import os
+import threading
+import time
+
+from utils.instrument import span
+from utils.llm_cache import cache_key, get_llm_cache
+
+_client = None
+_client_lock = threading.Lock()
+_async = None  # (event loop, AsyncOpenAI client) shared by every batch
+
+
+def _api_key():
+    if os.environ.get("OPENAI_API_KEY"):
+        return os.environ["OPENAI_API_KEY"]
+    import streamlit as st
+
+    return st.secrets["openai"]["api_key"]
+
+
+def get_client():
+    # One client (and so one HTTP connection pool) shared by every call site
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI
+
+            _client = OpenAI(api_key=_api_key(), base_url=os.environ.get("OPENAI_BASE_URL"))
+        return _client
+
+
+def get_async_client():
+    # The async client's connection pool is bound to the loop it first runs on,
+    # so one loop runs for the life of the process in a daemon thread and every
+    # batch is scheduled on it
+    global _async
+    with _client_lock:
+        if _async is None:
+            from openai import AsyncOpenAI
+
+            async def create():
+                return AsyncOpenAI(api_key=_api_key(), base_url=os.environ.get("OPENAI_BASE_URL"))
+
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-async", daemon=True).start()
+            _async = loop, asyncio.run_coroutine_threadsafe(create(), loop).result()
+        return _async
+
+
+def stream_completion(model, messages, schema_fp="", data_fp="", cache=None, on_token=None, client=None, **kwargs):
+    """Return (response text, cache key, hit), calling on_token(text so far) as tokens arrive.
+
+    A cache hit calls on_token once with the whole cached text.
+    """
+    cache = cache or get_llm_cache()
+    key = cache_key(model, messages, schema_fp, data_fp)
+    cached = cache.get(key)
+    if cached is not None:
+        if on_token:
+            on_token(cached)
+        return cached, key, True
+
+    with span("llm", model=model, prompt_chars=sum(len(m["content"]) for m in messages)) as s:
+        start = time.perf_counter()
+        stream = (client or get_client()).chat.completions.create(model=model, messages=messages, stream=True,
+                                                                  **kwargs)
+        text = ""
+        chunks = 0
+        for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                if not chunks:
+                    s["ttft_s"] = round(time.perf_counter() - start, 4)
+                chunks += 1
+                text += delta
+                if on_token:
+                    on_token(text)
+        # One streamed chunk is one token for OpenAI-compatible servers
+        s["completion_tokens"] = chunks
+        s["response_chars"] = len(text)
+    cache.put(key, text, model=model)
+    return text, key, False
+
+
+async def _complete(client, semaphore, model, messages, schema_fp, data_fp, cache, kwargs):
+    key = cache_key(model, messages, schema_fp, data_fp)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached, key, True
+    async with semaphore:
+        with span("llm", model=model, prompt_chars=sum(len(m["content"]) for m in messages)) as s:
+            response = await client.chat.completions.create(model=model, messages=messages, **kwargs)
+            usage = getattr(response, "usage", None)
+            if usage is not None:
+                s["prompt_tokens"] = usage.prompt_tokens
+                s["completion_tokens"] = usage.completion_tokens
+    text = response.choices[0].message.content
+    cache.put(key, text, model=model)
+    return text, key, False
+
+
+def complete_many(model, message_lists, concurrency=4, schema_fp="", data_fp="", cache=None, **kwargs):
+    """Run one chat completion per message list, at most `concurrency` in flight.
+
+    Returns [(response text, cache key, hit), ...] in input order; a request
+    that failed comes back as its exception instead.
+    """
+    cache = cache or get_llm_cache()
+    loop, client = get_async_client()
+
+    async def run():
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        return await asyncio.gather(*(_complete(client, semaphore, model, messages, schema_fp, data_fp, cache, kwargs)
+                                      for messages in message_lists), return_exceptions=True)
+
+    with span("llm_batch", model=model, requests=len(message_lists), concurrency=concurrency):
+        return list(asyncio.run_coroutine_threadsafe(run(), loop).result())
@@ -0,0 +1,151 @@
+# utils/panel.py
+import json
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class Panel:
+    """Dense intersections x weeks array of the processed target.
+
+    `values[i, j]` is the target of intersection `keys.iloc[i]` in week
+    `weeks[j]`; NaN marks weeks before the intersection's first sale (the rows
+    process_level trims). Duplicate key/week rows are summed.
+    """
+
+    def __init__(self, values, keys, weeks, date_col="Time.[Week]", target_col="Actual"):
+        self.values = values
+        self.keys = keys.reset_index(drop=True)
+        self.weeks = pd.DatetimeIndex(weeks)
+        self.date_col = date_col
+        self.target_col = target_col
+
+    @property
+    def key_cols(self):
+        return list(self.keys.columns)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return int(self.values.nbytes + self.keys.memory_usage(deep=True).sum())
+
+    # =========================
+    # Long format conversion
+    # =========================
+    @classmethod
+    def from_long(cls, df, date_col, key_cols, target_col, weeks=None, dtype="float64"):
+        key_cols = list(key_cols)
+        weeks = pd.DatetimeIndex(np.sort(df[date_col].unique()) if weeks is None else weeks)
+        # Rows with a NaN key are left out (code -1)
+        key_code = df.groupby(key_cols, sort=True, observed=True).ngroup().to_numpy(dtype=np.int64, na_value=-1)
+        week_pos = weeks.get_indexer(df[date_col])
+        valid = (key_code >= 0) & (week_pos >= 0)
+        key_code, week_pos = key_code[valid], week_pos[valid]
+
+        n_keys = int(key_code.max()) + 1 if len(key_code) else 0
+        first_rows = np.zeros(n_keys, dtype=np.int64)
+        rows = np.flatnonzero(valid)
+        first_rows[key_code[::-1]] = rows[::-1]
+
+        flat = key_code * len(weeks) + week_pos
+        size = n_keys * len(weeks)
+        target = df[target_col].to_numpy(dtype="float64", na_value=np.nan)[valid]
+        sums = np.bincount(flat, weights=np.nan_to_num(target), minlength=size)
+        present = np.bincount(flat, minlength=size) > 0
+        values = np.where(present, sums, np.nan).astype(dtype).reshape(n_keys, len(weeks))
+
+        keys = df[key_cols].iloc[first_rows]
+        return cls(values, keys, weeks, date_col, target_col)
+
+    def to_long(self):
+        key_idx, week_idx = np.nonzero(~np.isnan(self.values))
+        long = self.keys.iloc[key_idx].reset_index(drop=True)
+        long.insert(0, self.date_col, self.weeks[week_idx])
+        long[self.target_col] = self.values[key_idx, week_idx]
+        return long
+
+    # =========================
+    # Persistence (memory-mapped)
+    # =========================
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "values.npy"), np.ascontiguousarray(self.values))
+        np.save(os.path.join(path, "weeks.npy"), self.weeks.to_numpy(dtype="datetime64[ns]"))
+        self.keys.to_pickle(os.path.join(path, "keys.pkl"))
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({"date_col": self.date_col, "target_col": self.target_col}, f)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        # values stay on disk and are paged in on access
+        values = np.load(os.path.join(path, "values.npy"), mmap_mode=mmap_mode)
+        weeks = np.load(os.path.join(path, "weeks.npy"))
+        keys = pd.read_pickle(os.path.join(path, "keys.pkl"))
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        return cls(values, keys, weeks, **meta)
+
+    # =========================
+    # Slicing
+    # =========================
+    def select(self, mask=None, **filters):
+        # Boolean mask over intersections and/or key_col=value(s) filters
+        keep = np.ones(len(self.keys), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        for col, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            keep &= self.keys[col].isin(values).to_numpy()
+        idx = np.flatnonzero(keep)
+        return Panel(self.values[idx], self.keys.iloc[idx], self.weeks, self.date_col, self.target_col)
+
+    def between(self, start=None, end=None):
+        lo = 0 if start is None else self.weeks.searchsorted(pd.Timestamp(start), side="left")
+        hi = len(self.weeks) if end is None else self.weeks.searchsorted(pd.Timestamp(end), side="right")
+        return Panel(self.values[:, lo:hi], self.keys, self.weeks[lo:hi], self.date_col, self.target_col)
+
+    # =========================
+    # Aggregation
+    # =========================
+    def total(self):
+        # Weekly total over all intersections
+        return pd.Series(np.nansum(self.values, axis=0, dtype="float64"), index=self.weeks, name=self.target_col)
+
+    def aggregate(self, by):
+        # Weekly totals per `by` key columns, as a (groups x weeks) DataFrame
+        by = [by] if isinstance(by, str) else list(by)
+        codes = self.keys.groupby(by, sort=True, observed=True).ngroup().to_numpy()
+        order = np.argsort(codes, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+        sums = np.add.reduceat(np.nan_to_num(self.values[order], nan=0.0).astype("float64"), starts, axis=0)
+        index = pd.MultiIndex.from_frame(self.keys[by].iloc[order[starts]]) if len(by) > 1 \
+            else pd.Index(self.keys[by[0]].iloc[order[starts]], name=by[0])
+        return pd.DataFrame(sums, index=index, columns=self.weeks)
+
+    def rolling(self, window, func="mean"):
+        # Trailing window per intersection, aligned to the window's last week
+        # (the first window - 1 weeks are NaN); NaN cells are skipped
+        out = np.full(self.values.shape, np.nan)
+        if window > self.values.shape[1]:
+            return out
+
+        if func in ("sum", "mean"):
+            # Differences of cumulative sums: O(weeks) regardless of window
+            present = ~np.isnan(self.values)
+            sums = np.cumsum(np.where(present, self.values, 0.0), axis=1, dtype="float64")
+            counts = np.cumsum(present, axis=1)
+            sums = np.concatenate([sums[:, window - 1:window], sums[:, window:] - sums[:, :-window]], axis=1)
+            counts = np.concatenate([counts[:, window - 1:window], counts[:, window:] - counts[:, :-window]], axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                out[:, window - 1:] = np.where(counts > 0, sums / counts if func == "mean" else sums, np.nan)
+            return out
+
+        reducer = {"median": np.nanmedian, "min": np.nanmin, "max": np.nanmax, "std": np.nanstd}[func]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            out[:, window - 1:] = reducer(sliding_window_view(self.values, window, axis=1), axis=2)
+        return out
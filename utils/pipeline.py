@@ -0,0 +1,368 @@
+# utils/pipeline.py
+import hashlib
+import glob
+import importlib.util
+import json
+import os
+import pickle
+import shutil
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.anomalies import detect_outliers
+from utils.calendar_cube import CalendarCube
+from utils.compact import compact_frame, compact_keys, compact_target, restore_constants
+from utils.dates import normalize_dates
+from utils.excel import load_excel
+from utils.fill_missing_weeks import IncrementalLevel
+from utils.fiscal_calendar import ATTRIBUTE_COL, load_fiscal_calendar
+from utils.forecasting import backtest, forecast_panel
+from utils.ingest import file_fingerprint, ingest_csv, process_ingested
+from utils.instrument import span
+from utils.panel import Panel
+from utils.profile import build_profile
+from utils.question_router import QuestionRouter
+
+HAS_PARQUET = importlib.util.find_spec("pyarrow") is not None
+
+
+MAX_UPLOAD_DIGESTS = 256
+
+_upload_digests = OrderedDict()  # file_id -> digest, least recently used first
+_digests_lock = threading.Lock()
+_ingest_lock = threading.Lock()
+
+
+def content_hash(data):
+    # Accepts raw bytes or a Streamlit UploadedFile / any object with getvalue().
+    # Uploads are hashed once per file_id so reruns don't rehash large files.
+    # A path to a file on disk is identified by path, size and mtime instead.
+    if isinstance(data, (str, os.PathLike)):
+        return file_fingerprint(data)
+    file_id = getattr(data, "file_id", None)
+    if file_id is not None:
+        with _digests_lock:
+            if file_id in _upload_digests:
+                _upload_digests.move_to_end(file_id)
+                return _upload_digests[file_id]
+    digest = hashlib.sha256(data.getvalue() if hasattr(data, "getvalue") else data).hexdigest()
+    if file_id is not None:
+        with _digests_lock:
+            _upload_digests[file_id] = digest
+            while len(_upload_digests) > MAX_UPLOAD_DIGESTS:
+                _upload_digests.popitem(last=False)
+    return digest
+
+
+def _disk_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def _cache_key(stage, parts):
+    return hashlib.sha256(pickle.dumps((stage, parts), protocol=4)).hexdigest()
+
+
+def _size_of(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    return 0
+
+
+class PipelineCache:
+    """Memoizes pipeline stages in a bounded in-memory LRU and spills evicted
+    DataFrames to Parquet on disk."""
+
+    def __init__(self, max_memory_mb=1024, cache_dir=".pipeline_cache", max_disk_mb=4096):
+        self.max_memory_bytes = max_memory_mb * 2**20
+        self.max_disk_bytes = max_disk_mb * 2**20
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "spills": 0}
+
+    def memoize(self, stage, parts, compute):
+        key = _cache_key(stage, parts)
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                self._remeasure(key)
+                return self._entries[key][0]
+
+        value = self._load(key)
+        with self._lock:
+            self.stats["disk_hits" if value is not None else "misses"] += 1
+        if value is None:
+            value = compute()
+
+        with self._lock:
+            self._put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._memory_bytes = 0
+
+    def refresh(self, stage, parts):
+        """Re-measure an entry whose value grew in place (IncrementalLevel, the base cube)."""
+        with self._lock:
+            key = _cache_key(stage, parts)
+            if key in self._entries:
+                self._remeasure(key)
+
+    def _remeasure(self, key):
+        # Frames and bytes never change once cached; objects exposing nbytes can
+        # grow in place after memoize returned them
+        value, size = self._entries[key]
+        if isinstance(value, (pd.DataFrame, bytes, str)) or not hasattr(value, "nbytes"):
+            return
+        new_size = _size_of(value)
+        self._entries[key] = (value, new_size)
+        self._memory_bytes += new_size - size
+        self._evict()
+
+    def _put(self, key, value):
+        size = _size_of(value)
+        self._entries[key] = (value, size)
+        self._memory_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._memory_bytes > self.max_memory_bytes and len(self._entries) > 1:
+            old_key, (old_value, old_size) = self._entries.popitem(last=False)
+            self._memory_bytes -= old_size
+            self.stats["evictions"] += 1
+            self._spill(old_key, old_value)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.parquet")
+
+    def _spill(self, key, value):
+        if not HAS_PARQUET or not isinstance(value, pd.DataFrame):
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        try:
+            value.to_parquet(self._path(key), index=False)
+        except Exception:
+            # Mixed-type object columns cannot be stored; keep memory-only
+            return
+        self.stats["spills"] += 1
+        self._trim_disk()
+
+    def _load(self, key):
+        path = self._path(key)
+        if not HAS_PARQUET or not os.path.exists(path):
+            return None
+        os.utime(path)
+        return pd.read_parquet(path)
+
+    def _trim_disk(self, keep=()):
+        # Spilled frames, fiscal calendars, Excel conversions and ingest
+        # directories share the disk budget; least recently used go first
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if os.path.isdir(path) and not name.startswith("ingest_"):
+                entries += [os.path.join(path, sub) for sub in os.listdir(path)]
+            else:
+                entries.append(path)
+        entries = [(os.path.getmtime(path), _disk_size(path), path) for path in entries if path not in keep]
+        entries.sort()
+        total = sum(size for _, size, _ in entries) + sum(_disk_size(path) for path in keep if os.path.exists(path))
+        while entries and total > self.max_disk_bytes:
+            _, size, path = entries.pop(0)
+            total -= size
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+    def report(self):
+        lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+        hit_rate = (self.stats["hits"] + self.stats["disk_hits"]) / lookups if lookups else 0.0
+        return {**self.stats, "hit_rate": round(hit_rate, 3), "entries": len(self._entries),
+                "memory_mb": round(self._memory_bytes / 2**20, 1)}
+
+
+# =========================
+# Pipeline stages
+# =========================
+def read_upload(cache, uploaded_file):
+    digest = content_hash(uploaded_file)
+
+    def compute():
+        with span("upload_parse", file=uploaded_file.name) as s:
+            uploaded_file.seek(0)
+            if uploaded_file.name.endswith(".csv"):
+                df = pd.read_csv(uploaded_file)
+            else:
+                # Workbooks are parsed once per content hash, then memory-mapped from disk
+                df = load_excel(uploaded_file, cache_dir=os.path.join(cache.cache_dir, "excel"), digest=digest)
+            s["rows"] = len(df)
+            return compact_frame(df)
+
+    return cache.memoize("upload", (digest, uploaded_file.name), compute)
+
+
+def parse_dates(cache, uploaded_file, df, date_col):
+    digest = content_hash(uploaded_file)
+
+    def compute():
+        with span("date_parse", file=getattr(uploaded_file, "name", str(uploaded_file)), rows=len(df)):
+            dates, failures = normalize_dates(df[date_col])
+        parsed = df.assign(**{date_col: dates})
+        parsed.attrs["date_parse_failures"] = failures
+        return parsed
+
+    return cache.memoize("dates", (digest, date_col), compute)
+
+
+def build_fiscal_calendar(cache, time_file, df_time, date_col):
+    # None when the time dimension has no packed fiscal attributes
+    if ATTRIBUTE_COL not in df_time.columns:
+        return None
+    parts = (content_hash(time_file), date_col)
+    path = os.path.join(cache.cache_dir, f"fiscal_{_cache_key('fiscal_calendar', parts)}.parquet")
+    return cache.memoize("fiscal_calendar", parts, lambda: load_fiscal_calendar(df_time, path, date_col))
+
+
+def processing_key(actual_file, time_file, date_col, target_col, key_cols, end_date):
+    return (content_hash(actual_file), content_hash(time_file), date_col, target_col, tuple(key_cols),
+            pd.Timestamp(end_date))
+
+
+def process_uploads(cache, actual_file, time_file, df_actual, df_time, date_col, target_col, key_cols, end_date,
+                    progress=None, **run_kwargs):
+    # df_actual / df_time must already have date_col parsed (see parse_dates).
+    # The IncrementalLevel is shared by every end date of the same uploads, so
+    # moving the end date only processes the weeks it adds. The run settings
+    # (mode, workers, partition size) are part of its key.
+    parts = processing_key(actual_file, time_file, date_col, target_col, key_cols, end_date)
+    columns = [date_col] + key_cols + [target_col]
+    level_parts = parts[:-1] + (tuple(sorted(run_kwargs.items())),)
+    level = cache.memoize("incremental", level_parts, lambda: IncrementalLevel(
+        compact_keys(restore_constants(df_actual, columns)[columns], key_cols), df_time[[date_col]], key_cols,
+        target_col, date_col, **run_kwargs))
+
+    def compute():
+        with span("process_level", rows_in=len(df_actual)) as s:
+            processed = level.result(end_date, progress)
+            cache.refresh("incremental", level_parts)
+            s["rows_out"] = len(processed)
+            return compact_target(processed[columns], target_col)
+
+    return cache.memoize("process_level", parts, compute)
+
+
+def _ingested(cache, actual_path, date_col, target_col, key_cols, end_date):
+    # One ingest directory per file and column selection. The end date only
+    # filters rows, so an ingest filtered at or after `end_date` is reused (the
+    # grid cuts it); an earlier one is replaced. Returns (out_dir, rows read or None).
+    base = _cache_key("ingest", (file_fingerprint(actual_path), date_col, target_col, tuple(key_cols)))
+    end_date = pd.Timestamp(end_date)
+    with _ingest_lock:
+        for out_dir in glob.glob(os.path.join(cache.cache_dir, f"ingest_{base}_*")):
+            summary_path = os.path.join(out_dir, "_ingest.json")
+            if not os.path.exists(summary_path):
+                shutil.rmtree(out_dir, ignore_errors=True)
+                continue
+            with open(summary_path) as f:
+                ingested_end = json.load(f)["end_date"]
+            if ingested_end is None or pd.Timestamp(ingested_end) >= end_date:
+                os.utime(out_dir)
+                return out_dir, None
+            shutil.rmtree(out_dir, ignore_errors=True)
+        out_dir = os.path.join(cache.cache_dir, f"ingest_{base}_{end_date:%Y%m%d}")
+        rows = ingest_csv(actual_path, out_dir, date_col, key_cols, target_col, end_date=end_date)["rows_read"]
+        cache._trim_disk(keep=(out_dir,))
+        return out_dir, rows
+
+
+def process_large_csv(cache, actual_path, time_file, df_time, date_col, target_col, key_cols, end_date, workers=1,
+                      progress=None):
+    # Out-of-core path for actuals files too large to read whole: the CSV is
+    # streamed into key-partitioned Parquet (projected, date-filtered and
+    # pre-aggregated as it is read) and processed partition by partition.
+    parts = processing_key(actual_path, time_file, date_col, target_col, key_cols, end_date)
+    columns = [date_col] + key_cols + [target_col]
+
+    def compute():
+        with span("upload_parse", file=str(actual_path), streamed=True) as s:
+            out_dir, rows = _ingested(cache, actual_path, date_col, target_col, key_cols, end_date)
+            s["rows"], s["reused"] = rows or 0, rows is None
+        grid = df_time.loc[df_time[date_col] <= pd.Timestamp(end_date), [date_col]]
+        with span("process_level", streamed=True) as s:
+            processed = process_ingested(out_dir, grid, key_cols, target_col, date_col, workers=workers,
+                                         progress=progress)
+            s["rows_out"] = len(processed)
+        if processed.empty:
+            return processed
+        return compact_target(compact_keys(processed[columns], key_cols), target_col)
+
+    return cache.memoize("process_level", parts, compute)
+
+
+def to_csv_bytes(cache, df, parts):
+    return cache.memoize("csv", parts, lambda: df.to_csv(index=False).encode("utf-8"))
+
+
+def build_panel(cache, df, parts, date_col, key_cols, target_col):
+    # `parts` is the processing_key of the processed frame `df`
+    def compute():
+        with span("aggregation", stage="panel"):
+            return Panel.from_long(df, date_col, key_cols, target_col)
+
+    return cache.memoize("panel", parts, compute)
+
+
+def run_forecast(cache, panel, parts, method, horizon, workers=1, **params):
+    key = (parts, method, horizon, tuple(sorted(params.items())))
+    return cache.memoize("forecast", key, lambda: forecast_panel(panel, method, horizon, workers=workers, **params))
+
+
+def run_backtest(cache, panel, parts, method, horizon, n_origins=4, workers=1, **params):
+    key = (parts, method, horizon, n_origins, tuple(sorted(params.items())))
+    return cache.memoize("backtest", key, lambda: backtest(panel, method, horizon, n_origins=n_origins,
+                                                           workers=workers, **params))
+
+
+def build_cube(cache, panel, parts, fiscal=None):
+    # One cube per pair of uploads, extended in place with the weeks a later end
+    # date adds; each end date gets its own view ending at its last week
+    def compute_base():
+        with span("aggregation", stage="cube"):
+            return CalendarCube.from_panel(panel, fiscal)
+
+    def compute_view():
+        with span("aggregation", stage="cube_extend"):
+            view = base.extend(panel).between(end=panel.weeks[-1])
+            cache.refresh("cube", parts[:-1])
+            return view
+
+    base = cache.memoize("cube", parts[:-1], compute_base)
+    return cache.memoize("cube_view", parts, compute_view)
+
+
+def build_anomalies(cache, panel, parts, **params):
+    # Outlier index over every intersection of the processed panel
+    return cache.memoize("anomalies", (parts, tuple(sorted(params.items()))), lambda: detect_outliers(panel, **params))
+
+
+def build_router(cache, panel, parts, stats, cube=None, anomalies=None):
+    return cache.memoize("router", parts, lambda: QuestionRouter(panel, stats, cube, anomalies))
+
+
+def build_llm_profile(cache, df, parts, date_col, key_cols, target_col, token_budget=800):
+    return cache.memoize("profile", (parts, token_budget),
+                         lambda: build_profile(df, date_col, key_cols, target_col, token_budget=token_budget))
@@ -1,51 +1,202 @@
-import matplotlib.pyplot as plt
+# All plots read pre-aggregated totals from a CalendarCube (utils/calendar_cube.py),
+# plot_outliers the AnomalyIndex (utils/anomalies.py).
+# matplotlib / streamlit are imported on first use so importing this module is cheap.
+# Charts are drawn on their own Figure (never the global pyplot state, which
+# concurrent sessions share), long lines are downsampled with LTTB, and the
+# PNG is cached by chart, data fingerprint and parameters, so a rerun over
+# the same data only sends the cached image.
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
-import streamlit as st
-
-def plot_yearly_trend(df, time_col, target_col):
-    df = df.copy()
-    df["Year"] = df[time_col].dt.year
-    df["Week"] = df[time_col].dt.isocalendar().week
-
-    # Group by year and week, sum sales
-    grouped = df.groupby(["Year", "Week"])[target_col].sum().reset_index()
-
-    # Plotting
-    plt.figure(figsize=(12, 6))
-    for year in sorted(grouped["Year"].unique()):
-        year_data = grouped[grouped["Year"] == year]
-        plt.plot(year_data["Week"], year_data[target_col], marker='o', label=str(year))
-
-    plt.title("Year-over-Year Weekly Trend")
-    plt.xlabel("Week Number")
-    plt.ylabel("Total Sales")
-    plt.legend(title="Year")
-    plt.grid(True)
-    st.pyplot(plt)
-
-def plot_monthly_trend(df, time_col, target_col):
-    df = df.copy()
-    df["Year"] = df[time_col].dt.year
-    df["Month"] = df[time_col].dt.month
-
-    # Group by year and month, sum sales
-    grouped = df.groupby(["Year", "Month"])[target_col].sum().reset_index()
-
-    # Plotting
-    plt.figure(figsize=(12, 6))
-    for year in sorted(grouped["Year"].unique()):
-        year_data = grouped[grouped["Year"] == year]
-        plt.plot(year_data["Month"], year_data[target_col], marker='o', label=str(year))
-
-    plt.title("Year-over-Year Monthly Trend")
-    plt.xlabel("Month Number")
-    plt.ylabel("Total Sales")
-    plt.xticks(range(1, 13))
-    plt.legend(title="Year")
-    plt.grid(True)
-    st.pyplot(plt)
-
-def plot_weekly_trend(df, time_col, y_col):
-    df['Week'] = pd.to_datetime(df[time_col]).dt.isocalendar().week
-    weekly = df.groupby('Week')[y_col].sum()
+
+from utils.instrument import span, traced
+
+MAX_POINTS = 500
+MARKER_POINTS = 60
+MAX_RENDERED = 64
+
+_rendered = OrderedDict()
+_render_lock = threading.Lock()
+
+
+# =========================
+# Downsampling
+# =========================
+def lttb(x, y, n_out):
+    """Indices of the `n_out` points Largest-Triangle-Three-Buckets keeps.
+
+    The first and last points are always kept; each bucket in between keeps
+    the point forming the largest triangle with the previously kept point and
+    the next bucket's average, which preserves peaks and troughs.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype="float64")
+    y = np.asarray(y, dtype="float64")
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_hi = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[hi:next_hi].mean(), y[hi:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(series, max_points=MAX_POINTS):
+    # LTTB over a Series with a numeric or datetime index
+    if len(series) <= max_points:
+        return series
+    index = series.index
+    x = index.asi8 if isinstance(index, pd.DatetimeIndex) else np.arange(len(series))
+    return series.iloc[lttb(x, series.to_numpy(dtype="float64"), max_points)]
+
+
+# =========================
+# Rendering (cached PNGs)
+# =========================
+def fingerprint(data):
+    # Content hash of an aggregated Series / DataFrame (values and index)
+    hashed = pd.util.hash_pandas_object(data, index=True).to_numpy()
+    columns = "" if isinstance(data, pd.Series) else "|".join(map(str, data.columns))
+    return hashlib.sha1(hashed.tobytes() + columns.encode("utf-8")).hexdigest()
+
+
+def clear_render_cache():
+    with _render_lock:
+        _rendered.clear()
+
+
+def render(chart, data, draw, figsize=(12, 6), **params):
+    """PNG bytes of draw(ax, data, **params) on a new Figure, cached by chart,
+    data fingerprint and parameters."""
+    key = (chart, fingerprint(data), figsize, tuple(sorted(params.items())))
+    with _render_lock:
+        if key in _rendered:
+            _rendered.move_to_end(key)
+            return _rendered[key]
+
+    from matplotlib.figure import Figure
+
+    with span("render", chart=chart):
+        fig = Figure(figsize=figsize)
+        draw(fig.subplots(), data, **params)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png")
+        png = buffer.getvalue()
+    with _render_lock:
+        _rendered[key] = png
+        while len(_rendered) > MAX_RENDERED:
+            _rendered.popitem(last=False)
+    return png
+
+
+def _show(png):
+    import streamlit as st
+
+    st.image(png, width="stretch")
+
+
+def _legend(ax, title, n_lines):
+    # Dozens of years / series still fit: more columns, smaller text
+    ax.legend(title=title, ncol=max(1, -(-n_lines // 12)), fontsize="small" if n_lines > 12 else None)
+
+
+# =========================
+# Charts
+# =========================
+def _draw_by_year(ax, grouped, level, title, xlabel, xticks=None):
+    years = grouped.index.get_level_values("Year").unique()
+    marker = "o" if len(grouped) <= MARKER_POINTS * 3 else None
+    for year, year_data in grouped.groupby(level="Year"):
+        ax.plot(year_data.index.get_level_values(level), year_data.to_numpy(), marker=marker, label=str(year))
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel("Total Sales")
+    if xticks is not None:
+        ax.set_xticks(xticks)
+    _legend(ax, "Year", len(years))
+    ax.grid(True)
+
+
+@traced("plot", chart="yearly")
+def plot_yearly_trend(cube):
+    # Total sales by year and ISO week
+    grouped = cube.rollup(["Year", "ISO Week"])
+    _show(render("yearly", grouped, _draw_by_year, level="ISO Week", title="Year-over-Year Weekly Trend",
+                 xlabel="Week Number"))
+
+
+@traced("plot", chart="monthly")
+def plot_monthly_trend(cube):
+    # Total sales by year and month
+    grouped = cube.rollup(["Year", "Month"])
+    _show(render("monthly", grouped, _draw_by_year, level="Month", title="Year-over-Year Monthly Trend",
+                 xlabel="Month Number", xticks=tuple(range(1, 13))))
+
+
+@traced("plot", chart="weekly")
+def plot_weekly_trend(cube):
+    import streamlit as st
+
+    weekly = cube.rollup("ISO Week")
     st.line_chart(weekly)
+
+
+def _draw_bars(ax, totals, grain, max_labels=60):
+    labels = totals.index.astype(str)
+    ax.bar(np.arange(len(totals)), totals.to_numpy())
+    # Every k-th label once there are more periods than fit
+    step = max(1, -(-len(labels) // max_labels))
+    ax.set_xticks(np.arange(0, len(labels), step), labels[::step], rotation=90)
+    ax.set_title(f"{grain} Trend")
+    ax.set_xlabel(grain)
+    ax.set_ylabel("Total Sales")
+    ax.grid(True, axis="y")
+
+
+@traced("plot", chart="fiscal")
+def plot_fiscal_trend(cube, grain="Fiscal Month"):
+    # Total sales per fiscal month or quarter, in calendar order
+    fiscal = cube.rollup(grain)
+    _show(render("fiscal", fiscal, _draw_bars, grain=grain))
+
+
+def _draw_lines(ax, frame, title, max_points=MAX_POINTS):
+    # One downsampled line per column
+    for col in frame.columns:
+        line = downsample(frame[col], max_points)
+        ax.plot(line.index, line.to_numpy(), marker="o" if len(line) <= MARKER_POINTS else None, label=str(col))
+    ax.set_title(title)
+    ax.set_ylabel("Total Sales")
+    _legend(ax, frame.columns.name, len(frame.columns))
+    ax.grid(True)
+
+
+@traced("plot", chart="drilldown")
+def plot_drilldown(cube, key_col, top=10, max_points=MAX_POINTS):
+    # Weekly totals of the `top` values of key_col by total sales
+    totals = cube.key_totals(key_col)
+    keys = totals.nlargest(top).index
+    weekly = cube.sums[key_col].loc[keys].T.rename_axis(columns=key_col)
+    _show(render("drilldown", weekly, _draw_lines, title=f"Weekly Sales of the Top {len(keys)} by {key_col}",
+                 max_points=max_points))
+
+
+@traced("plot", chart="outliers")
+def plot_outliers(anomalies, limit=100):
+    import streamlit as st
+
+    # Flagged points per week across all intersections, then the strongest ones
+    st.caption(anomalies.summary())
+    st.bar_chart(anomalies.weekly_counts())
+    st.dataframe(anomalies.frame(limit=limit), use_container_width=True)
@@ -0,0 +1,91 @@
+# utils/profile.py
+# Compact, token-budgeted description of a dataset for LLM prompts, computed
+# over the full data instead of shipping sampled rows as CSV.
+import numpy as np
+import pandas as pd
+
+from utils.compact import widen_numeric
+
+QUANTILES = [0.0, 0.05, 0.25, 0.5, 0.75, 0.95, 1.0]
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English/CSV-like text
+    return len(text) // 4 + 1
+
+
+def _fmt(value):
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.4g}" if abs(value) < 1e4 else f"{value:,.0f}"
+    return str(value)
+
+
+def profile_sections(df, date_col=None, key_cols=None, target_col=None):
+    key_cols = list(key_cols or [])
+    sections = []
+
+    columns = ", ".join(f"'{col}' ({dtype})" for col, dtype in df.dtypes.items())
+    sections.append(("schema", f"Rows: {len(df):,}\nColumns: {columns}"))
+
+    if date_col and date_col in df.columns:
+        dates = pd.to_datetime(df[date_col], errors="coerce")
+        unique = np.sort(dates.dropna().unique())
+        step = pd.Series(unique).diff().median() if len(unique) > 1 else None
+        sections.append(("dates", f"'{date_col}': {pd.Timestamp(unique[0]).date()} to {pd.Timestamp(unique[-1]).date()}, "
+                                  f"{len(unique):,} distinct periods, typical step {step}" if len(unique) else
+                                  f"'{date_col}': no parseable dates"))
+
+    if key_cols:
+        cardinality = ", ".join(f"'{col}': {df[col].nunique():,}" for col in key_cols)
+        n_series = len(df[key_cols].drop_duplicates())
+        sections.append(("keys", f"Distinct values: {cardinality}; {n_series:,} intersections"))
+
+    if target_col and target_col in df.columns and pd.api.types.is_numeric_dtype(df[target_col]):
+        target = df[target_col].to_numpy(dtype="float64", na_value=np.nan)
+        present = target[~np.isnan(target)]
+        if len(present):
+            quantiles = np.quantile(present, QUANTILES)
+            q_text = ", ".join(f"p{int(q * 100)}={_fmt(v)}" for q, v in zip(QUANTILES, quantiles))
+            sections.append(("target", f"'{target_col}': sum={_fmt(present.sum())}, mean={_fmt(present.mean())}, "
+                                       f"zeros={np.mean(present == 0):.1%}, missing={np.isnan(target).sum():,}\n"
+                                       f"Quantiles: {q_text}"))
+
+        for col in key_cols:
+            totals = df.groupby(col, observed=True)[target_col].sum().sort_values(ascending=False)
+            sections.append((f"top:{col}", (col, totals)))
+
+    return sections
+
+
+def build_profile(df, date_col=None, key_cols=None, target_col=None, token_budget=800, top_n=10, sample_rows=3):
+    """Render the profile within `token_budget` (estimated) tokens.
+
+    Per-key top-N lists shrink first, then the example rows, then whole
+    top-N sections are dropped.
+    """
+    df = widen_numeric(df)
+    sections = profile_sections(df, date_col, key_cols, target_col)
+    head = df.head(sample_rows).to_csv(index=False) if sample_rows else ""
+
+    def render(n, with_sample, with_tops):
+        lines = []
+        for name, body in sections:
+            if name.startswith("top:"):
+                if not with_tops or n == 0:
+                    continue
+                col, totals = body
+                top = ", ".join(f"{k}={_fmt(v)}" for k, v in totals.head(n).items())
+                lines.append(f"Top {min(n, len(totals))} '{col}' by total: {top}")
+            else:
+                lines.append(body)
+        if with_sample and head:
+            lines.append(f"Example rows:\n{head.strip()}")
+        return "\n".join(lines)
+
+    for with_tops in (True, False):
+        for with_sample in (True, False):
+            for n in range(top_n, 0, -1) if with_tops else [0]:
+                text = render(n, with_sample, with_tops)
+                if estimate_tokens(text) <= token_budget:
+                    return text
+    return render(0, False, False)
@@ -0,0 +1,219 @@
+# utils/question_router.py
+# Deterministic answers for the common analytic questions, computed from
+# full-data aggregates of the Panel instead of an LLM round-trip over a sample.
+import re
+import threading
+
+import pandas as pd
+
+from utils.anomalies import detect_outliers
+from utils.calendar_cube import CalendarCube
+
+HIGH_WORDS = r"(highest|max(?:imum)?|most|best|peak|top|largest|biggest)"
+LOW_WORDS = r"(lowest|min(?:imum)?|least|worst|smallest|bottom)"
+PERIODS = {"week": "weekly", "month": "monthly", "year": "yearly"}
+# _key_column result when the question could name more than one key column
+AMBIGUOUS = object()
+# Qualifiers no handler applies (a year, a key value or top-N count, a count of
+# distinct keys, a date window, a month or quarter, fiscal periods): such
+# questions go to the LLM instead of being answered over all the data
+QUALIFIERS = (r"\d|\b(how many|number of|count|distinct|unique|since|between|before|after|during|until|last|past|"
+              r"previous|this|next|except|excluding|only|quarter(ly)?|fiscal|q[1-4]|january|february|march|april|"
+              r"june|july|august|september|october|november|december|jan|feb|mar|apr|jun|jul|aug|sept?|oct|nov|dec)\b")
+
+
+class RouterStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.by_intent = {}
+
+    def record(self, intent):
+        with self._lock:
+            if intent is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.by_intent[intent] = self.by_intent.get(intent, 0) + 1
+
+    def report(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": round(self.hits / total, 3) if total else 0.0,
+                "by_intent": dict(self.by_intent)}
+
+
+class QuestionRouter:
+    def __init__(self, panel, stats=None, cube=None, anomalies=None):
+        self.panel = panel
+        self.stats = stats or RouterStats()
+        self.cube = cube or CalendarCube.from_panel(panel)
+        self._anomalies = anomalies
+        self._aggregates = {}
+        self._key_values = None
+
+    @property
+    def anomalies(self):
+        # Outlier index over every intersection, built on the first outlier question
+        if self._anomalies is None:
+            self._anomalies = detect_outliers(self.panel)
+        return self._anomalies
+
+    @property
+    def nbytes(self):
+        aggregates = sum(int(value.memory_usage(deep=True).sum()) for value in self._aggregates.values())
+        return aggregates + (self._anomalies.nbytes if self._anomalies is not None else 0)
+
+    # =========================
+    # Routing
+    # =========================
+    def route(self, question):
+        """Return (description, result, figure) or None when no intent matches."""
+        q = question.lower()
+        intent, answer = self._match(q)
+        self.stats.record(intent)
+        if answer is None:
+            return None
+        result, fig = answer
+        description = f"# Answered from precomputed full-data aggregates (intent: {intent})"
+        if isinstance(result, pd.DataFrame) and "summary" in result.attrs:
+            description += f"\n# {result.attrs['summary']}"
+        return description, result, fig
+
+    def _match(self, q):
+        if re.search(QUALIFIERS, q) or self._names_key_value(q):
+            return None, None
+        key_col = self._key_column(q)
+        if key_col is AMBIGUOUS:
+            return None, None
+
+        # Before the key / period intents: "which item has the most outliers?"
+        if re.search(r"outlier|anomal|spike", q):
+            return "outliers", self._outliers(key_col)
+
+        period = next((p for p in PERIODS if re.search(rf"\b{p}", q)), None)
+        if period and re.search(HIGH_WORDS, q) and (not key_col or re.search(rf"{HIGH_WORDS}\s+{period}", q)):
+            return f"highest_{period}", self._extreme_period(period, highest=True)
+        if period and re.search(LOW_WORDS, q) and (not key_col or re.search(rf"{LOW_WORDS}\s+{period}", q)):
+            return f"lowest_{period}", self._extreme_period(period, highest=False)
+
+        if re.search(r"\b(average|avg|mean)\b", q):
+            return "average_by_key", self._by_key(key_col or self.panel.key_cols[0], "mean")
+        if re.search(r"\b(total|sum)\b", q) and key_col:
+            return "total_by_key", self._by_key(key_col, "sum")
+        if key_col and re.search(HIGH_WORDS, q):
+            return "top_key", self._extreme_key(key_col, highest=True)
+        if key_col and re.search(LOW_WORDS, q):
+            return "bottom_key", self._extreme_key(key_col, highest=False)
+
+        if re.search(r"\btrend\b", q):
+            trend_period = period or next((p for p, word in PERIODS.items() if word in q), "week")
+            return f"{PERIODS[trend_period]}_trend", self._trend(trend_period)
+
+        return None, None
+
+    def _key_column(self, q):
+        """Key column the question names, None if none, AMBIGUOUS if several could be meant.
+
+        Bracketed names are tried first, without 'Stat' but otherwise whole
+        ('revenue item' for 'Revenue Item.[Stat Revenue Item]', 'item' for
+        'Item.[Stat Item]'); among several matches the longest phrase wins when
+        it contains the others. Otherwise the words of the column names, minus
+        those that usually describe the target ('sales'), must point to exactly
+        one column.
+        """
+        phrases = {}
+        for col in self.panel.key_cols:
+            bracket = " ".join(re.findall(r"\[([^\]]+)\]", col.lower())) or col.lower()
+            phrase = " ".join(w for w in re.findall(r"[a-z]+", bracket) if w != "stat")
+            if phrase and re.search(rf"\b{phrase}s?\b", q):
+                phrases[col] = phrase
+        if phrases:
+            col, longest = max(phrases.items(), key=lambda item: len(item[1]))
+            if all(other == col or phrase in longest and phrase != longest for other, phrase in phrases.items()):
+                return col
+            return AMBIGUOUS
+
+        skip = {"stat", "sales", "actual", "actuals", "revenue"} | set(re.findall(r"[a-z]+", self.panel.target_col.lower()))
+        matches = [col for col in self.panel.key_cols
+                   if any(re.search(rf"\b{word}s?\b", q) for word in set(re.findall(r"[a-z]+", col.lower())) - skip)]
+        if len(matches) > 1:
+            return AMBIGUOUS
+        return matches[0] if matches else None
+
+    def _names_key_value(self, q):
+        # Does the question name a (non-numeric) key value, e.g. "for location north"?
+        if self._key_values is None:
+            self._key_values = {str(value).lower() for col in self.panel.key_cols
+                                for value in self.panel.keys[col].dropna().unique()
+                                if not pd.api.types.is_number(value)}
+        return any(token in self._key_values for token in re.findall(r"[\w.-]+", q))
+
+    # =========================
+    # Aggregates (computed once, full data)
+    # =========================
+    def _aggregate(self, name, compute):
+        if name not in self._aggregates:
+            self._aggregates[name] = compute()
+        return self._aggregates[name]
+
+    def _period_totals(self, period):
+        # Rolled up from the calendar cube's weekly totals
+        def compute():
+            if period == "week":
+                return self.cube.totals
+            return self.cube.rollup({"month": "Month Start", "year": "Year Start"}[period])
+        return self._aggregate(f"{period}_totals", compute)
+
+    def _key_stats(self, key_col):
+        def compute():
+            grouped = pd.DataFrame({"sum": self.cube.key_totals(key_col, "sum"),
+                                    "count": self.cube.key_totals(key_col, "count")})
+            grouped["mean"] = grouped["sum"] / grouped["count"]
+            return grouped
+        return self._aggregate(f"key_stats:{key_col}", compute)
+
+    # =========================
+    # Answers: (result, figure)
+    # =========================
+    def _extreme_period(self, period, highest):
+        totals = self._period_totals(period)
+        when = totals.idxmax() if highest else totals.idxmin()
+        label = {"week": when.strftime("week of %Y-%m-%d"), "month": when.strftime("%B %Y"), "year": str(when.year)}[period]
+        word = "highest" if highest else "lowest"
+        return f"The {word} {period} is {label} with total {self.panel.target_col} of {totals[when]:,.2f}.", None
+
+    def _by_key(self, key_col, stat):
+        stats = self._key_stats(key_col)
+        result = stats[stat].sort_values(ascending=False).rename(f"{stat} {self.panel.target_col}").reset_index()
+        return result, None
+
+    def _extreme_key(self, key_col, highest):
+        totals = self._key_stats(key_col)["sum"]
+        key = totals.idxmax() if highest else totals.idxmin()
+        word = "highest" if highest else "lowest"
+        return f"{key_col} {key} has the {word} total {self.panel.target_col}: {totals[key]:,.2f}.", None
+
+    def _outliers(self, key_col=None):
+        # Per-intersection outliers from the anomaly index: counts per key_col
+        # value when one is named, otherwise the strongest flagged points
+        anomalies = self.anomalies
+        if key_col:
+            result = anomalies.counts_by(key_col).reset_index()
+        else:
+            result = anomalies.frame(limit=100)
+        result.attrs["summary"] = anomalies.summary()
+        return result, None
+
+    def _trend(self, period):
+        from matplotlib.figure import Figure
+
+        totals = self._period_totals(period)
+        fig = Figure(figsize=(12, 5))
+        ax = fig.subplots()
+        ax.plot(totals.index, totals.to_numpy())
+        ax.set_title(f"{PERIODS[period].title()} Trend of {self.panel.target_col}")
+        ax.set_xlabel(self.panel.date_col)
+        ax.set_ylabel(f"Total {self.panel.target_col}")
+        ax.grid(True)
+        return totals.rename_axis(self.panel.date_col).reset_index(), fig
@@ -0,0 +1,344 @@
+# utils/sandbox.py
+# Runs LLM-generated code in a pool of warm worker processes with wall-clock
+# and memory limits. DataFrames go to the workers through shared memory as an
+# Arrow IPC stream (pickle only as a fallback), never through the pipe, and
+# figures come back rendered to PNG bytes.
+import atexit
+import gc
+import hashlib
+import importlib.util
+import io
+import multiprocessing as mp
+import os
+import pickle
+import queue
+import threading
+import traceback
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import pandas as pd
+
+from utils.instrument import span
+
+HAS_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+class SandboxError(Exception):
+    pass
+
+
+class SandboxTimeout(SandboxError):
+    pass
+
+
+# =========================
+# DataFrame <-> shared memory
+# =========================
+def _write_shared(df):
+    # Returns (SharedMemory, format); the caller owns and unlinks the segment
+    if HAS_ARROW:
+        import pyarrow as pa
+
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            sink = pa.MockOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            shm = shared_memory.SharedMemory(create=True, size=max(sink.size(), 1))
+            with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf)), table.schema) as writer:
+                writer.write_table(table)
+            return shm, ("arrow", sink.size())
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+    payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    shm = shared_memory.SharedMemory(create=True, size=max(len(payload), 1))
+    shm.buf[:len(payload)] = payload
+    return shm, ("pickle", len(payload))
+
+
+def _read_shared(name, fmt, detach=False):
+    # Arrow columns may keep pointing into the segment, so the SharedMemory is
+    # returned alongside the frame and must outlive it. With detach=True the
+    # bytes are copied out first and the segment is closed and unlinked.
+    kind, size = fmt
+    shm = shared_memory.SharedMemory(name=name)
+    data = shm.buf[:size]
+    if detach:
+        data = bytes(data)
+        shm.close()
+        shm.unlink()
+        shm = None
+    if kind == "arrow":
+        import pyarrow as pa
+
+        # split_blocks keeps one block per column, so null-free numeric columns
+        # are zero-copy views of the segment instead of a consolidated copy
+        return shm, pa.ipc.open_stream(pa.py_buffer(data)).read_all().to_pandas(split_blocks=True)
+    return shm, pickle.loads(bytes(data))
+
+
+def _release(shm):
+    # False when the segment is still referenced by a frame; the mapping then
+    # goes when that is collected
+    try:
+        shm.close()
+        return True
+    except BufferError:
+        return False
+
+
+# =========================
+# Worker process
+# =========================
+class _StreamlitShim:
+    # Records st.* calls made by generated code so the caller can replay them
+    def __init__(self, outputs):
+        self._outputs = outputs
+
+    def pyplot(self, fig=None, **kwargs):
+        import matplotlib.pyplot as plt
+
+        self._outputs.append(("image", (_png(fig if fig is not None and hasattr(fig, "savefig") else plt.gcf()),), {}))
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self._outputs.append((name, args, kwargs))
+        return record
+
+
+def _png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def _picklable(value):
+    try:
+        pickle.dumps(value)
+        return value
+    except Exception:
+        return repr(value)
+
+
+def _recorded(name, args, kwargs):
+    # A call whose arguments cannot cross the process boundary is replayed as
+    # st.write of their repr
+    try:
+        pickle.dumps((args, kwargs))
+        return name, args, kwargs
+    except Exception:
+        return "write", (repr(args[0]) if len(args) == 1 and not kwargs else repr((args, kwargs)),), {}
+
+
+def _drop_frames(frames, keep):
+    # Oldest frames first; their columns are views of the segment, so a frame
+    # still held by a reference cycle is collected before the mapping is closed
+    while len(frames) > keep:
+        shm = frames.popitem(last=False)[1][0]
+        if not _release(shm):
+            gc.collect()
+            _release(shm)
+
+
+def _worker_main(conn, memory_mb):
+    try:
+        import resource
+
+        limit = memory_mb * 2**20
+        resource.setrlimit(resource.RLIMIT_DATA, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    frames = OrderedDict()  # shm name -> (SharedMemory, DataFrame), only the last one kept warm
+    modules = OrderedDict()  # function-style code -> its executed globals
+    df = env = None
+    while True:
+        task = conn.recv()
+        if task is None:
+            df = env = None
+            modules.clear()
+            _drop_frames(frames, keep=0)
+            break
+        code, shm_name, fmt, df_name, call, env_extra = task
+        outputs = []
+        try:
+            if shm_name not in frames:
+                df = env = None
+                frames[shm_name] = _read_shared(shm_name, fmt)
+                _drop_frames(frames, keep=1)
+            # The shared columns are read-only: a shallow copy lets generated
+            # code write to df (copy-on-write, per column) without touching them
+            df = frames[shm_name][1].copy(deep=False)
+
+            plt.close("all")
+            if call:
+                # Function-style code is compiled and executed once per worker;
+                # later calls (e.g. one per chunk) only call the function
+                env = modules.get(code)
+                if env is None:
+                    env = {df_name: df, "pd": pd, "np": np, "plt": plt, "st": _StreamlitShim(outputs), **env_extra}
+                    exec(compile(code, "<generated>", "exec"), env)
+                    if call not in env:
+                        raise NameError(f"Function '{call}' not found in generated code.")
+                    modules[code] = env
+                    while len(modules) > 8:
+                        modules.popitem(last=False)
+                env.update({df_name: df, "st": _StreamlitShim(outputs), **env_extra})
+                env.pop("result_fig", None)
+                result = env[call](df)
+                env[df_name] = None  # cached globals must not pin the shared frame
+            else:
+                env = {df_name: df, "pd": pd, "np": np, "plt": plt, "st": _StreamlitShim(outputs), **env_extra}
+                exec(code, env)
+                result = env.get("result")
+            fig = env.get("result_fig")
+
+            response = {"ok": True, "outputs": [_recorded(*call) for call in outputs],
+                        "figure": _png(fig) if fig is not None and hasattr(fig, "savefig") else None}
+            if isinstance(result, pd.DataFrame):
+                out_shm, out_fmt = _write_shared(result)
+                out_shm.close()
+                response["frame"] = (out_shm.name, out_fmt)
+            else:
+                response["result"] = _picklable(result)
+            conn.send(response)
+        except BaseException:
+            conn.send({"ok": False, "error": traceback.format_exc()})
+        finally:
+            plt.close("all")
+            # Recorded calls and the result can hold columns of the shared frame
+            outputs = response = result = None
+
+
+# =========================
+# Pool
+# =========================
+class _Worker:
+    def __init__(self, ctx, memory_mb):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, memory_mb), daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+
+
+class SandboxPool:
+    def __init__(self, workers=2, timeout=30, memory_mb=2048, max_shared_frames=4):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_shared_frames = max_shared_frames
+        self._ctx = mp.get_context("spawn")
+        self._idle = queue.Queue()
+        self._shared = OrderedDict()  # digest -> [SharedMemory, format, runs using it]
+        self._lock = threading.Lock()
+        for _ in range(workers):
+            self._idle.put(_Worker(self._ctx, memory_mb))
+
+    def _acquire(self, df, digest=None):
+        # Shared-memory block holding df, looked up by the caller's content
+        # digest (hashed here only when none is given); the block stays linked
+        # until the matching _unshare, so a queued run can still attach to it
+        key = digest if digest is not None else hashlib.sha256(
+            pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()
+            + str(list(df.columns)).encode("utf-8")).hexdigest()
+        with self._lock:
+            entry = self._shared.get(key)
+            if entry is None:
+                entry = self._shared[key] = [*_write_shared(df), 0]
+            self._shared.move_to_end(key)
+            entry[2] += 1
+            self._evict()
+            return key, entry[0], entry[1]
+
+    def _unshare(self, key):
+        with self._lock:
+            self._shared[key][2] -= 1
+            self._evict()
+
+    def _evict(self):
+        # Least recently used idle blocks beyond max_shared_frames; blocks in use are skipped
+        excess = len(self._shared) - self.max_shared_frames
+        for key in [key for key, entry in self._shared.items() if entry[2] == 0][:max(excess, 0)]:
+            shm = self._shared.pop(key)[0]
+            _release(shm)
+            shm.unlink()
+
+    def run(self, code, df, df_name="df", call=None, timeout=None, digest=None, **env):
+        """Execute `code` with `df` bound to `df_name`.
+
+        `digest` identifies the content of df (e.g. a processing key or data
+        fingerprint the caller already has) so repeated runs reuse its
+        shared-memory block without rehashing the frame.
+
+        Returns a dict with 'result' (DataFrame or picklable value), 'figure'
+        (PNG bytes of result_fig or None) and 'outputs' (recorded st.* calls as
+        (name, args, kwargs), st.pyplot as ("image", (PNG bytes,), {})).
+        Raises SandboxError / SandboxTimeout.
+        """
+        with span("code_exec", df_name=df_name, rows=len(df)):
+            response = self._run(code, df, df_name, call, timeout, digest, env)
+        if "frame" in response:
+            _, response["result"] = _read_shared(*response.pop("frame"), detach=True)
+        return response
+
+    def _run(self, code, df, df_name, call, timeout, digest, env):
+        key, shm, fmt = self._acquire(df, digest)
+        worker = self._idle.get()
+        try:
+            if not worker.process.is_alive():
+                worker = _Worker(self._ctx, self.memory_mb)
+            worker.conn.send((code, shm.name, fmt, df_name, call, env))
+            if not worker.conn.poll(timeout or self.timeout):
+                worker.process.kill()
+                worker.process.join()
+                worker = _Worker(self._ctx, self.memory_mb)
+                raise SandboxTimeout(f"Generated code exceeded {timeout or self.timeout}s and was stopped.")
+            try:
+                response = worker.conn.recv()
+            except (EOFError, OSError):
+                worker = _Worker(self._ctx, self.memory_mb)
+                raise SandboxError("Sandbox worker died (memory limit exceeded?).")
+        finally:
+            self._idle.put(worker)
+            self._unshare(key)
+
+        if not response["ok"]:
+            raise SandboxError(response["error"])
+        return response
+
+    def shutdown(self):
+        while not self._idle.empty():
+            self._idle.get().stop()
+        with self._lock:
+            for shm, _, _ in self._shared.values():
+                _release(shm)
+                shm.unlink()
+            self._shared.clear()
+
+
+_default_pool = None
+_default_lock = threading.Lock()
+
+
+def get_sandbox(workers=None, timeout=30, memory_mb=2048):
+    # One warm pool per process shared by every generated-code call site
+    global _default_pool
+    with _default_lock:
+        if _default_pool is None:
+            _default_pool = SandboxPool(workers or min(4, os.cpu_count() or 1) or 1, timeout, memory_mb)
+            atexit.register(_default_pool.shutdown)
+        return _default_pool